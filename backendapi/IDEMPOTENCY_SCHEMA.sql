@@ -0,0 +1,23 @@
+-- ============================================
+-- Voice-First Rural Banking Assistant
+-- Persistent Idempotency Keys (optional)
+-- Needed only with IDEMPOTENCY_BACKEND=database
+-- ============================================
+--
+-- One row per (user, endpoint, Idempotency-Key). The row is claimed before
+-- the request runs (response NULL) and completed with the JSON response, so
+-- a retry on any worker, or after a restart, replays it instead of posting
+-- again. Rows older than IDEMPOTENCY_TTL are ignored and may be purged:
+--   DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL '1 day';
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id UUID NOT NULL,
+    scope TEXT NOT NULL,               -- endpoint, e.g. 'transfer', 'billpay'
+    key TEXT NOT NULL,                 -- client-supplied Idempotency-Key
+    fingerprint TEXT NOT NULL,         -- hash of the request body (PIN excluded)
+    response JSONB,                    -- NULL while the first request is running
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (user_id, scope, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
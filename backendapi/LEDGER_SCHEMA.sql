@@ -0,0 +1,288 @@
+-- ============================================
+-- Voice-First Rural Banking Assistant
+-- Double-entry Ledger
+-- Run after QUICK_SCHEMA.sql and before POSTING_PROCEDURES.sql
+-- ============================================
+--
+-- Every money movement is recorded as postings that sum to zero:
+--   transfer   : sender -amount, receiver +amount
+--   billpay    : sender -amount, 'EXTERNAL:BILLPAY' +amount
+--   deposit    : 'EXTERNAL:DEPOSIT' -amount, receiver +amount
+--   opening    : 'EQUITY:OPENING' -balance, user +balance (new users)
+--   adjustment : 'EQUITY:ADJUSTMENT' -amount, user +amount (signed, post_adjustment)
+-- Accounts are user UUIDs (as text) or named system accounts.
+-- users.balance must only change through these postings: verify_ledger only
+-- re-checks accounts with postings since its last checkpoint.
+--
+-- Balances are read from the latest per-account snapshot plus the short
+-- tail of postings after it, so reconciliation never scans all history.
+
+-- ============================================
+-- Postings Journal (append-only)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS ledger_postings (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id UUID,               -- transactions.id (NULL for opening balances)
+    account_id TEXT NOT NULL,
+    amount DECIMAL(12,2) NOT NULL,     -- signed: debit < 0, credit > 0
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ledger_postings_account ON ledger_postings(account_id, id);
+CREATE INDEX IF NOT EXISTS idx_ledger_postings_transaction ON ledger_postings(transaction_id);
+
+CREATE OR REPLACE FUNCTION ledger_postings_append_only() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RAISE EXCEPTION 'ledger_postings is append-only; post a reversing entry instead';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_ledger_postings_append_only ON ledger_postings;
+CREATE TRIGGER trg_ledger_postings_append_only
+    BEFORE UPDATE OR DELETE ON ledger_postings
+    FOR EACH ROW EXECUTE FUNCTION ledger_postings_append_only();
+
+-- ============================================
+-- Balance Snapshots and Verification Checkpoints
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS ledger_snapshots (
+    account_id TEXT NOT NULL,
+    as_of_posting_id BIGINT NOT NULL,  -- includes all postings with id <= this
+    as_of_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    balance DECIMAL(12,2) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (account_id, as_of_posting_id)
+);
+
+CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+    id BIGSERIAL PRIMARY KEY,
+    last_posting_id BIGINT NOT NULL,
+    accounts_checked INTEGER NOT NULL,
+    verified_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+-- ============================================
+-- Opening Balances for New Users
+-- ============================================
+
+CREATE OR REPLACE FUNCTION ledger_open_account() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.balance <> 0 THEN
+        INSERT INTO ledger_postings (transaction_id, account_id, amount)
+        VALUES (NULL, 'EQUITY:OPENING', -NEW.balance),
+               (NULL, NEW.id::TEXT, NEW.balance);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_users_ledger_open ON users;
+CREATE TRIGGER trg_users_ledger_open
+    AFTER INSERT ON users
+    FOR EACH ROW EXECUTE FUNCTION ledger_open_account();
+
+-- ============================================
+-- ledger_balance: snapshot + tail (current or historical)
+-- ============================================
+
+CREATE OR REPLACE FUNCTION ledger_balance(
+    p_account_id TEXT,
+    p_as_of TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+) RETURNS DECIMAL
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    v_snapshot_id BIGINT := 0;
+    v_balance DECIMAL(12,2) := 0;
+BEGIN
+    SELECT as_of_posting_id, balance INTO v_snapshot_id, v_balance
+      FROM ledger_snapshots
+     WHERE account_id = p_account_id
+       AND as_of_time <= p_as_of
+     ORDER BY as_of_posting_id DESC
+     LIMIT 1;
+
+    RETURN COALESCE(v_balance, 0) + COALESCE((
+        SELECT SUM(amount)
+          FROM ledger_postings
+         WHERE account_id = p_account_id
+           AND id > COALESCE(v_snapshot_id, 0)
+           AND created_at <= p_as_of
+    ), 0);
+END;
+$$;
+
+-- ============================================
+-- take_ledger_snapshots: incremental, per touched account
+-- Postings younger than p_lag are left for the next run so that
+-- slow-committing transactions cannot slip in behind a snapshot.
+-- ============================================
+
+CREATE OR REPLACE FUNCTION take_ledger_snapshots(
+    p_lag INTERVAL DEFAULT INTERVAL '1 minute'
+) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cutoff BIGINT;
+    v_count INTEGER;
+BEGIN
+    SELECT MAX(id) INTO v_cutoff FROM ledger_postings WHERE created_at <= NOW() - p_lag;
+    IF v_cutoff IS NULL THEN
+        RETURN json_build_object('snapshots', 0, 'as_of_posting_id', NULL);
+    END IF;
+
+    WITH last_snapshot AS (
+        SELECT DISTINCT ON (account_id) account_id, as_of_posting_id, balance
+          FROM ledger_snapshots
+         ORDER BY account_id, as_of_posting_id DESC
+    ), tail AS (
+        SELECT p.account_id,
+               SUM(p.amount) AS delta,
+               MAX(p.created_at) AS as_of_time
+          FROM ledger_postings p
+          LEFT JOIN last_snapshot s ON s.account_id = p.account_id
+         WHERE p.id > COALESCE(s.as_of_posting_id, 0)
+           AND p.id <= v_cutoff
+         GROUP BY p.account_id
+    )
+    INSERT INTO ledger_snapshots (account_id, as_of_posting_id, as_of_time, balance)
+    SELECT t.account_id, v_cutoff, t.as_of_time, COALESCE(s.balance, 0) + t.delta
+      FROM tail t
+      LEFT JOIN last_snapshot s ON s.account_id = t.account_id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN json_build_object('snapshots', v_count, 'as_of_posting_id', v_cutoff);
+END;
+$$;
+
+-- ============================================
+-- verify_ledger: incremental reconciliation from the last checkpoint
+-- Checks that (1) every transaction posted since the checkpoint balances to
+-- zero and (2) users.balance equals snapshot + tail for every account touched
+-- since the checkpoint (all accounts when p_full).
+-- ============================================
+
+CREATE OR REPLACE FUNCTION verify_ledger(p_full BOOLEAN DEFAULT FALSE) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_from BIGINT;
+    v_to BIGINT;
+    v_unbalanced JSON;
+    v_mismatches JSON;
+    v_checked INTEGER;
+BEGIN
+    SELECT COALESCE(MAX(last_posting_id), 0) INTO v_from FROM ledger_checkpoints;
+    IF p_full THEN
+        v_from := 0;
+    END IF;
+    SELECT COALESCE(MAX(id), 0) INTO v_to FROM ledger_postings;
+
+    SELECT COALESCE(json_agg(transaction_id), '[]'::JSON) INTO v_unbalanced
+      FROM (
+        SELECT transaction_id
+          FROM ledger_postings
+         WHERE id > v_from AND id <= v_to AND transaction_id IS NOT NULL
+         GROUP BY transaction_id
+        HAVING SUM(amount) <> 0
+      ) t;
+
+    WITH touched AS (
+        SELECT u.id, u.balance
+          FROM users u
+         WHERE p_full
+            OR EXISTS (
+                SELECT 1 FROM ledger_postings p
+                 WHERE p.account_id = u.id::TEXT AND p.id > v_from AND p.id <= v_to
+            )
+    ), expected AS (
+        SELECT id, balance, ledger_balance(id::TEXT) AS ledger
+          FROM touched
+    )
+    SELECT COUNT(*),
+           COALESCE(json_agg(json_build_object('user_id', id, 'balance', balance, 'ledger', ledger))
+                    FILTER (WHERE balance <> ledger), '[]'::JSON)
+      INTO v_checked, v_mismatches
+      FROM expected;
+
+    IF json_array_length(v_unbalanced) = 0 AND json_array_length(v_mismatches) = 0 THEN
+        INSERT INTO ledger_checkpoints (last_posting_id, accounts_checked) VALUES (v_to, v_checked);
+    END IF;
+
+    RETURN json_build_object(
+        'ok', json_array_length(v_unbalanced) = 0 AND json_array_length(v_mismatches) = 0,
+        'from_posting_id', v_from,
+        'to_posting_id', v_to,
+        'accounts_checked', v_checked,
+        'unbalanced_transactions', v_unbalanced,
+        'balance_mismatches', v_mismatches
+    );
+END;
+$$;
+
+-- ============================================
+-- One-time backfill for databases created before the ledger
+-- (opening balance = current balance minus net historical movement)
+-- Runs once, recorded in ledger_migrations. Accounts opened by
+-- trg_users_ledger_open and transactions that already have postings are
+-- skipped, so a signup racing the migration is never counted twice.
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS ledger_migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+DO $$
+BEGIN
+    INSERT INTO ledger_migrations (name) VALUES ('backfill') ON CONFLICT (name) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    -- Hold balances and signups still while history is read
+    LOCK TABLE users IN SHARE MODE;
+
+    CREATE TEMP TABLE ledger_openings ON COMMIT DROP AS
+    SELECT u.id, COALESCE(u.created_at, NOW()) AS created_at,
+           u.balance
+           + COALESCE((SELECT SUM(amount) FROM transactions t WHERE t.sender_id = u.id AND t.status = 'success'), 0)
+           - COALESCE((SELECT SUM(amount) FROM transactions t WHERE t.receiver_id = u.id AND t.status = 'success'), 0)
+           AS opening
+      FROM users u
+     WHERE NOT EXISTS (SELECT 1 FROM ledger_postings p WHERE p.account_id = u.id::TEXT);
+
+    INSERT INTO ledger_postings (transaction_id, account_id, amount, created_at)
+    SELECT NULL, 'EQUITY:OPENING', -opening, created_at FROM ledger_openings WHERE opening <> 0
+    UNION ALL
+    SELECT NULL, id::TEXT, opening, created_at FROM ledger_openings WHERE opening <> 0;
+
+    -- Deposits have no sender and bill payments no receiver: that side is
+    -- the external account of the transaction type
+    INSERT INTO ledger_postings (transaction_id, account_id, amount, created_at)
+    SELECT id, COALESCE(sender_id::TEXT, 'EXTERNAL:' || UPPER(type)), -amount, created_at
+      FROM transactions t
+     WHERE status = 'success'
+       AND NOT EXISTS (SELECT 1 FROM ledger_postings p WHERE p.transaction_id = t.id)
+    UNION ALL
+    SELECT id, COALESCE(receiver_id::TEXT, 'EXTERNAL:' || UPPER(type)), amount, created_at
+      FROM transactions t
+     WHERE status = 'success'
+       AND NOT EXISTS (SELECT 1 FROM ledger_postings p WHERE p.transaction_id = t.id);
+END;
+$$;
+
+-- Ledger maintenance runs with the service role only
+REVOKE ALL ON FUNCTION take_ledger_snapshots(INTERVAL) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION verify_ledger(BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION ledger_balance(TEXT, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION take_ledger_snapshots(INTERVAL) TO service_role;
+GRANT EXECUTE ON FUNCTION verify_ledger(BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION ledger_balance(TEXT, TIMESTAMP WITH TIME ZONE) TO service_role;
@@ -0,0 +1,329 @@
+-- ============================================
+-- Voice-First Rural Banking Assistant
+-- Server-side Posting Procedures
+-- Run after QUICK_SCHEMA.sql and LEDGER_SCHEMA.sql
+-- ============================================
+
+-- Row version, bumped on every balance write (no-op on fresh schemas)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 0 NOT NULL;
+
+-- ============================================
+-- post_transaction
+-- Debits the sender, credits the receiver (if any) and records the
+-- transactions row in ONE database transaction / ONE PostgREST call.
+-- Called from the backend via client.rpc("post_transaction", {...}).
+-- p_receiver_phone, when given, must still be the receiver's phone: the
+-- backend resolves phones from a cache, and a number may have moved.
+-- ============================================
+
+-- Earlier signature without p_receiver_phone (would be an ambiguous overload)
+DROP FUNCTION IF EXISTS post_transaction(UUID, UUID, DECIMAL, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION post_transaction(
+    p_sender_id UUID,
+    p_receiver_id UUID,
+    p_amount DECIMAL(10,2),
+    p_type TEXT DEFAULT 'transfer',
+    p_note TEXT DEFAULT NULL,
+    p_receiver_phone TEXT DEFAULT NULL
+) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tx_id UUID := uuid_generate_v4();
+    v_new_balance DECIMAL(10,2);
+BEGIN
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RETURN json_build_object('success', false, 'error', 'Amount must be greater than 0');
+    END IF;
+
+    IF p_sender_id = p_receiver_id THEN
+        RETURN json_build_object('success', false, 'error', 'Cannot transfer money to yourself');
+    END IF;
+
+    -- Lock both rows in id order so opposite transfers cannot deadlock
+    PERFORM 1 FROM users
+     WHERE id IN (p_sender_id, p_receiver_id)
+     ORDER BY id
+       FOR UPDATE;
+
+    IF NOT EXISTS (SELECT 1 FROM users WHERE id = p_sender_id) THEN
+        RETURN json_build_object('success', false, 'error', 'Sender not found');
+    END IF;
+
+    IF p_receiver_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM users WHERE id = p_receiver_id) THEN
+        RETURN json_build_object('success', false, 'error', 'Receiver not found');
+    END IF;
+
+    IF p_receiver_phone IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM users WHERE id = p_receiver_id AND phone = p_receiver_phone
+    ) THEN
+        RETURN json_build_object('success', false, 'error', 'Receiver phone changed');
+    END IF;
+
+    -- Debit (balance is computed in SQL, never read-modify-written by the client)
+    UPDATE users
+       SET balance = balance - p_amount,
+           version = version + 1
+     WHERE id = p_sender_id
+       AND balance >= p_amount
+    RETURNING balance INTO v_new_balance;
+
+    IF NOT FOUND THEN
+        RETURN json_build_object(
+            'success', false,
+            'error', 'Insufficient funds',
+            'current_balance', (SELECT balance FROM users WHERE id = p_sender_id)
+        );
+    END IF;
+
+    -- Credit
+    IF p_receiver_id IS NOT NULL THEN
+        UPDATE users
+           SET balance = balance + p_amount,
+               version = version + 1
+         WHERE id = p_receiver_id;
+    END IF;
+
+    -- Journal row
+    INSERT INTO transactions (id, sender_id, receiver_id, amount, type, status, note)
+    VALUES (v_tx_id, p_sender_id, p_receiver_id, p_amount, p_type, 'success', p_note);
+
+    -- Double-entry postings (see LEDGER_SCHEMA.sql)
+    INSERT INTO ledger_postings (transaction_id, account_id, amount)
+    VALUES (v_tx_id, p_sender_id::TEXT, -p_amount),
+           (v_tx_id, COALESCE(p_receiver_id::TEXT, 'EXTERNAL:' || UPPER(p_type)), p_amount);
+
+    RETURN json_build_object(
+        'success', true,
+        'transaction_id', v_tx_id,
+        'new_balance', v_new_balance
+    );
+END;
+$$;
+
+-- Only the backend (service role) may post; never expose this to anon clients
+REVOKE ALL ON FUNCTION post_transaction(UUID, UUID, DECIMAL, TEXT, TEXT, TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION post_transaction(UUID, UUID, DECIMAL, TEXT, TEXT, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION post_transaction(UUID, UUID, DECIMAL, TEXT, TEXT, TEXT) TO service_role;
+
+-- ============================================
+-- post_transfer_batch
+-- Posts many transfers from one sender atomically: the total is debited
+-- once, each receiver is credited, and one transactions row plus a
+-- posting pair is written per item. Either every item posts or none do.
+-- p_transfers: [{"id": uuid, "receiver_id": uuid, "receiver_phone": text, "amount": number, "note": text}, ...]
+-- receiver_phone is optional and checked like post_transaction's.
+-- ============================================
+
+CREATE OR REPLACE FUNCTION post_transfer_batch(
+    p_sender_id UUID,
+    p_transfers JSON
+) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_total DECIMAL(12,2);
+    v_new_balance DECIMAL(10,2);
+BEGIN
+    -- A post_group transaction may run several batches
+    DROP TABLE IF EXISTS batch_items;
+    CREATE TEMP TABLE batch_items ON COMMIT DROP AS
+    SELECT id, receiver_id, receiver_phone, amount, note
+      FROM json_to_recordset(p_transfers) AS x(id UUID, receiver_id UUID, receiver_phone TEXT, amount DECIMAL(10,2), note TEXT);
+
+    SELECT SUM(amount) INTO v_total FROM batch_items;
+
+    IF v_total IS NULL THEN
+        RETURN json_build_object('success', false, 'error', 'No transfers in batch');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM batch_items WHERE amount IS NULL OR amount <= 0) THEN
+        RETURN json_build_object('success', false, 'error', 'Amount must be greater than 0');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM batch_items WHERE receiver_id = p_sender_id) THEN
+        RETURN json_build_object('success', false, 'error', 'Cannot transfer money to yourself');
+    END IF;
+
+    -- Lock sender and all receivers in id order so concurrent batches cannot deadlock
+    PERFORM 1 FROM users
+     WHERE id = p_sender_id OR id IN (SELECT receiver_id FROM batch_items)
+     ORDER BY id
+       FOR UPDATE;
+
+    IF EXISTS (
+        SELECT 1 FROM batch_items b
+         WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = b.receiver_id)
+    ) THEN
+        RETURN json_build_object('success', false, 'error', 'Receiver not found');
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM batch_items b
+          JOIN users u ON u.id = b.receiver_id
+         WHERE b.receiver_phone IS NOT NULL AND u.phone IS DISTINCT FROM b.receiver_phone
+    ) THEN
+        RETURN json_build_object('success', false, 'error', 'Receiver phone changed');
+    END IF;
+
+    -- Debit the whole batch once
+    UPDATE users
+       SET balance = balance - v_total,
+           version = version + 1
+     WHERE id = p_sender_id
+       AND balance >= v_total
+    RETURNING balance INTO v_new_balance;
+
+    IF NOT FOUND THEN
+        IF NOT EXISTS (SELECT 1 FROM users WHERE id = p_sender_id) THEN
+            RETURN json_build_object('success', false, 'error', 'Sender not found');
+        END IF;
+        RETURN json_build_object(
+            'success', false,
+            'error', 'Insufficient funds',
+            'current_balance', (SELECT balance FROM users WHERE id = p_sender_id)
+        );
+    END IF;
+
+    -- Credit each receiver once with its share
+    UPDATE users u
+       SET balance = u.balance + c.total,
+           version = u.version + 1
+      FROM (SELECT receiver_id, SUM(amount) AS total FROM batch_items GROUP BY receiver_id) c
+     WHERE u.id = c.receiver_id;
+
+    INSERT INTO transactions (id, sender_id, receiver_id, amount, type, status, note)
+    SELECT id, p_sender_id, receiver_id, amount, 'transfer', 'success', note FROM batch_items;
+
+    INSERT INTO ledger_postings (transaction_id, account_id, amount)
+    SELECT id, p_sender_id::TEXT, -amount FROM batch_items
+    UNION ALL
+    SELECT id, receiver_id::TEXT, amount FROM batch_items;
+
+    RETURN json_build_object(
+        'success', true,
+        'total', v_total,
+        'new_balance', v_new_balance
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION post_transfer_batch(UUID, JSON) FROM PUBLIC;
+REVOKE ALL ON FUNCTION post_transfer_batch(UUID, JSON) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION post_transfer_batch(UUID, JSON) TO service_role;
+
+-- ============================================
+-- post_group
+-- Group commit: runs many independent postings (from concurrent requests)
+-- in ONE database transaction, so they share a single commit and round trip.
+-- Each posting runs in its own subtransaction: an error rolls back only that
+-- posting and is reported in its slot with its SQLSTATE.
+-- p_postings: [{"kind": "transaction", "sender_id", "receiver_id", "amount", "type", "note", "receiver_phone"}
+--              | {"kind": "batch", "sender_id", "items": [...post_transfer_batch items...]}, ...]
+-- Returns one post_transaction / post_transfer_batch result per posting, in order.
+-- ============================================
+
+CREATE OR REPLACE FUNCTION post_group(p_postings JSON) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_posting JSON;
+    v_result JSON;
+    v_results JSON[] := '{}';
+BEGIN
+    FOR v_posting IN SELECT value FROM json_array_elements(p_postings) LOOP
+        BEGIN
+            IF v_posting->>'kind' = 'batch' THEN
+                v_result := post_transfer_batch((v_posting->>'sender_id')::UUID, v_posting->'items');
+            ELSE
+                v_result := post_transaction(
+                    (v_posting->>'sender_id')::UUID,
+                    (v_posting->>'receiver_id')::UUID,
+                    (v_posting->>'amount')::DECIMAL(10,2),
+                    COALESCE(v_posting->>'type', 'transfer'),
+                    v_posting->>'note',
+                    v_posting->>'receiver_phone'
+                );
+            END IF;
+        EXCEPTION WHEN OTHERS THEN
+            -- e.g. a deadlock with another worker's group (40P01): retried on its own
+            v_result := json_build_object('success', false, 'error', SQLERRM, 'sqlstate', SQLSTATE);
+        END;
+        v_results := v_results || v_result;
+    END LOOP;
+
+    RETURN array_to_json(v_results);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION post_group(JSON) FROM PUBLIC;
+REVOKE ALL ON FUNCTION post_group(JSON) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION post_group(JSON) TO service_role;
+
+-- ============================================
+-- post_adjustment
+-- Manual balance correction (credit when p_amount > 0, debit when < 0).
+-- Like any other movement it writes a transactions row and a posting pair
+-- against 'EQUITY:ADJUSTMENT', so verify_ledger sees the account as touched.
+-- Run by operators through `python ledger.py adjust`, never by the API.
+-- ============================================
+
+CREATE OR REPLACE FUNCTION post_adjustment(
+    p_user_id UUID,
+    p_amount DECIMAL(10,2),
+    p_note TEXT DEFAULT NULL
+) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_tx_id UUID := uuid_generate_v4();
+    v_new_balance DECIMAL(10,2);
+BEGIN
+    IF p_amount IS NULL OR p_amount = 0 THEN
+        RETURN json_build_object('success', false, 'error', 'Amount must not be 0');
+    END IF;
+
+    UPDATE users
+       SET balance = balance + p_amount,
+           version = version + 1
+     WHERE id = p_user_id
+       AND balance + p_amount >= 0
+    RETURNING balance INTO v_new_balance;
+
+    IF NOT FOUND THEN
+        IF NOT EXISTS (SELECT 1 FROM users WHERE id = p_user_id) THEN
+            RETURN json_build_object('success', false, 'error', 'User not found');
+        END IF;
+        RETURN json_build_object(
+            'success', false,
+            'error', 'Insufficient funds',
+            'current_balance', (SELECT balance FROM users WHERE id = p_user_id)
+        );
+    END IF;
+
+    -- transactions.amount is positive: the user is the receiver of a credit
+    -- and the sender of a debit
+    INSERT INTO transactions (id, sender_id, receiver_id, amount, type, status, note)
+    VALUES (
+        v_tx_id,
+        CASE WHEN p_amount < 0 THEN p_user_id END,
+        CASE WHEN p_amount > 0 THEN p_user_id END,
+        ABS(p_amount), 'adjustment', 'success', p_note
+    );
+
+    INSERT INTO ledger_postings (transaction_id, account_id, amount)
+    VALUES (v_tx_id, 'EQUITY:ADJUSTMENT', -p_amount),
+           (v_tx_id, p_user_id::TEXT, p_amount);
+
+    RETURN json_build_object(
+        'success', true,
+        'transaction_id', v_tx_id,
+        'new_balance', v_new_balance
+    );
+END;
+$$;
+
+REVOKE ALL ON FUNCTION post_adjustment(UUID, DECIMAL, TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION post_adjustment(UUID, DECIMAL, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION post_adjustment(UUID, DECIMAL, TEXT) TO service_role;
@@ -18,6 +18,7 @@ CREATE TABLE IF NOT EXISTS users (
     balance DECIMAL(10,2) DEFAULT 5000.00 NOT NULL,
     login_pin TEXT,        -- Hashed 6-digit PIN
     transfer_pin TEXT,     -- Hashed 4-digit PIN
+    version INTEGER DEFAULT 0 NOT NULL,  -- Bumped on every balance write
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
     -- Constraints
@@ -46,5 +47,9 @@ CREATE TABLE IF NOT EXISTS transactions (
 );
 
 -- Create indexes for faster queries
-CREATE INDEX IF NOT EXISTS idx_transactions_sender ON transactions(sender_id, created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_transactions_receiver ON transactions(receiver_id, created_at DESC);
+-- (created_at, id) matches the history keyset, so a cursor is an index range.
+-- Replaces the older (column, created_at) indexes on existing databases.
+DROP INDEX IF EXISTS idx_transactions_sender;
+DROP INDEX IF EXISTS idx_transactions_receiver;
+CREATE INDEX IF NOT EXISTS idx_transactions_sender_keyset ON transactions(sender_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_receiver_keyset ON transactions(receiver_id, created_at DESC, id DESC);
@@ -0,0 +1,110 @@
+-- ============================================
+-- Voice-First Rural Banking Assistant
+-- Per-user Spending Aggregates
+-- Run after QUICK_SCHEMA.sql
+-- ============================================
+--
+-- One row per (user, period, period start, direction, type, bill type),
+-- kept current by a trigger on transactions so every posting path
+-- (post_transaction, post_transfer_batch, direct inserts) updates it in the
+-- same database transaction. /account/summary reads a period with a single
+-- primary-key range scan instead of summing history.
+--
+-- Periods are calendar days/months in IST (Asia/Kolkata, no DST).
+-- Bill type is taken from the billpay note ("<bill_type> bill payment - ...").
+
+CREATE TABLE IF NOT EXISTS spending_aggregates (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period TEXT NOT NULL,              -- 'day' or 'month'
+    period_start DATE NOT NULL,
+    direction TEXT NOT NULL,           -- 'out' (spent) or 'in' (received)
+    type TEXT NOT NULL,                -- transactions.type
+    bill_type TEXT NOT NULL DEFAULT '',
+    total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period, period_start, direction, type, bill_type)
+);
+
+-- ============================================
+-- spending_bill_type: bill type recorded in a billpay note
+-- ============================================
+
+CREATE OR REPLACE FUNCTION spending_bill_type(p_type TEXT, p_note TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN p_type = 'billpay' AND p_note LIKE '% bill payment%'
+            THEN LOWER(SPLIT_PART(p_note, ' ', 1))
+        ELSE ''
+    END;
+$$;
+
+-- ============================================
+-- Incremental maintenance: one upsert per (side, period)
+-- ============================================
+
+CREATE OR REPLACE FUNCTION spending_apply() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_local_date DATE := (NEW.created_at AT TIME ZONE 'Asia/Kolkata')::DATE;
+    v_bill_type TEXT := spending_bill_type(NEW.type, NEW.note);
+BEGIN
+    IF NEW.status IS DISTINCT FROM 'success' THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO spending_aggregates AS a (user_id, period, period_start, direction, type, bill_type, total, count)
+    SELECT side.user_id, p.period, p.period_start, side.direction, NEW.type, v_bill_type, NEW.amount, 1
+      FROM (VALUES (NEW.sender_id, 'out'), (NEW.receiver_id, 'in')) AS side(user_id, direction)
+     CROSS JOIN (VALUES ('day', v_local_date),
+                        ('month', DATE_TRUNC('month', v_local_date)::DATE)) AS p(period, period_start)
+     WHERE side.user_id IS NOT NULL
+    ON CONFLICT (user_id, period, period_start, direction, type, bill_type)
+    DO UPDATE SET total = a.total + EXCLUDED.total,
+                  count = a.count + 1;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_transactions_spending ON transactions;
+CREATE TRIGGER trg_transactions_spending
+    AFTER INSERT ON transactions
+    FOR EACH ROW EXECUTE FUNCTION spending_apply();
+
+-- ============================================
+-- rebuild_spending_aggregates: backfill from transactions
+-- Recomputes one user (or everyone when p_user_id is NULL).
+-- ============================================
+
+CREATE OR REPLACE FUNCTION rebuild_spending_aggregates(p_user_id UUID DEFAULT NULL) RETURNS JSON
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    -- Block concurrent postings for the affected rows while rebuilding
+    LOCK TABLE spending_aggregates IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM spending_aggregates WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO spending_aggregates (user_id, period, period_start, direction, type, bill_type, total, count)
+    SELECT side.user_id, p.period, p.period_start, side.direction, t.type,
+           spending_bill_type(t.type, t.note), SUM(t.amount), COUNT(*)
+      FROM transactions t
+     CROSS JOIN LATERAL (VALUES (t.sender_id, 'out'), (t.receiver_id, 'in')) AS side(user_id, direction)
+     CROSS JOIN LATERAL (VALUES ('day', (t.created_at AT TIME ZONE 'Asia/Kolkata')::DATE),
+                                ('month', DATE_TRUNC('month', t.created_at AT TIME ZONE 'Asia/Kolkata')::DATE)) AS p(period, period_start)
+     WHERE t.status = 'success'
+       AND side.user_id IS NOT NULL
+       AND (p_user_id IS NULL OR side.user_id = p_user_id)
+     GROUP BY 1, 2, 3, 4, 5, 6;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN json_build_object('rows', v_rows);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION rebuild_spending_aggregates(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_spending_aggregates(UUID) TO service_role;
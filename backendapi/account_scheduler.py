@@ -0,0 +1,79 @@
+"""
+Per-account serialized execution for balance-mutating operations.
+
+Every account gets its own FIFO lane (an asyncio.Lock, whose waiters are woken
+in arrival order). Operations on different accounts run fully in parallel;
+operations on the same account never interleave. Operations touching two
+accounts (transfers) take both lanes in sorted ID order, so two opposite
+transfers can never deadlock.
+
+This serializes work inside one worker process. Across workers, the
+`post_transaction` procedure's row locks keep balances consistent.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+
+
+class _Lane:
+    """FIFO lock for one account plus the number of operations using it."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class AccountScheduler:
+    """Shards balance mutations by account ID onto ordered, per-account lanes."""
+
+    def __init__(self):
+        self._lanes: Dict[str, _Lane] = {}
+        self.operations = 0
+        self.contended = 0
+
+    @asynccontextmanager
+    async def serialize(self, *account_ids: Optional[str]) -> AsyncIterator[None]:
+        """
+        Run the enclosed block exclusively for the given accounts.
+
+        Usage:
+            async with scheduler.serialize(sender_id, receiver_id):
+                ...
+        """
+        ordered = sorted({account_id for account_id in account_ids if account_id})
+        lanes = []
+        for account_id in ordered:
+            lane = self._lanes.get(account_id)
+            if lane is None:
+                lane = self._lanes[account_id] = _Lane()
+            lane.users += 1
+            lanes.append((account_id, lane))
+
+        self.operations += 1
+        acquired = []
+        try:
+            for _, lane in lanes:
+                if lane.lock.locked():
+                    self.contended += 1
+                await lane.lock.acquire()
+                acquired.append(lane)
+            yield
+        finally:
+            for lane in reversed(acquired):
+                lane.lock.release()
+            for account_id, lane in lanes:
+                lane.users -= 1
+                if lane.users == 0:
+                    # Idle lanes are dropped so the map only holds busy accounts
+                    del self._lanes[account_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Operation and contention counters."""
+        return {
+            "active_accounts": len(self._lanes),
+            "operations": self.operations,
+            "contended": self.contended
+        }
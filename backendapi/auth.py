@@ -3,12 +3,17 @@ Authentication and authorization using Supabase JWT.
 Provides middleware and dependencies for protected routes.
 """
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client
 from config import settings
-from typing import Optional, Dict, Any
-from database import db
+from typing import Optional, Dict, Any, Tuple
+from database import async_db
+from cache import TTLCache
+import hashlib
+import time
+import jwt
 
 
 # Security scheme for JWT bearer tokens
@@ -17,6 +22,90 @@ security = HTTPBearer()
 # Supabase client for auth verification
 auth_client = create_client(settings.supabase_url, settings.supabase_key)
 
+# Signing keys for asymmetric (RS256/ES256) Supabase projects, fetched once and cached
+jwks_client = jwt.PyJWKClient(
+    settings.supabase_jwks_url or f"{settings.supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+)
+
+# Already-validated tokens: sha256(token) -> user ID, evicted at the token's `exp`
+token_cache = TTLCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_max_ttl)
+
+
+def _key_uses(signing_key: jwt.PyJWK, algorithm: str) -> bool:
+    """Whether a JWKS key's own algorithm (its `alg`, or implied by its type) is `algorithm`."""
+    expected = jwt.get_algorithm_by_name(algorithm)
+    actual = signing_key.Algorithm
+    return type(actual) is type(expected) and getattr(actual, "hash_alg", None) == getattr(expected, "hash_alg", None)
+
+
+def verify_jwt_locally(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase JWT signature and claims without a network call.
+    
+    Returns:
+        dict: Token claims, or None if no local key is configured for the token's algorithm.
+    
+    Raises:
+        jwt.InvalidTokenError: If the token is malformed, expired, badly signed
+            or uses an algorithm not allowed for its key (e.g. `none`).
+    """
+    # The header is attacker-controlled: it only picks the key, never widens
+    # the algorithms a key is accepted with
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    
+    if algorithm == "HS256":
+        if not settings.supabase_jwt_secret:
+            return None
+        key = settings.supabase_jwt_secret
+        algorithms = ["HS256"]
+    elif algorithm in settings.jwt_algorithms:
+        # JWKS lookup may hit the network once; PyJWKClient caches the keys afterwards
+        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        if not _key_uses(signing_key, algorithm):
+            raise jwt.InvalidAlgorithmError(f"Token algorithm {algorithm!r} does not match its signing key")
+        key = signing_key.key
+        algorithms = [algorithm]
+    else:
+        raise jwt.InvalidAlgorithmError(f"Token algorithm {algorithm!r} is not allowed")
+    
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=settings.jwt_audience,
+        options={"require": ["exp", "sub"]}
+    )
+
+
+async def _resolve_token(token: str) -> Tuple[str, Optional[str], float]:
+    """Return (user_id, email, expires_at) for a token, verifying locally when possible."""
+    claims = None
+    if not settings.auth_remote_verify:
+        if jwt.get_unverified_header(token).get("alg") == "HS256":
+            claims = verify_jwt_locally(token)
+        else:
+            claims = await run_in_threadpool(verify_jwt_locally, token)
+    
+    if claims:
+        return claims["sub"], claims.get("email"), float(claims["exp"])
+    
+    # Fallback: ask Supabase Auth (no local key, or remote verification forced)
+    user_response = await run_in_threadpool(auth_client.auth.get_user, token)
+    
+    if not user_response or not user_response.user:
+        # If they provided a fake token, we still block them
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token. Remove token to use Bypass mode.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    try:
+        expires_at = float(jwt.decode(token, options={"verify_signature": False})["exp"])
+    except Exception:
+        expires_at = time.time() + settings.token_cache_max_ttl
+    return user_response.user.id, user_response.user.email, expires_at
+
 
 async def validate_token(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
@@ -36,24 +125,20 @@ async def validate_token(
 
     # 2. If a token IS provided, validate it normally
     token = credentials.credentials
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    
+    # 3. Already validated and not yet expired: no network calls at all
+    cached_user_id = token_cache.get(token_key)
+    if cached_user_id:
+        return cached_user_id
     
     try:
-        # Validate with Supabase
-        user_response = auth_client.auth.get_user(token)
-        
-        if not user_response or not user_response.user:
-            # If they provided a fake token, we still block them
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token. Remove token to use Bypass mode.",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        
-        user_id = user_response.user.id
+        user_id, email, expires_at = await _resolve_token(token)
         
         # AUTO-SYNC: Ensure user exists in our local DB table with default balance
-        db.sync_user(user_id, user_response.user.email)
+        await async_db.sync_user(user_id, email)
         
+        token_cache.set(token_key, user_id, ttl=min(expires_at - time.time(), settings.token_cache_max_ttl))
         return user_id
         
     except Exception as e:
@@ -65,6 +150,29 @@ async def validate_token(
         )
 
 
+async def get_websocket_user_id(websocket: WebSocket) -> Optional[str]:
+    """
+    Authenticate a WebSocket handshake.
+    
+    Browsers cannot set headers on WebSockets, so the token may also be passed
+    as `?token=`. With no token the bypass test user is used, as for HTTP.
+    
+    Returns:
+        str: User ID, or None after closing the socket if the token is invalid.
+    """
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token) if token else None
+    try:
+        return await validate_token(credentials)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return None
+
+
 def get_current_user_id(user_id: str = Depends(validate_token)) -> str:
     """
     Convenience dependency to get current authenticated user ID.
@@ -77,11 +185,11 @@ def get_current_user_id(user_id: str = Depends(validate_token)) -> str:
     return user_id
 
 
-def verify_login_pin(user_id: str, pin: str) -> bool:
+async def verify_login_pin(user_id: str, pin: str) -> bool:
     """
     Verify the 6-digit login PIN for a user.
     """
-    return db.verify_user_pin(user_id, pin, "login")
+    return await async_db.verify_user_pin(user_id, pin, "login")
 
 
 def mock_voice_unlock(user_id: str, audio_sample: Optional[str] = None) -> Dict[str, Any]:
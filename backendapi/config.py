@@ -16,6 +16,66 @@ class Settings(BaseSettings):
     supabase_service_key: Optional[str] = None
     database_url: str
     
+    # Database HTTP Pool Configuration (async PostgREST client)
+    db_pool_max_connections: int = 20
+    db_pool_max_keepalive: int = 10
+    db_pool_keepalive_expiry: float = 30.0
+    db_connect_timeout: float = 5.0
+    db_read_timeout: float = 10.0
+    
+    # Database Backend: "postgrest" (HTTPS via Supabase) or "postgres" (direct, uses DATABASE_URL)
+    db_backend: str = "postgrest"
+    pg_pool_size: int = 10
+    pg_max_overflow: int = 10
+    pg_pool_recycle: int = 1800
+    pg_statement_cache_size: int = 100  # set to 0 behind a transaction-mode pooler (pgbouncer)
+    
+    # Data-layer Caches
+    phone_cache_size: int = 10000
+    phone_cache_ttl: float = 600.0  # per process; postings re-check the phone, so a stale entry cannot misroute
+    account_cache_size: int = 10000
+    account_cache_fresh_ttl: float = 0.0  # served without a database read; per process, keep 0 with several workers
+    account_cache_stale_ttl: float = 300.0  # may be served (flagged stale) while refreshing
+    account_cache_refresh_timeout: float = 0.3  # wait this long for a refresh before serving stale
+    
+    # Two-step Transfer/Bill Payment Confirmation
+    # Tokens live in process memory: behind several workers, use sticky sessions
+    # (unlike IDEMPOTENCY_BACKEND, there is no shared backend for them)
+    pending_action_ttl: float = 120.0
+    pending_action_cache_size: int = 10000
+    pending_action_max_attempts: int = 3  # wrong PINs before the token is burned
+    
+    # Idempotency-Key Replay: "memory" (per process) or "database" (idempotency_keys table)
+    idempotency_backend: str = "memory"
+    idempotency_ttl: float = 86400.0
+    idempotency_cache_size: int = 10000
+    
+    # Bulk Payouts
+    batch_transfer_max_items: int = 500
+    
+    # Posting Group Commit (concurrent postings share one database transaction)
+    posting_group_size: int = 50  # postings per group; 1 posts each on its own
+    posting_group_delay: float = 0.0  # extra seconds a group waits for more postings
+    
+    # Statement Export
+    statement_chunk_size: int = 500  # rows fetched per side per round trip
+    
+    # Voice Intent Parsing
+    intent_cache_size: int = 4096  # parse results kept per process; 0 disables
+    intent_batch_max_items: int = 10000  # texts per /voice/intent/batch request
+    intent_batch_chunk_size: int = 2000  # texts per process-pool task; smaller batches are parsed inline
+    intent_batch_workers: int = 0  # process-pool size; 0 = one per CPU
+    
+    # Auth Configuration
+    supabase_jwt_secret: Optional[str] = None  # HS256 projects: Settings -> API -> JWT Secret
+    supabase_jwks_url: Optional[str] = None  # asymmetric keys; defaults to <SUPABASE_URL>/auth/v1/.well-known/jwks.json
+    jwt_audience: str = "authenticated"
+    jwt_algorithms: List[str] = ["RS256", "ES256"]  # accepted with JWKS keys; HS256 only with the JWT secret
+    auth_remote_verify: bool = False  # also call Supabase Auth get_user() on every cache miss
+    token_cache_size: int = 10000
+    token_cache_max_ttl: float = 300.0
+    known_users_path: Optional[str] = None  # SQLite file to share the known-user set across workers
+    
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
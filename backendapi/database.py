@@ -2,13 +2,106 @@
 Supabase database client and utilities.
 Handles all database operations using Supabase PostgREST client (HTTPS).
 Bypasses direct PostgreSQL DNS/TCP issues.
+
+`Database` is the blocking client kept for the helper scripts.
+`AsyncDatabase` is used by the API routers so a slow Supabase call
+never stalls the event loop.
 """
 
 from supabase import create_client
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
 from config import settings
-from typing import Optional, Dict, Any, List
+from user_registry import KnownUserRegistry
+from cache import TTLCache
+from account_scheduler import AccountScheduler
+from group_commit import GroupCommitWriter
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Awaitable, Callable, Hashable, Tuple
+from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import httpx
+import re
+import time
 import uuid
 import hashlib
+import itertools
+
+# Posting error when a receiver's phone no longer matches the number it was resolved from
+RECEIVER_PHONE_CHANGED = "Receiver phone changed"
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a Postgres ISO timestamp of any fractional-second precision."""
+    value = value.replace("Z", "+00:00")
+    match = re.match(r"^(.*T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(.*)$", value)
+    if match:
+        base, fraction, offset = match.groups()
+        value = f"{base}.{(fraction or '0').ljust(6, '0')[:6]}{offset}"
+    return datetime.fromisoformat(value)
+
+
+def parse_keyset_position(position: Tuple[str, str]) -> Tuple[str, str]:
+    """
+    Validate a `(created_at, id)` history position and return it normalized.
+    Raises ValueError unless it is an ISO timestamp and a UUID, so it is safe
+    to embed in a query filter.
+    """
+    created_at, tx_id = position
+    if not isinstance(created_at, str) or not isinstance(tx_id, str):
+        raise ValueError("position fields must be strings")
+    return parse_timestamp(created_at).isoformat(), str(uuid.UUID(tx_id))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: while a fetch for a key is in flight,
+    further callers for that key await the same upstream call instead of
+    issuing their own. Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return `fetch()`'s result, sharing one in-flight call per key."""
+        self.calls += 1
+        task = self._calls.get(key)
+        if task is None:
+            # A separate task, so one caller being cancelled does not cancel the others
+            task = asyncio.ensure_future(fetch())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        else:
+            self.shared += 1
+
+        result = await asyncio.shield(task)
+        # Every caller gets its own copy of a row
+        return dict(result) if isinstance(result, dict) else result
+
+    def forget(self, key: Hashable) -> None:
+        """Make later callers start a fresh fetch (e.g. after a write to the row)."""
+        self._calls.pop(key, None)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved: errors are re-raised to the awaiting callers
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls, upstream fetches and the share of calls served by another caller's fetch."""
+        return {
+            "calls": self.calls,
+            "upstream": self.calls - self.shared,
+            "coalesced": self.shared,
+            "coalescing_ratio": round(self.shared / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._calls)
+        }
+
 
 class Database:
     """Supabase database wrapper using PostgREST client."""
@@ -37,25 +130,6 @@ class Database:
             print(f"Error fetching user by phone: {e}")
             return None
     
-    def update_balance(self, user_id: str, amount: float) -> bool:
-        """Update user balance safely."""
-        try:
-            # First get current balance
-            user = self.get_user_by_id(user_id)
-            if not user:
-                return False
-            
-            new_balance = float(user["balance"]) + amount
-            if new_balance < 0:
-                return False
-                
-            print(f"[DB] Updating balance for {user_id}: {user['balance']} -> {new_balance}")
-            self.client.table("users").update({"balance": new_balance}).eq("id", user_id).execute()
-            return True
-        except Exception as e:
-            print(f"Error updating balance: {e}")
-            return False
-    
     def create_transaction(self, transaction_data: Dict[str, Any]) -> Optional[str]:
         """Create a transaction record."""
         try:
@@ -140,6 +214,28 @@ class Database:
             print(f"Error syncing user: {e}")
             return False
 
+    def post_transaction(self, sender_id: str, receiver_id: Optional[str], amount: float, tx_type: str = "transfer", note: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Debit sender, credit receiver (if any) and record the transaction
+        atomically via the `post_transaction` stored procedure (one round trip).
+        """
+        try:
+            result = self.client.rpc("post_transaction", {
+                "p_sender_id": sender_id,
+                "p_receiver_id": receiver_id,
+                "p_amount": amount,
+                "p_type": tx_type,
+                "p_note": note
+            }).execute()
+            posted = result.data or {"success": False, "error": "Posting failed"}
+            if posted.get("success"):
+                print(f"[DB] Posted {tx_type} {posted['transaction_id']}: {sender_id} -> {receiver_id} (₹{amount})")
+                posted["new_balance"] = float(posted["new_balance"])
+            return posted
+        except Exception as e:
+            print(f"Error posting transaction: {e}")
+            return {"success": False, "error": str(e)}
+
     def execute_transfer(self, sender_id: str, receiver_id: str, amount: float, note: Optional[str] = None, transfer_pin: Optional[str] = None) -> Dict[str, Any]:
         """Execute transfer with balance validation and PIN check."""
         # Max limit check
@@ -158,42 +254,805 @@ class Database:
             if not self.verify_user_pin(sender_id, transfer_pin, "transfer"):
                 return {"success": False, "error": "Invalid transfer PIN"}
 
+        # Debit, credit and journal row in a single database transaction
+        return self.post_transaction(sender_id, receiver_id, amount, "transfer", note)
+
+class UnitOfWork:
+    """
+    Request-scoped identity map for `users` rows.
+    Repeated reads of the same user within one request are served from memory;
+    any write to that user in the request evicts it.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.phones: Dict[str, str] = {}
+        self.round_trips_saved = 0
+
+    def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the mapped row, counting the saved round trip."""
+        row = self.users.get(user_id)
+        if row is None:
+            return None
+        self.round_trips_saved += 1
+        return dict(row)
+
+    def get_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the mapped row for a phone number, if loaded."""
+        user_id = self.phones.get(phone)
+        return self.get_by_id(user_id) if user_id else None
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Map a freshly fetched row."""
+        self.users[row["id"]] = dict(row)
+        if row.get("phone"):
+            self.phones[row["phone"]] = row["id"]
+
+    def evict(self, user_id: str) -> None:
+        """Drop a user whose row was written in this request."""
+        row = self.users.pop(user_id, None)
+        if row and row.get("phone"):
+            self.phones.pop(row["phone"], None)
+
+
+_current_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+# Process-wide totals across finished units of work
+unit_of_work_stats = {"units": 0, "round_trips_saved": 0}
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Open a request-scoped identity map for the current context.
+    
+    Usage:
+        with unit_of_work() as uow:
+            ...
+        print(uow.round_trips_saved)
+    """
+    uow = UnitOfWork()
+    token = _current_unit_of_work.set(uow)
+    try:
+        yield uow
+    finally:
+        _current_unit_of_work.reset(token)
+        unit_of_work_stats["units"] += 1
+        unit_of_work_stats["round_trips_saved"] += uow.round_trips_saved
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client backed by a bounded keep-alive connection pool."""
+
+    def create_session(self, base_url: str, headers: Dict[str, str], timeout, verify: bool = True) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.db_pool_max_connections,
+            max_keepalive_connections=settings.db_pool_max_keepalive,
+            keepalive_expiry=settings.db_pool_keepalive_expiry
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            limits=limits,
+            follow_redirects=True
+        )
+
+
+class AsyncDatabase:
+    """
+    Non-blocking Supabase database wrapper sharing one pooled HTTP client.
+
+    All network I/O goes through the small `_fetch_*` / `_insert_*` /
+    `_update_*` / `_post` primitives, so alternative backends (see
+    `pg_database.PostgresDatabase`) only need to override those.
+    """
+
+    def __init__(self):
+        """Prepare connection settings. The pool is opened lazily on first use."""
+        key = settings.supabase_service_key or settings.supabase_key
+        self._rest_url = f"{settings.supabase_url.rstrip('/')}/rest/v1"
+        self._headers = {
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            "apikey": key,
+            "Authorization": f"Bearer {key}"
+        }
+        self._timeout = httpx.Timeout(settings.db_read_timeout, connect=settings.db_connect_timeout)
+        self._client: Optional[PooledPostgrestClient] = None
+
+        # Users already confirmed to exist, so sync_user can skip the lookup
+        self.known_users = KnownUserRegistry(settings.known_users_path)
+
+        # Payee resolution: phone -> {"id", "name"}, plus user_id -> phone for invalidation
+        self.phone_cache = TTLCache(maxsize=settings.phone_cache_size, ttl=settings.phone_cache_ttl)
+        self._phone_of_user = TTLCache(maxsize=settings.phone_cache_size, ttl=settings.phone_cache_ttl)
+
+        # Balance mutations on the same account never interleave within this process
+        self.accounts = AccountScheduler()
+
+        # Concurrent reads of the same user share one upstream call
+        self.reads = SingleFlight()
+
+        # Stale-while-revalidate account rows for the balance/profile read path.
+        # Entries are dropped on every write this process makes to the row;
+        # `_account_generation` stops a read that raced a write from being cached.
+        self.account_cache = TTLCache(maxsize=settings.account_cache_size, ttl=settings.account_cache_stale_ttl)
+        self._account_generation = TTLCache(maxsize=settings.account_cache_size, ttl=settings.account_cache_stale_ttl)
+        self._generation = itertools.count(1)
+        self.stale_served = 0
+
+        # Postings from concurrent requests are committed together (see group_commit.py)
+        self.postings = GroupCommitWriter(
+            self._flush_postings,
+            max_batch=settings.posting_group_size,
+            max_delay=settings.posting_group_delay
+        )
+
+    @property
+    def client(self) -> PooledPostgrestClient:
+        """Shared PostgREST client (created on first access)."""
+        if self._client is None:
+            self._client = PooledPostgrestClient(
+                self._rest_url,
+                headers=self._headers,
+                timeout=self._timeout
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Commit queued postings and close pooled connections (called on application shutdown)."""
+        await self.postings.close()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ============== I/O Primitives ==============
+
+    async def _fetch_user(self, column: str, value: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single users row where `column` equals `value`."""
+        result = await self.client.table("users").select("*").eq(column, value).execute()
+        return result.data[0] if result.data else None
+
+    async def _insert_user(self, data: Dict[str, Any]) -> None:
+        """Insert a users row."""
+        await self.client.table("users").insert(data).execute()
+
+    async def _update_user(self, user_id: str, data: Dict[str, Any]) -> None:
+        """Update columns of a users row."""
+        await self.client.table("users").update(data).eq("id", user_id).execute()
+
+    async def _insert_transaction(self, data: Dict[str, Any]) -> Optional[str]:
+        """Insert a transactions row and return its ID."""
+        result = await self.client.table("transactions").insert(data).execute()
+        return result.data[0]["id"] if result.data else None
+
+    async def _fetch_transactions(self, user_id: str, limit: int, transaction_type: Optional[str]) -> List[Dict[str, Any]]:
+        """Fetch the newest transactions where the user is sender or receiver."""
+        query = self.client.table("transactions").select("*").or_(f"sender_id.eq.{user_id},receiver_id.eq.{user_id}").order("created_at", desc=True).limit(limit)
+
+        if transaction_type:
+            query = query.eq("type", transaction_type)
+
+        result = await query.execute()
+        return result.data
+
+    async def _fetch_transactions_keyset(self, column: str, user_id: str, limit: int, transaction_type: Optional[str] = None, before: Optional[Tuple[str, str]] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch one side (`sender_id` or `receiver_id`) of a user's history, newest
+        first, strictly after the `(created_at, id)` keyset position `before`.
+        Served by the (column, created_at DESC, id DESC) index, so cost is O(limit).
+        """
+        query = self.client.table("transactions").select("*").eq(column, user_id)
+
+        if transaction_type:
+            query = query.eq("type", transaction_type)
+        if since:
+            query = query.gte("created_at", since.isoformat())
+        if until:
+            query = query.lt("created_at", until.isoformat())
+        if before:
+            created_at, tx_id = parse_keyset_position(before)
+            # The OR alone is not an index range; `lte` starts the index scan at
+            # the cursor and the OR only drops the ties on created_at
+            query = query.lte("created_at", created_at).or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{tx_id}")')
+
+        result = await query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
+        return result.data
+
+    async def _fetch_spending(self, user_id: str, period: str, period_start: str) -> List[Dict[str, Any]]:
+        """Fetch a user's spending aggregate rows for one period (primary-key range read)."""
+        result = await self.client.table("spending_aggregates").select("direction,type,bill_type,total,count").eq("user_id", user_id).eq("period", period).eq("period_start", period_start).execute()
+        return result.data
+
+    async def _claim_idempotency_key(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert a pending idempotency row; return the existing row if the key is already taken."""
+        result = await self.client.table("idempotency_keys").upsert(row, on_conflict="user_id,scope,key", ignore_duplicates=True).execute()
+        if result.data:
+            return None
+        existing = await self.client.table("idempotency_keys").select("*").eq("user_id", row["user_id"]).eq("scope", row["scope"]).eq("key", row["key"]).limit(1).execute()
+        return existing.data[0] if existing.data else None
+
+    async def _complete_idempotency_key(self, user_id: str, scope: str, key: str, response: Dict[str, Any]) -> None:
+        """Store the response of a claimed idempotency key."""
+        await self.client.table("idempotency_keys").update({"response": response}).eq("user_id", user_id).eq("scope", scope).eq("key", key).execute()
+
+    async def _release_idempotency_key(self, user_id: str, scope: str, key: str) -> None:
+        """Delete an idempotency row so the key can be used again."""
+        await self.client.table("idempotency_keys").delete().eq("user_id", user_id).eq("scope", scope).eq("key", key).execute()
+
+    async def _post(self, sender_id: str, receiver_id: Optional[str], amount: float, tx_type: str, note: Optional[str], receiver_phone: Optional[str] = None) -> Dict[str, Any]:
+        """Run the `post_transaction` stored procedure."""
+        result = await self.client.rpc("post_transaction", {
+            "p_sender_id": sender_id,
+            "p_receiver_id": receiver_id,
+            "p_amount": amount,
+            "p_type": tx_type,
+            "p_note": note,
+            "p_receiver_phone": receiver_phone
+        }).execute()
+        return result.data or {"success": False, "error": "Posting failed"}
+
+    # ============== Cache Coherence ==============
+
+    def _user_changed(self, user_id: str) -> None:
+        """Evict a user from request-scoped state after a write to their row."""
+        uow = _current_unit_of_work.get()
+        if uow is not None:
+            uow.evict(user_id)
+
+        self.account_cache.pop(user_id)
+        self._account_generation.set(user_id, next(self._generation))
+
+        # Reads already in flight may predate the write; don't let new callers join them
+        self.reads.forget(("id", user_id))
+        phone = self._phone_of_user.get(user_id)
+        if phone:
+            self.reads.forget(("phone", phone))
+
+    @contextmanager
+    def _writing(self, *user_ids: Optional[str]) -> Iterator[None]:
+        """
+        Invalidate cached state for users around a write to their rows: before,
+        so the write path re-reads, and after, so reads that raced it are dropped.
+        """
+        for user_id in user_ids:
+            if user_id:
+                self._user_changed(user_id)
         try:
-            # Fetch sender and receiver
-            sender = self.get_user_by_id(sender_id)
-            receiver = self.get_user_by_id(receiver_id)
+            yield
+        finally:
+            for user_id in user_ids:
+                if user_id:
+                    self._user_changed(user_id)
 
-            if not sender: return {"success": False, "error": "Sender not found"}
-            if not receiver: return {"success": False, "error": "Receiver not found"}
-            
-            if float(sender["balance"]) < amount:
-                return {"success": False, "error": "Insufficient funds", "current_balance": float(sender["balance"])}
-
-            # Atomicity note: PostgREST doesn't support easy transactions without RPC.
-            # In a real app, use an RPC for this. For hackathon, we'll do sequential updates.
-            # Update sender
-            self.client.table("users").update({"balance": float(sender["balance"]) - amount}).eq("id", sender_id).execute()
-            # Update receiver
-            self.client.table("users").update({"balance": float(receiver["balance"]) + amount}).eq("id", receiver_id).execute()
-            
-            # Record transaction
-            tx_id = str(uuid.uuid4())
-            print(f"[DB] Recording transaction {tx_id}: {sender_id} -> {receiver_id} (₹{amount})")
-            self.client.table("transactions").insert({
-                "id": tx_id,
-                "sender_id": sender_id,
-                "receiver_id": receiver_id,
-                "amount": amount,
-                "type": "transfer",
-                "status": "success",
-                "note": note
-            }).execute()
+    def _remember_phone(self, phone: str, user_id: str, name: Optional[str]) -> None:
+        """Write-through: cache a phone -> (id, name) mapping."""
+        self.phone_cache.set(phone, {"id": user_id, "name": name})
+        self._phone_of_user.set(user_id, phone)
 
-            return {"success": True, "transaction_id": tx_id, "new_balance": float(sender["balance"]) - amount}
-            
+    def _forget_phone(self, user_id: str, new_phone: Optional[str] = None) -> None:
+        """Drop the user's cached phone mapping (and any stale owner of `new_phone`)."""
+        old_phone = self._phone_of_user.pop(user_id)
+        if old_phone:
+            self.phone_cache.pop(old_phone)
+        if new_phone:
+            self.phone_cache.pop(new_phone)
+
+    def forget_user(self, user_id: str) -> None:
+        """Invalidation hook: drop everything cached about a user (call after deleting the row)."""
+        self.known_users.discard(user_id)
+        self._forget_phone(user_id)
+        self._user_changed(user_id)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the data-layer caches, for sizing them."""
+        return {
+            "phone": self.phone_cache.stats(),
+            "identity_map": dict(unit_of_work_stats),
+            "single_flight": self.reads.stats(),
+            "account": {**self.account_cache.stats(), "stale_served": self.stale_served}
+        }
+
+    async def _fetch_users_by_phones(self, phones: List[str]) -> List[Dict[str, Any]]:
+        """Fetch id/name/phone for many phone numbers in one query."""
+        result = await self.client.table("users").select("id,name,phone").in_("phone", phones).execute()
+        return result.data
+
+    async def _post_batch(self, sender_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run the `post_transfer_batch` stored procedure."""
+        result = await self.client.rpc("post_transfer_batch", {
+            "p_sender_id": sender_id,
+            "p_transfers": items
+        }).execute()
+        return result.data or {"success": False, "error": "Posting failed"}
+
+    async def _post_group(self, postings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run the `post_group` stored procedure: many postings, one database transaction."""
+        result = await self.client.rpc("post_group", {"p_postings": postings}).execute()
+        return result.data or []
+
+    # ============== Posting Group Commit ==============
+
+    async def _post_one(self, posting: Dict[str, Any]) -> Dict[str, Any]:
+        """Post a single queued posting through its own procedure call."""
+        if posting["kind"] == "batch":
+            return await self._post_batch(posting["sender_id"], posting["items"])
+        return await self._post(posting["sender_id"], posting["receiver_id"], posting["amount"], posting["type"], posting["note"], posting["receiver_phone"])
+
+    async def _flush_postings(self, postings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Commit a group of postings; a group of one skips `post_group`."""
+        if len(postings) == 1:
+            return [await self._post_one(postings[0])]
+
+        results = await self._post_group(postings)
+        for i, result in enumerate(results):
+            # Lost a lock race (deadlock/serialization) with another worker's group:
+            # only this posting was rolled back, so it is safe to post again alone
+            if str(result.get("sqlstate") or "").startswith("40"):
+                results[i] = await self._post_one(postings[i])
+        return results
+
+    # ============== Public API ==============
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch user account by ID."""
+        uow = _current_unit_of_work.get()
+        if uow is not None:
+            cached = uow.get_by_id(user_id)
+            if cached is not None:
+                return cached
+
+        try:
+            user = await self.reads.do(("id", user_id), lambda: self._fetch_user("id", user_id))
+        except Exception as e:
+            print(f"Error fetching user by ID: {e}")
+            return None
+
+        if uow is not None and user:
+            uow.add(user)
+        return user
+
+    async def get_account(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Read a user row for display (balance/profile), stale-while-revalidate.
+
+        Every read refreshes the row; if the database does not answer within
+        ACCOUNT_CACHE_REFRESH_TIMEOUT (or fails), the cached row is served
+        flagged stale and the refresh keeps running in the background.
+
+        Entries younger than ACCOUNT_CACHE_FRESH_TTL (default 0, off) are served
+        from memory without a read. The cache is per process and only dropped
+        by writes made here, so a fresh window must stay off with several
+        workers: a credit posted by another worker would be reported fresh.
+
+        Returns:
+            (user, stale): `stale` is True when the row may be out of date.
+        """
+        entry = self.account_cache.get(user_id)
+        if entry is not None and time.monotonic() - entry["fetched_at"] < settings.account_cache_fresh_ttl:
+            return dict(entry["user"]), False
+
+        refresh = asyncio.ensure_future(self._refresh_account(user_id))
+        if entry is None:
+            return await refresh, False
+
+        try:
+            user = await asyncio.wait_for(asyncio.shield(refresh), timeout=settings.account_cache_refresh_timeout)
+            if user is not None:
+                return user, False
+        except asyncio.TimeoutError:
+            pass
+
+        self.stale_served += 1
+        return dict(entry["user"]), True
+
+    async def _refresh_account(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a user row and cache it, unless the row was written meanwhile."""
+        generation = self._account_generation.get(user_id, 0)
+        user = await self.get_user_by_id(user_id)
+        if user and self._account_generation.get(user_id, 0) == generation:
+            self.account_cache.set(user_id, {"user": dict(user), "fetched_at": time.monotonic()})
+        return user
+
+    async def get_user_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Fetch user account by phone number."""
+        uow = _current_unit_of_work.get()
+        if uow is not None:
+            cached = uow.get_by_phone(phone)
+            if cached is not None:
+                return cached
+
+        try:
+            user = await self.reads.do(("phone", phone), lambda: self._fetch_user("phone", phone))
+        except Exception as e:
+            print(f"Error fetching user by phone: {e}")
+            return None
+
+        if uow is not None and user:
+            uow.add(user)
+        if user:
+            self._remember_phone(phone, user["id"], user.get("name"))
+        return user
+
+    async def resolve_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a payee phone number to {"id", "name"}.
+        Served from the phone cache when possible; unknown numbers are not cached.
+        """
+        cached = self.phone_cache.get(phone)
+        if cached is not None:
+            return dict(cached)
+
+        user = await self.get_user_by_phone(phone)
+        if not user:
+            return None
+        return {"id": user["id"], "name": user.get("name")}
+
+    async def resolve_phones(self, phones: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve many payee phone numbers to {"id", "name"} at once.
+        Cached numbers are served from the phone cache; the rest are fetched in one
+        `in` query. Unknown numbers are absent from the result.
+        """
+        resolved: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for phone in dict.fromkeys(phones):
+            cached = self.phone_cache.get(phone)
+            if cached is not None:
+                resolved[phone] = dict(cached)
+            else:
+                missing.append(phone)
+
+        if missing:
+            try:
+                rows = await self._fetch_users_by_phones(missing)
+            except Exception as e:
+                print(f"Error fetching users by phone: {e}")
+                rows = []
+            for row in rows:
+                if row["phone"] in resolved:
+                    continue
+                resolved[row["phone"]] = {"id": row["id"], "name": row.get("name")}
+                self._remember_phone(row["phone"], row["id"], row.get("name"))
+        return resolved
+
+    async def create_transaction(self, transaction_data: Dict[str, Any]) -> Optional[str]:
+        """Create a transaction record."""
+        try:
+            if "id" not in transaction_data:
+                transaction_data["id"] = str(uuid.uuid4())
+
+            return await self._insert_transaction(transaction_data)
+        except Exception as e:
+            print(f"Error creating transaction: {e}")
+            return None
+
+    async def set_user_pin(self, user_id: str, pin: str, pin_type: str = "login", phone: str = None) -> bool:
+        """Set or update user PIN (hashed) and optionally phone."""
+        column = "login_pin" if pin_type == "login" else "transfer_pin"
+        data = {column: hashlib.sha256(pin.encode()).hexdigest()}
+        if phone:
+            data["phone"] = phone
+
+        try:
+            if phone:
+                self._forget_phone(user_id, phone)
+            with self._writing(user_id):
+                await self._update_user(user_id, data)
+            return True
+        except Exception as e:
+            print(f"Error setting PIN/Profile: {e}")
+            return False
+
+    async def verify_user_pin(self, user_id: str, pin: str, pin_type: str = "login") -> bool:
+        """Verify user PIN."""
+        column = "login_pin" if pin_type == "login" else "transfer_pin"
+        try:
+            user = await self.get_user_by_id(user_id)
+            if not user or not user.get(column):
+                return False
+
+            hashed_pin = hashlib.sha256(pin.encode()).hexdigest()
+            db_pin = user.get(column)
+            print(f"[DB] PIN Verify for {user_id} ({pin_type}): Input_Hash={hashed_pin[:8]}... DB_Hash={db_pin[:8] if db_pin else 'NONE'}...")
+            return db_pin == hashed_pin
+        except Exception as e:
+            print(f"Error verifying PIN: {e}")
+            return False
+
+    async def get_transaction_history(self, user_id: str, limit: int = 50, transaction_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch transaction history for a user."""
+        try:
+            return await self._fetch_transactions(user_id, limit, transaction_type)
+        except Exception as e:
+            print(f"Error fetching transaction history: {e}")
+            return []
+
+    async def get_transaction_page(self, user_id: str, limit: int = 50, transaction_type: Optional[str] = None, before: Optional[Tuple[str, str]] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """
+        Keyset-paginated transaction history, newest first.
+
+        Sent and received transactions are fetched concurrently from their own
+        indexes and merged, so every page costs O(limit) however deep it is.
+
+        Returns:
+            (transactions, next_position): `next_position` is the `(created_at, id)`
+            of the last row, or None when there are no more pages.
+
+        Raises ValueError if `before` is not a valid position.
+        """
+        if before:
+            before = parse_keyset_position(before)
+
+        try:
+            sent, received = await asyncio.gather(
+                self._fetch_transactions_keyset("sender_id", user_id, limit + 1, transaction_type, before, since, until),
+                self._fetch_transactions_keyset("receiver_id", user_id, limit + 1, transaction_type, before, since, until)
+            )
+        except Exception as e:
+            print(f"Error fetching transaction page: {e}")
+            return [], None
+
+        merged = {row["id"]: row for row in sent + received}
+        rows = sorted(
+            merged.values(),
+            key=lambda row: (parse_timestamp(row["created_at"]), str(row["id"])),
+            reverse=True
+        )
+
+        page = rows[:limit]
+        next_position = None
+        if len(rows) > limit and page:
+            next_position = (page[-1]["created_at"], str(page[-1]["id"]))
+        return page, next_position
+
+    async def iter_transactions(self, user_id: str, chunk_size: int = 500, transaction_type: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a user's full history, newest first, without holding it in memory.
+
+        Sent and received rows are read in `chunk_size` keyset chunks, each side
+        advancing independently, and merged on the fly. At most two chunks are
+        buffered at any time. Database errors are raised, not swallowed, so a
+        caller never mistakes a failed export for a short one.
+        """
+        sides = {
+            column: {"rows": [], "position": None, "done": False}
+            for column in ("sender_id", "receiver_id")
+        }
+
+        def sort_key(row: Dict[str, Any]) -> Tuple[datetime, str]:
+            return parse_timestamp(row["created_at"]), str(row["id"])
+
+        async def refill(column: str) -> None:
+            side = sides[column]
+            rows = await self._fetch_transactions_keyset(column, user_id, chunk_size, transaction_type, side["position"], since, until)
+            if len(rows) < chunk_size:
+                side["done"] = True
+            if rows:
+                side["position"] = (rows[-1]["created_at"], str(rows[-1]["id"]))
+            # Reversed so the newest row is popped from the end in O(1)
+            side["rows"] = rows[::-1]
+
+        last_id = None
+        while True:
+            empty = [column for column, side in sides.items() if not side["rows"] and not side["done"]]
+            if empty:
+                await asyncio.gather(*(refill(column) for column in empty))
+
+            heads = [side for side in sides.values() if side["rows"]]
+            if not heads:
+                return
+            newest = max(heads, key=lambda side: sort_key(side["rows"][-1]))
+            row = newest["rows"].pop()
+            if row["id"] == last_id:
+                continue
+            last_id = row["id"]
+            yield row
+
+    async def get_spending_summary(self, user_id: str, period: str, period_start: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Spending/receiving totals for one day or month, by type and bill type.
+        Reads the incrementally maintained `spending_aggregates` rows (see
+        SPENDING_SCHEMA.sql). Returns None on failure.
+        """
+        try:
+            return await self._fetch_spending(user_id, period, period_start)
         except Exception as e:
-            print(f"Error executing transfer: {e}")
+            print(f"Error fetching spending summary: {e}")
+            return None
+
+    async def claim_idempotency_key(self, user_id: str, scope: str, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim an idempotency key in the persistent store (IDEMPOTENCY_SCHEMA.sql).
+        Returns None if this request now owns the key, otherwise the existing row
+        (with `response` set once the first request has finished).
+        """
+        try:
+            return await self._claim_idempotency_key({
+                "user_id": user_id,
+                "scope": scope,
+                "key": key,
+                "fingerprint": fingerprint
+            })
+        except Exception as e:
+            print(f"Error claiming idempotency key: {e}")
+            return None
+
+    async def complete_idempotency_key(self, user_id: str, scope: str, key: str, response: Dict[str, Any]) -> bool:
+        """Record the response for a claimed idempotency key."""
+        try:
+            await self._complete_idempotency_key(user_id, scope, key, response)
+            return True
+        except Exception as e:
+            print(f"Error storing idempotent response: {e}")
+            return False
+
+    async def release_idempotency_key(self, user_id: str, scope: str, key: str) -> bool:
+        """Give up a claimed (or expired) idempotency key."""
+        try:
+            await self._release_idempotency_key(user_id, scope, key)
+            return True
+        except Exception as e:
+            print(f"Error releasing idempotency key: {e}")
+            return False
+
+    async def sync_user(self, user_id: str, email: str, name: str = None, phone: str = None) -> bool:
+        """
+        Ensure user exists in database with default balance and phone.
+        Users seen before are skipped without a database read unless a phone is supplied.
+        """
+        if not phone and user_id in self.known_users:
+            return False
+
+        try:
+            user = await self.get_user_by_id(user_id)
+            if not user:
+                if not name:
+                    name = email.split('@')[0].replace('.', ' ').title()
+                data = {
+                    "id": user_id,
+                    "email": email,
+                    "name": name,
+                    "balance": 5000.00
+                }
+                if phone:
+                    data["phone"] = phone
+                await self._insert_user(data)
+                self.known_users.add(user_id)
+                if phone:
+                    self._remember_phone(phone, user_id, name)
+                print(f"✅ Auto-synced new user: {email}")
+                return True
+            else:
+                self.known_users.add(user_id)
+                if phone and not user.get("phone"):
+                    self._forget_phone(user_id, phone)
+                    with self._writing(user_id):
+                        await self._update_user(user_id, {"phone": phone})
+                    self._remember_phone(phone, user_id, user.get("name"))
+                    print(f"✅ Updated phone for user: {email}")
+            return False
+        except Exception as e:
+            print(f"Error syncing user: {e}")
+            return False
+
+    async def post_transaction(self, sender_id: str, receiver_id: Optional[str], amount: float, tx_type: str = "transfer", note: Optional[str] = None, receiver_phone: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Debit sender, credit receiver (if any) and record the transaction
+        atomically in a single database transaction (one round trip), shared
+        with concurrent postings by group commit.
+
+        `receiver_phone` is the number the receiver was resolved from (possibly
+        via the phone cache); the posting is refused if it no longer belongs to
+        the receiver, and the cached mapping is dropped.
+        """
+        try:
+            async with self.accounts.serialize(sender_id, receiver_id):
+                with self._writing(sender_id, receiver_id):
+                    posted = await self.postings.submit({
+                        "kind": "transaction",
+                        "sender_id": sender_id,
+                        "receiver_id": receiver_id,
+                        "amount": amount,
+                        "type": tx_type,
+                        "note": note,
+                        "receiver_phone": receiver_phone
+                    })
+            if posted.get("error") == RECEIVER_PHONE_CHANGED:
+                self._forget_phone(receiver_id, receiver_phone)
+            if posted.get("success"):
+                print(f"[DB] Posted {tx_type} {posted['transaction_id']}: {sender_id} -> {receiver_id} (₹{amount})")
+                posted["transaction_id"] = str(posted["transaction_id"])
+                posted["new_balance"] = float(posted["new_balance"])
+            return posted
+        except Exception as e:
+            print(f"Error posting transaction: {e}")
             return {"success": False, "error": str(e)}
 
-# Global database instance
+    async def _authorize_transfer(self, sender_id: str, transfer_pin: str) -> Dict[str, Any]:
+        """Check the sender's transfer PIN, reusing the fetched row. Returns the sender or an error."""
+        sender = await self.get_user_by_id(sender_id)
+        if not sender:
+            return {"success": False, "error": "Sender not found"}
+
+        # If user has NO transfer PIN set, let's set it to 1234 for demo reliability
+        stored_pin = sender.get("transfer_pin")
+        if not stored_pin:
+            print(f"[DB] Sender had no transfer PIN. Auto-setting to 1234 for demo.")
+            await self.set_user_pin(sender_id, "1234", "transfer")
+            stored_pin = hashlib.sha256("1234".encode()).hexdigest()
+
+        if hashlib.sha256(transfer_pin.encode()).hexdigest() != stored_pin:
+            return {"success": False, "error": "Invalid transfer PIN"}
+        return {"success": True, "sender": sender}
+
+    async def execute_transfer(self, sender_id: str, receiver_id: str, amount: float, note: Optional[str] = None, transfer_pin: Optional[str] = None, receiver_phone: Optional[str] = None) -> Dict[str, Any]:
+        """Execute transfer with balance validation and PIN check."""
+        MAX_TX_AMOUNT = 2000.0
+        if amount > MAX_TX_AMOUNT:
+            return {"success": False, "error": f"Transaction amount exceeds limit of ₹{MAX_TX_AMOUNT}"}
+
+        if transfer_pin:
+            authorized = await self._authorize_transfer(sender_id, transfer_pin)
+            if not authorized["success"]:
+                return authorized
+
+        # Debit, credit and journal row in a single database transaction
+        return await self.post_transaction(sender_id, receiver_id, amount, "transfer", note, receiver_phone)
+
+    async def execute_transfer_batch(self, sender_id: str, transfers: List[Dict[str, Any]], transfer_pin: str) -> Dict[str, Any]:
+        """
+        Authorize the PIN once and post many transfers from one sender atomically.
+        Each item needs `receiver_id`, `amount` and optionally `note` and
+        `receiver_phone` (checked like post_transaction's); either all items
+        are posted or none are.
+        """
+        authorized = await self._authorize_transfer(sender_id, transfer_pin)
+        if not authorized["success"]:
+            return authorized
+
+        total = round(sum(item["amount"] for item in transfers), 2)
+        current_balance = float(authorized["sender"]["balance"])
+        if current_balance < total:
+            return {"success": False, "error": "Insufficient funds", "current_balance": current_balance}
+
+        items = [
+            {
+                "id": str(uuid.uuid4()),
+                "receiver_id": item["receiver_id"],
+                "receiver_phone": item.get("receiver_phone"),
+                "amount": item["amount"],
+                "note": item.get("note")
+            }
+            for item in transfers
+        ]
+        receiver_ids = {item["receiver_id"] for item in items}
+
+        try:
+            async with self.accounts.serialize(sender_id, *receiver_ids):
+                with self._writing(sender_id, *receiver_ids):
+                    posted = await self.postings.submit({"kind": "batch", "sender_id": sender_id, "items": items})
+            if posted.get("error") == RECEIVER_PHONE_CHANGED:
+                for item in items:
+                    self._forget_phone(item["receiver_id"], item["receiver_phone"])
+            if posted.get("success"):
+                print(f"[DB] Posted batch of {len(items)} transfer(s) from {sender_id} (₹{total})")
+                posted["transaction_ids"] = [item["id"] for item in items]
+                posted["new_balance"] = float(posted["new_balance"])
+            return posted
+        except Exception as e:
+            print(f"Error posting transfer batch: {e}")
+            return {"success": False, "error": str(e)}
+
+def create_async_database() -> AsyncDatabase:
+    """Build the async backend selected by `settings.db_backend`."""
+    if settings.db_backend == "postgres":
+        from pg_database import PostgresDatabase
+        return PostgresDatabase()
+    return AsyncDatabase()
+
+
+# Global database instances
 db = Database()
+async_db = create_async_database()
@@ -0,0 +1,98 @@
+"""
+Group commit for postings.
+
+Callers submit one posting each and wait for its result. While a group is
+being committed, new postings queue up and are committed together as the
+next group (up to `max_batch`), in one database transaction and one round
+trip. `max_delay` optionally holds a group open a little longer to collect
+more postings. Each caller's await returns only after the transaction
+containing its posting has committed.
+
+The flush callable returns one result per posting, in order, so a posting
+refused by the database fails only its own caller. If the flush itself
+raises (network error, timeout), every caller in that group gets the error:
+the group may or may not have committed, so nothing is retried here.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+
+
+class GroupCommitWriter:
+    """Coalesces concurrent postings into groups committed together."""
+
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[List[Any]]], max_batch: int = 50, max_delay: float = 0.0):
+        self._flush_items = flush
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.groups = 0
+        self.items = 0
+        self.largest_group = 0
+        self.failed_groups = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next group and return its result once committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+
+        # One group is committed at a time; later postings wait for the next one
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._run())
+
+        return await future
+
+    async def _run(self) -> None:
+        """Commit queued groups until the queue is empty."""
+        if self.max_delay > 0:
+            await asyncio.sleep(self.max_delay)
+        while self._pending:
+            group, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            await self._flush(group)
+
+    async def _flush(self, group: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Commit one group and resolve its callers."""
+        self.groups += 1
+        self.items += len(group)
+        self.largest_group = max(self.largest_group, len(group))
+
+        try:
+            results = await self._flush_items([item for item, _ in group])
+            if len(results) != len(group):
+                raise RuntimeError(f"Group commit returned {len(results)} results for {len(group)} postings")
+        except Exception as e:
+            self.failed_groups += 1
+            print(f"[DB] Group commit of {len(group)} posting(s) failed: {e}")
+            for _, future in group:
+                _resolve(future, error=e)
+            return
+
+        for (_, future), result in zip(group, results):
+            _resolve(future, result)
+
+    async def close(self) -> None:
+        """Wait for queued postings to be committed (called on shutdown)."""
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Grouping counters."""
+        return {
+            "groups": self.groups,
+            "postings": self.items,
+            "avg_group": round(self.items / self.groups, 2) if self.groups else 0.0,
+            "largest_group": self.largest_group,
+            "failed_groups": self.failed_groups,
+            "queued": len(self._pending)
+        }
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[Exception] = None) -> None:
+    """Complete a caller's future unless it was cancelled meanwhile."""
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
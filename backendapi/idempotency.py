@@ -0,0 +1,161 @@
+"""
+Idempotency-Key support for money-moving endpoints.
+
+A client that retries a request with the same `Idempotency-Key` header gets
+the stored response of the first attempt instead of a second posting.
+Concurrent duplicates wait for the first attempt and share its outcome.
+
+Responses are kept in a bounded TTL cache in every process; with
+IDEMPOTENCY_BACKEND=database keys are also claimed in the `idempotency_keys`
+table (IDEMPOTENCY_SCHEMA.sql) so replays work across workers and restarts.
+Failed attempts (HTTP errors) and `confirmation_required` prompts are not
+stored: nothing was posted, so the client may retry them (or send the PIN)
+with the same key.
+"""
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from config import settings
+from cache import TTLCache
+from database import async_db, parse_timestamp
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import json
+
+MAX_KEY_LENGTH = 255
+NOT_FINAL_STATUSES = {"confirmation_required"}
+
+
+def request_fingerprint(request: BaseModel) -> str:
+    """Hash of the request body used to detect a key reused for a different request (PIN excluded)."""
+    body = request.model_dump(exclude={"transfer_pin"})
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Completed responses by (user, scope, key), plus the attempts still running."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400.0, persistent: bool = False):
+        self.ttl = ttl
+        self.persistent = persistent
+        self._responses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self.replayed = 0
+        self.coalesced = 0
+
+    async def run(self, key: Optional[str], user_id: str, scope: str, request: BaseModel, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Execute `handler` at most once per `key`, returning its (stored) response.
+
+        Usage:
+            return await idempotency.run(idempotency_key, user_id, "transfer", request, lambda: ...)
+        """
+        if not key:
+            return await handler()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        full_key = (user_id, scope, key)
+        fingerprint = request_fingerprint(request)
+
+        stored = self._responses.get(full_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            self.coalesced += 1
+            stored = await asyncio.shield(inflight)
+            if stored is None:
+                # The first attempt only asked for confirmation; run this one itself
+                return await self.run(key, user_id, scope, request, handler)
+            return self._replay(stored, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            if self.persistent:
+                stored = await self._claim(user_id, scope, key, fingerprint)
+                if stored is not None:
+                    self._responses.set(full_key, stored)
+                    future.set_result(stored)
+                    return self._replay(stored, fingerprint)
+
+            try:
+                response = await handler()
+            except BaseException:
+                if self.persistent:
+                    await async_db.release_idempotency_key(user_id, scope, key)
+                raise
+
+            body = response.model_dump() if isinstance(response, BaseModel) else response
+            if isinstance(body, dict) and body.get("status") in NOT_FINAL_STATUSES:
+                # Nothing was posted: free the key for the PIN-bearing retry
+                stored = None
+                if self.persistent:
+                    await async_db.release_idempotency_key(user_id, scope, key)
+            else:
+                stored = {"fingerprint": fingerprint, "response": body}
+                self._responses.set(full_key, stored)
+                if self.persistent:
+                    await async_db.complete_idempotency_key(user_id, scope, key, body)
+            future.set_result(stored)
+            return response
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark retrieved so an unawaited failure is not logged again by asyncio
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def _claim(self, user_id: str, scope: str, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim the key in the database; return the stored entry if another attempt already finished."""
+        existing = await async_db.claim_idempotency_key(user_id, scope, key, fingerprint)
+        if existing is not None and self._expired(existing):
+            await async_db.release_idempotency_key(user_id, scope, key)
+            existing = await async_db.claim_idempotency_key(user_id, scope, key, fingerprint)
+        if existing is None:
+            return None
+
+        if existing.get("response") is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        response = existing["response"]
+        if isinstance(response, str):
+            response = json.loads(response)
+        return {"fingerprint": existing["fingerprint"], "response": response}
+
+    def _expired(self, row: Dict[str, Any]) -> bool:
+        """True if a persisted key is older than the TTL and may be reused."""
+        created_at = parse_timestamp(row["created_at"])
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - created_at).total_seconds() > self.ttl
+
+    def _replay(self, stored: Dict[str, Any], fingerprint: str) -> Dict[str, Any]:
+        """Return a stored response, refusing keys reused for a different request."""
+        if stored["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        self.replayed += 1
+        return stored["response"]
+
+    def stats(self) -> Dict[str, Any]:
+        """Replay counters."""
+        return {
+            "backend": "database" if self.persistent else "memory",
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "responses": self._responses.stats()
+        }
+
+
+# Global idempotency store
+idempotency = IdempotencyStore(
+    maxsize=settings.idempotency_cache_size,
+    ttl=settings.idempotency_ttl,
+    persistent=settings.idempotency_backend == "database"
+)
@@ -4,7 +4,12 @@ Converts plain text voice commands into structured intents and entities.
 """
 
 import re
-from typing import Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from cache import TTLCache
+import asyncio
+import multiprocessing
+import os
 
 
 # ============== Intent Keywords ==============
@@ -26,11 +31,11 @@ BILLPAY_KEYWORDS = [
 ]
 
 CONFIRM_KEYWORDS = [
-    "yes", "confirm", "proceed", "ha", "haji", "thik hai", "ok", "done", "confirm karo", "kar do"
+    "yes", "confirm", "proceed", "ha", "haan", "haji", "thik hai", "ok", "done", "confirm karo", "kar do"
 ]
 
 CANCEL_KEYWORDS = [
-    "no", "cancel", "stop", "nhi", "na", "cancel kar do"
+    "no", "cancel", "stop", "nhi", "nahi", "na", "cancel kar do"
 ]
 
 # ============== Hinglish Translation Map ==============
@@ -64,70 +69,181 @@ BILL_TYPES = {
 }
 
 
+# ============== Phrase Tables (built once at import) ==============
+
+# Intents found by keyword, in priority order
+INTENT_PRIORITY = [
+    ("transfer", TRANSFER_KEYWORDS, 0.95),
+    ("balance", BALANCE_KEYWORDS, 0.95),
+    ("billpay", BILLPAY_KEYWORDS, 0.90),
+]
+
+BILL_TYPE_NAMES = list(BILL_TYPES)
+
+# Rank used when nothing of a kind was found (worse than any real rank)
+NO_RANK = 1 << 16
+
+# Words are runs of letters/digits; punctuation and spacing never reach matching
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Entity patterns
+AMOUNT_PATTERNS = [
+    re.compile(r'(\d+(?:\.\d+)?)\s*(?:rupees|rs|rupay|rupaye|inr)?', re.IGNORECASE),
+    re.compile(r'(?:rupees|rs|rupay|rupaye)?\s*(\d+(?:\.\d+)?)', re.IGNORECASE),
+]
+RECEIVER_PATTERNS = [
+    re.compile(r'(?:to|ko)\s+([a-zA-Z0-9]+)', re.IGNORECASE),
+    re.compile(r'([a-zA-Z0-9]+)\s+ko', re.IGNORECASE),
+]
+PIN_PATTERN = re.compile(r'(?:\d\s*){4,6}')
+DIGIT_PATTERN = re.compile(r'\d')
+ACCOUNT_NUMBER_PATTERN = re.compile(r'\b(\d{10})\b')
+
+
+def _index_phrases(phrases: Dict[Tuple[str, ...], Any]) -> Dict[str, List[Tuple[List[str], Any]]]:
+    """Group phrases by their first word, longest first, for longest-match lookup."""
+    index: Dict[str, List[Tuple[List[str], Any]]] = {}
+    for words in sorted(phrases, key=len, reverse=True):
+        index.setdefault(words[0], []).append((list(words), phrases[words]))
+    return index
+
+
+def _translate(words: List[str]) -> List[str]:
+    """Replace Hinglish words and phrases (longest match first) with English words."""
+    translated: List[str] = []
+    i, count = 0, len(words)
+    while i < count:
+        for phrase, english in HINGLISH_INDEX.get(words[i], ()):
+            size = len(phrase)
+            if words[i:i + size] == phrase:
+                translated.extend(english)
+                i += size
+                break
+        else:
+            translated.append(words[i])
+            i += 1
+    return translated
+
+
+def _build_keyword_index() -> Dict[str, List[Tuple[List[str], Tuple[int, int, int, bool]]]]:
+    """
+    Every keyword as a translated phrase, tagged with its best intent rank,
+    bill type rank and confirm rank, and whether it is a cancel word.
+    Keywords written in Hinglish ("kitna", "paisa bhejo") are translated like
+    utterances are, so they still match after normalization.
+    """
+    tags: Dict[Tuple[str, ...], List[Any]] = {}
+    
+    def tag(keyword: str, slot: int, value: Any) -> None:
+        words = tuple(_translate(TOKEN_PATTERN.findall(keyword.lower())))
+        entry = tags.setdefault(words, [NO_RANK, NO_RANK, NO_RANK, False])
+        entry[slot] = value if slot == 3 else min(entry[slot], value)
+    
+    for rank, (_, keywords, _) in enumerate(INTENT_PRIORITY):
+        for keyword in keywords:
+            tag(keyword, 0, rank)
+    for rank, keywords in enumerate(BILL_TYPES.values()):
+        for keyword in keywords:
+            tag(keyword, 1, rank)
+    for rank, keyword in enumerate(CONFIRM_KEYWORDS):
+        tag(keyword, 2, rank)
+    for keyword in CANCEL_KEYWORDS:
+        tag(keyword, 3, True)
+    
+    return _index_phrases({words: tuple(entry) for words, entry in tags.items()})
+
+
+HINGLISH_INDEX = _index_phrases({
+    tuple(TOKEN_PATTERN.findall(hinglish)): TOKEN_PATTERN.findall(english)
+    for hinglish, english in HINGLISH_MAP.items()
+})
+KEYWORD_INDEX = _build_keyword_index()
+
+
 class IntentParser:
     """Rule-based parser for voice commands."""
     
-    def __init__(self):
-        """Initialize the parser."""
-        pass
+    def __init__(self, cache_size: int = 0):
+        """
+        Initialize the parser.
+        
+        Args:
+            cache_size: Parse results kept in an LRU cache keyed by normalized
+                text (0 disables caching).
+        """
+        self.configure_cache(cache_size)
+    
+    def configure_cache(self, cache_size: int) -> None:
+        """Replace the parse cache with an empty one of `cache_size` entries (0 disables)."""
+        self.cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+        self.uncacheable = 0
+    
+    def tokenize(self, text: str) -> List[str]:
+        """Split text into lowercase words with Hinglish words and phrases translated."""
+        return _translate(TOKEN_PATTERN.findall(text.lower()))
     
     def normalize_text(self, text: str) -> str:
         """Normalize and translate Hinglish to English."""
-        text = text.lower().strip()
-        
-        # Replace Hinglish words with English equivalents
-        for hinglish, english in HINGLISH_MAP.items():
-            text = text.replace(hinglish, english)
-        
-        return text
+        return " ".join(self.tokenize(text))
     
-    def detect_intent(self, text: str) -> Tuple[str, float]:
+    def scan(self, words: List[str]) -> Tuple[str, float, Optional[str]]:
         """
-        Detect intent from text.
-        Returns (intent_type, confidence_score)
+        Score intents and find the bill type in one pass over normalized words.
+        Keyword phrases match whole words, longest phrase first, so
+        "cancel kar do" is not also read as "kar do".
+        Returns (intent_type, confidence_score, bill_type)
         """
-        text = self.normalize_text(text)
+        best_intent = best_bill = best_confirm = NO_RANK
+        confirm_confidence = 0.0
+        cancel = False
+        i, count = 0, len(words)
         
-        # Check for transfer intent
-        for keyword in TRANSFER_KEYWORDS:
-            if keyword in text:
-                return ("transfer", 0.95)
-        
-        # Check for balance intent
-        for keyword in BALANCE_KEYWORDS:
-            if keyword in text:
-                return ("balance", 0.95)
+        while i < count:
+            for phrase, (intent_rank, bill_rank, confirm_rank, cancels) in KEYWORD_INDEX.get(words[i], ()):
+                size = len(phrase)
+                if words[i:i + size] != phrase:
+                    continue
+                if intent_rank < best_intent:
+                    best_intent = intent_rank
+                if bill_rank < best_bill:
+                    best_bill = bill_rank
+                if confirm_rank < best_confirm:
+                    # Strict match for "yes" when it is the whole utterance
+                    best_confirm = confirm_rank
+                    confirm_confidence = 1.0 if size == count else 0.9
+                if cancels and size == count:
+                    cancel = True
+                i += size
+                break
+            else:
+                i += 1
         
-        # Check for bill payment intent
-        for keyword in BILLPAY_KEYWORDS:
-            if keyword in text:
-                return ("billpay", 0.90)
+        bill_type = BILL_TYPE_NAMES[best_bill] if best_bill != NO_RANK else None
         
-        # Check for confirmation
-        for keyword in CONFIRM_KEYWORDS:
-            if keyword == text: # Strict check for "yes"
-                return ("confirm", 1.0)
-            if f" {keyword}" in text or f"{keyword} " in text:
-                return ("confirm", 0.9)
-
-        # Check for cancel
-        for keyword in CANCEL_KEYWORDS:
-            if keyword == text:
-                return ("cancel", 1.0)
+        if best_intent != NO_RANK:
+            intent, _, confidence = INTENT_PRIORITY[best_intent]
+            return (intent, confidence, bill_type)
+        if best_confirm != NO_RANK:
+            return ("confirm", confirm_confidence, bill_type)
+        if cancel:
+            return ("cancel", 1.0, bill_type)
         
         # Unknown intent
-        return ("unknown", 0.0)
+        return ("unknown", 0.0, bill_type)
+    
+    def detect_intent(self, text: str) -> Tuple[str, float]:
+        """
+        Detect intent from text.
+        Returns (intent_type, confidence_score)
+        """
+        intent, confidence, _ = self.scan(self.tokenize(text))
+        return (intent, confidence)
     
     def extract_amount(self, text: str) -> Optional[float]:
         """Extract amount from text."""
         # Pattern: number followed by optional currency
-        patterns = [
-            r'(\d+(?:\.\d+)?)\s*(?:rupees|rs|rupay|rupaye|inr)?',
-            r'(?:rupees|rs|rupay|rupaye)?\s*(\d+(?:\.\d+)?)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in AMOUNT_PATTERNS:
+            match = pattern.search(text)
             if match:
                 try:
                     amount = float(match.group(1))
@@ -141,13 +257,8 @@ class IntentParser:
         """Extract receiver name or phone from text."""
         # Pattern: "to <name/phone>" or "ko <name/phone>"
         # Allow numbers and basic names
-        patterns = [
-            r'(?:to|ko)\s+([a-zA-Z0-9]+)',
-            r'([a-zA-Z0-9]+)\s+ko',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in RECEIVER_PATTERNS:
+            match = pattern.search(text)
             if match:
                 name = match.group(1).strip()
                 # Resolve common demo names to the receiver's phone
@@ -166,7 +277,7 @@ class IntentParser:
         # Strategy: find all digits and check if they form a 4-6 digit sequence
         # But we only want sequences that are likely PINs
         # Let's use a regex that looks for 4-6 digits possibly with spaces
-        matches = re.finditer(r'(?:\d\s*){4,6}', text)
+        matches = PIN_PATTERN.finditer(text)
         for match in matches:
             found = match.group(0).strip()
             # Clean spaces
@@ -178,19 +289,12 @@ class IntentParser:
     
     def extract_bill_type(self, text: str) -> Optional[str]:
         """Extract bill type from text."""
-        text = self.normalize_text(text)
-        
-        for bill_type, keywords in BILL_TYPES.items():
-            for keyword in keywords:
-                if keyword in text:
-                    return bill_type
-        
-        return None
+        return self.scan(self.tokenize(text))[2]
     
     def extract_account_number(self, text: str) -> Optional[str]:
         """Extract account/bill number from text."""
         # Pattern: 10-digit number
-        match = re.search(r'\b(\d{10})\b', text)
+        match = ACCOUNT_NUMBER_PATTERN.search(text)
         if match:
             return match.group(1)
         
@@ -200,9 +304,39 @@ class IntentParser:
         """
         Main parsing function.
         Converts text to structured intent with entities.
+        
+        Results that depend only on the normalized text (no entities) are
+        cached. Utterances containing digits are never cached: they may carry
+        a PIN, and amounts/phones are read from the raw text.
         """
-        # Detect intent
-        intent, confidence = self.detect_intent(text)
+        words = self.tokenize(text)
+        if self.cache.maxsize <= 0:
+            return self._parse(text, words)
+        if DIGIT_PATTERN.search(text):
+            self.uncacheable += 1
+            return self._parse(text, words)
+        
+        key = " ".join(words)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return _copy_result(cached)
+        
+        result = self._parse(text, words)
+        if result["entities"]:
+            # Entities (receiver name, bill type) are read from the raw text
+            self.uncacheable += 1
+        else:
+            self.cache.set(key, _copy_result(result))
+        return result
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Parse cache size and hit/miss counters."""
+        return {**self.cache.stats(), "uncacheable": self.uncacheable}
+    
+    def _parse(self, text: str, words: List[str]) -> Dict[str, Any]:
+        """Parse already tokenized text (no caching)."""
+        # Normalize once; intent and bill type come from the same scan
+        intent, confidence, detected_bill_type = self.scan(words)
         
         # Extract entities based on intent
         entities = {}
@@ -250,7 +384,7 @@ class IntentParser:
         
         elif intent == "billpay":
             amount = self.extract_amount(text)
-            bill_type = self.extract_bill_type(text)
+            bill_type = detected_bill_type
             account_number = self.extract_account_number(text)
             
             entities = {
@@ -297,5 +431,141 @@ class IntentParser:
         }
 
 
-# Global parser instance
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a parse result deep enough that callers cannot alter a cached one."""
+    action = result["action_required"]
+    if action is not None:
+        action = {**action, "params": dict(action["params"]), "missing_fields": list(action["missing_fields"])}
+    return {**result, "entities": dict(result["entities"]), "action_required": action}
+
+
+# Global parser instance (uncached until the API sizes it from INTENT_CACHE_SIZE)
 parser = IntentParser()
+
+
+# ============== Streaming (partial transcripts) ==============
+
+def _committed_text(text: str) -> str:
+    """Transcript without its last word, unless whitespace already follows that word."""
+    if not text.strip() or text[-1].isspace():
+        return text.strip()
+    return text[:len(text) - len(text.split()[-1])].strip()
+
+
+class IntentStream:
+    """
+    Incremental parsing of one utterance from partial ASR transcripts.
+    
+    ASR engines resend the transcript so far on every update, and the last
+    word is often still changing ("bhe" -> "bhejo", "50" -> "500"). Until the
+    final transcript arrives only committed words (followed by whitespace) are
+    parsed, re-parsing is skipped while they are unchanged, and an update is
+    produced only when the intent or entities change (nothing is sent while
+    the partial transcript is still unrecognized).
+    """
+    
+    NOTHING_YET = ("unknown", {})
+    
+    def __init__(self, intent_parser: Optional[IntentParser] = None):
+        self.parser = intent_parser or parser
+        self._committed: Optional[str] = None
+        self._emitted: Tuple[str, Dict[str, Any]] = self.NOTHING_YET
+        self.revision = 0
+    
+    def update(self, text: str, final: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Feed the transcript so far.
+        Returns the parse result plus "final" and "revision" when there is
+        something new to report, else None. A final transcript always yields a
+        result and starts the next utterance.
+        """
+        committed = text.strip() if final else _committed_text(text)
+        if not final and (not committed or committed == self._committed):
+            return None
+        self._committed = committed
+        
+        result = self.parser.parse(committed)
+        state = (result["intent"], result["entities"])
+        if not final and state == self._emitted:
+            return None
+        
+        self.revision += 1
+        update = {**result, "final": final, "revision": self.revision}
+        if final:
+            self._committed, self._emitted = None, self.NOTHING_YET
+        else:
+            self._emitted = state
+        return update
+
+
+# ============== Batch Parsing ==============
+
+DEFAULT_BATCH_CHUNK_SIZE = 2000
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _parse_chunk(texts: List[str]) -> List[Dict[str, Any]]:
+    """Parse one chunk with this process's parser (runs in a pool worker)."""
+    return [parser.parse(text) for text in texts]
+
+
+def _chunks(texts: List[str], chunk_size: int) -> Iterator[List[str]]:
+    """Consecutive slices of `texts`, in order."""
+    for start in range(0, len(texts), chunk_size):
+        yield texts[start:start + chunk_size]
+
+
+def _batch_workers(workers: int = 0) -> int:
+    """Worker processes for batch parsing (0 = one per CPU)."""
+    return workers or os.cpu_count() or 1
+
+
+def get_process_pool(workers: int = 0) -> ProcessPoolExecutor:
+    """Process pool shared by all batch parses, started on first use with `workers` processes."""
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the server's threads or connection pools
+        _pool = ProcessPoolExecutor(max_workers=_batch_workers(workers), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the batch worker processes (called on shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def parse_batch(texts: List[str], chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE, workers: int = 0) -> List[Dict[str, Any]]:
+    """
+    Parse many utterances; results come back in input order.
+    
+    Batches larger than one chunk are split into chunks that run in parallel
+    in the process pool (`workers` processes, 0 = one per CPU); smaller ones
+    are parsed in the calling process.
+    
+    Usage (offline jobs):
+        results = parse_batch(lines, chunk_size=5000)
+    """
+    if len(texts) <= chunk_size or _batch_workers(workers) <= 1:
+        return _parse_chunk(texts)
+    
+    results: List[Dict[str, Any]] = []
+    for chunk_results in get_process_pool(workers).map(_parse_chunk, _chunks(texts, chunk_size)):
+        results.extend(chunk_results)
+    return results
+
+
+async def parse_batch_async(texts: List[str], chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE, workers: int = 0) -> List[Dict[str, Any]]:
+    """parse_batch for the event loop: chunks are awaited instead of blocking the server."""
+    if len(texts) <= chunk_size or _batch_workers(workers) <= 1:
+        return _parse_chunk(texts)
+    
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool(workers)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, _parse_chunk, chunk) for chunk in _chunks(texts, chunk_size)
+    ))
+    return [result for part in parts for result in part]
@@ -0,0 +1,85 @@
+"""
+Double-entry ledger maintenance and reconciliation.
+Run periodically (e.g. from cron) to snapshot balances and verify the ledger
+against users.balance. Requires LEDGER_SCHEMA.sql to be installed.
+
+Usage:
+    python ledger.py snapshot            # take incremental balance snapshots
+    python ledger.py verify [--full]     # reconcile since the last checkpoint
+    python ledger.py balance <account_id> [as_of_iso_timestamp]
+    python ledger.py adjust <user_id> <amount> [note]   # manual correction (negative debits)
+"""
+
+from database import db
+from typing import Optional, Dict, Any
+import sys
+
+
+def take_snapshots(lag_seconds: int = 60) -> Dict[str, Any]:
+    """Snapshot every account touched since its last snapshot."""
+    result = db.client.rpc("take_ledger_snapshots", {"p_lag": f"{lag_seconds} seconds"}).execute()
+    return result.data
+
+
+def verify(full: bool = False) -> Dict[str, Any]:
+    """
+    Check postings balance to zero and users.balance matches the ledger.
+    Only accounts touched since the last successful checkpoint are recomputed
+    unless `full` is set; a clean run records a new checkpoint.
+    """
+    result = db.client.rpc("verify_ledger", {"p_full": full}).execute()
+    return result.data
+
+
+def balance(account_id: str, as_of: Optional[str] = None) -> float:
+    """Current (or historical, at `as_of`) ledger balance of an account."""
+    params = {"p_account_id": account_id}
+    if as_of:
+        params["p_as_of"] = as_of
+    result = db.client.rpc("ledger_balance", params).execute()
+    return float(result.data or 0)
+
+
+def adjust(user_id: str, amount: float, note: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Correct a user's balance by `amount` (negative to debit). Posted against
+    EQUITY:ADJUSTMENT with a transactions row, so the next verify checks it.
+    """
+    result = db.client.rpc("post_adjustment", {"p_user_id": user_id, "p_amount": amount, "p_note": note}).execute()
+    return result.data
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+
+    if command == "snapshot":
+        summary = take_snapshots()
+        print(f"✅ Took {summary['snapshots']} snapshot(s) up to posting #{summary['as_of_posting_id']}")
+
+    elif command == "verify":
+        report = verify(full="--full" in sys.argv)
+        print(f"🔍 Checked {report['accounts_checked']} account(s), postings #{report['from_posting_id']}..#{report['to_posting_id']}")
+        if report["ok"]:
+            print("✅ Ledger reconciles. Checkpoint recorded.")
+        else:
+            for tx_id in report["unbalanced_transactions"]:
+                print(f"❌ Unbalanced transaction: {tx_id}")
+            for mismatch in report["balance_mismatches"]:
+                print(f"❌ {mismatch['user_id']}: users.balance={mismatch['balance']} ledger={mismatch['ledger']}")
+            sys.exit(1)
+
+    elif command == "balance" and len(sys.argv) > 2:
+        as_of = sys.argv[3] if len(sys.argv) > 3 else None
+        print(f"₹{balance(sys.argv[2], as_of)}")
+
+    elif command == "adjust" and len(sys.argv) > 3:
+        note = sys.argv[4] if len(sys.argv) > 4 else None
+        result = adjust(sys.argv[2], float(sys.argv[3]), note)
+        if not result or not result.get("success"):
+            print(f"❌ Adjustment failed: {(result or {}).get('error', 'no response')}")
+            sys.exit(1)
+        print(f"✅ Posted adjustment {result['transaction_id']}, new balance ₹{result['new_balance']}")
+
+    else:
+        print(__doc__)
+        sys.exit(2)
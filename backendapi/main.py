@@ -3,6 +3,7 @@ Voice-First Rural Banking Assistant - FastAPI Backend
 Main application entry point.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -10,6 +11,9 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from config import settings
+from database import async_db, unit_of_work
+from idempotency import idempotency
+from intent_parser import parser, shutdown_process_pool
 
 # Import routers
 from routers import account, transaction, voice, auth_local
@@ -17,12 +21,21 @@ from routers import account, transaction, voice, auth_local
 
 # ============== App Initialization ==============
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release pooled database connections and batch parser workers on shutdown."""
+    yield
+    await async_db.close()
+    shutdown_process_pool()
+
+
 app = FastAPI(
     title="Voice Banking API",
     description="Secure voice-first banking backend for rural users - FastAPI + Supabase",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # ============== Rate Limiting ==============
@@ -41,6 +54,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_unit_of_work(request: Request, call_next):
+    """Serve repeated `users` reads within one request from an identity map."""
+    with unit_of_work() as uow:
+        response = await call_next(request)
+    if uow.round_trips_saved:
+        print(f"[DB] Identity map saved {uow.round_trips_saved} round trip(s)")
+    return response
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     print(f"\n>>>> [{request.method}] {request.url.path}")
@@ -91,7 +113,12 @@ async def detailed_health():
             "api": "operational",
             "auth": "operational",
             "database": "operational"
-        }
+        },
+        "caches": async_db.cache_stats(),
+        "account_scheduler": async_db.accounts.stats(),
+        "posting_groups": async_db.postings.stats(),
+        "idempotency": idempotency.stats(),
+        "intent_cache": parser.cache_stats()
     }
 
 
@@ -18,6 +18,19 @@ class TransferRequest(BaseModel):
     transfer_pin: Optional[str] = Field(None, description="4-digit Transfer PIN for security")
 
 
+class BatchTransferItem(BaseModel):
+    """Single line item of a bulk payout."""
+    receiver_phone: str = Field(..., description="Receiver's phone number")
+    amount: float = Field(..., gt=0, description="Amount to transfer (must be > 0)")
+    note: Optional[str] = Field(None, description="Optional note for transaction")
+
+
+class BatchTransferRequest(BaseModel):
+    """Request model for a bulk payout authorized by one PIN."""
+    transfers: List[BatchTransferItem] = Field(..., min_length=1, description="Line items to pay out")
+    transfer_pin: str = Field(..., description="4-digit Transfer PIN, verified once for the whole batch")
+
+
 class BillPaymentRequest(BaseModel):
     """Request model for bill payment."""
     bill_type: str = Field(..., description="Type of bill (electricity, water, mobile, etc.)")
@@ -26,12 +39,23 @@ class BillPaymentRequest(BaseModel):
     transfer_pin: Optional[str] = Field(None, description="4-digit Transfer PIN for security")
 
 
+class ConfirmationRequest(BaseModel):
+    """Request model for confirming a pending transfer or bill payment."""
+    confirmation_token: str = Field(..., description="Token returned with status 'confirmation_required'")
+    transfer_pin: str = Field(..., description="4-digit Transfer PIN for security")
+
+
 class VoiceIntentRequest(BaseModel):
     """Request model for voice intent processing."""
     text: str = Field(..., description="Transcribed voice text", min_length=1)
     voice_verified: bool = Field(False, description="Mocked voice biometric verification result")
 
 
+class VoiceIntentBatchRequest(BaseModel):
+    """Request model for parsing many transcripts at once."""
+    texts: List[str] = Field(..., min_length=1, description="Transcribed voice texts")
+
+
 class PinSetupRequest(BaseModel):
     """Request model for setting up PINs."""
     pin: str = Field(..., min_length=4, max_length=6, description="PIN to set")
@@ -52,6 +76,7 @@ class BalanceResponse(BaseModel):
     balance: float
     currency: str = "INR"
     user_id: str
+    stale: bool = False  # True if served from cache while the database was slow
 
 
 class TransactionResponse(BaseModel):
@@ -60,6 +85,28 @@ class TransactionResponse(BaseModel):
     status: str
     new_balance: float
     message: Optional[str] = None
+    confirmation_token: Optional[str] = None
+
+
+class BatchTransferItemResult(BaseModel):
+    """Outcome of one line item of a bulk payout."""
+    index: int
+    receiver_phone: str
+    amount: float
+    status: str
+    transaction_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchTransferResponse(BaseModel):
+    """Response model for a bulk payout."""
+    status: str
+    succeeded: int
+    failed: int
+    total_amount: float
+    new_balance: Optional[float] = None
+    results: List[BatchTransferItemResult]
+    message: Optional[str] = None
 
 
 class BillPaymentResponse(BaseModel):
@@ -69,6 +116,7 @@ class BillPaymentResponse(BaseModel):
     bill_type: str
     new_balance: float
     message: Optional[str] = None
+    confirmation_token: Optional[str] = None
 
 
 class VoiceIntentResponse(BaseModel):
@@ -80,6 +128,17 @@ class VoiceIntentResponse(BaseModel):
     message: Optional[str] = None
 
 
+class VoiceIntentStreamUpdate(VoiceIntentResponse):
+    """Intent update sent over /voice/intent/stream."""
+    final: bool = False
+    revision: int
+
+
+class VoiceIntentBatchResponse(BaseModel):
+    """Response model for batch intent parsing (results in request order)."""
+    results: List[VoiceIntentResponse]
+
+
 class TransactionHistoryItem(BaseModel):
     """Single transaction in history."""
     id: str
@@ -96,6 +155,39 @@ class TransactionHistoryResponse(BaseModel):
     """Response model for transaction history."""
     transactions: List[TransactionHistoryItem]
     total: int
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+
+
+class DashboardResponse(BaseModel):
+    """Response model for the app start-up dashboard (profile + balance + recent activity)."""
+    user_id: str
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    balance: float
+    currency: str = "INR"
+    stale: bool = False  # True if the account row was served from cache while the database was slow
+    recent_transactions: List[TransactionHistoryItem]
+    has_more_transactions: bool = False
+
+
+class SpendingCategory(BaseModel):
+    """Totals for one direction/type (and bill type) within a period."""
+    direction: str  # 'out' (spent) or 'in' (received)
+    type: str
+    bill_type: Optional[str] = None
+    amount: float
+    count: int
+
+
+class SpendingSummaryResponse(BaseModel):
+    """Response model for a per-period spending summary."""
+    user_id: str
+    period: str  # 'day' or 'month'
+    period_start: str
+    total_spent: float
+    total_received: float
+    categories: List[SpendingCategory]
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,74 @@
+"""
+Server-side store for actions awaiting PIN confirmation.
+The first step of a transfer/bill payment resolves and validates everything
+once, stores it here and hands the client a short confirmation token. The PIN
+step then only has to send the token and PIN.
+
+Tokens are kept in process memory, so the confirm request must reach the
+worker that issued the token (sticky sessions); elsewhere it gets a 404.
+"""
+
+from config import settings
+from cache import TTLCache
+from typing import Optional, Dict, Any
+import secrets
+import time
+
+
+class PendingActionStore:
+    """Confirmation tokens mapped to resolved actions, evicted after a TTL."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 120.0, max_attempts: int = 3):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self._actions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.burned = 0
+
+    def create(self, user_id: str, kind: str, **details: Any) -> str:
+        """Store a resolved action for `user_id` and return its confirmation token."""
+        token = secrets.token_urlsafe(16)
+        self._actions.set(token, {
+            "user_id": user_id,
+            "kind": kind,
+            "expires_at": time.time() + self.ttl,
+            "failed_attempts": 0,
+            **details
+        })
+        return token
+
+    def take(self, token: str, user_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim a pending action so it can only be posted once.
+        Returns None if the token is unknown, expired, or belongs to another user/kind.
+        """
+        action = self._actions.pop(token)
+        if action is None or action["expires_at"] <= time.time():
+            return None
+        if action["user_id"] != user_id or action["kind"] != kind:
+            self.restore(token, action)
+            return None
+        return action
+
+    def restore(self, token: str, action: Dict[str, Any]) -> None:
+        """Put a claimed action back for the rest of its TTL."""
+        self._actions.set(token, action, ttl=action["expires_at"] - time.time())
+
+    def fail(self, token: str, action: Dict[str, Any]) -> bool:
+        """
+        Record a wrong PIN for a claimed action. The action is put back until
+        `max_attempts` wrong PINs, then burned. Returns True if it was put back.
+        """
+        action["failed_attempts"] = action.get("failed_attempts", 0) + 1
+        if action["failed_attempts"] >= self.max_attempts:
+            self.burned += 1
+            return False
+        self.restore(token, action)
+        return True
+
+
+# Global pending-action store
+pending_actions = PendingActionStore(
+    maxsize=settings.pending_action_cache_size,
+    ttl=settings.pending_action_ttl,
+    max_attempts=settings.pending_action_max_attempts
+)
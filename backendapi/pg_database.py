@@ -0,0 +1,427 @@
+"""
+Direct PostgreSQL backend for the Voice Banking API.
+Talks to Postgres over a pooled asyncpg connection (SQLAlchemy async engine)
+instead of Supabase PostgREST, saving the HTTPS hop on every query.
+
+Enable with DB_BACKEND=postgres; the connection string comes from DATABASE_URL.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncEngine
+from config import settings
+from database import AsyncDatabase, parse_timestamp, parse_keyset_position, RECEIVER_PHONE_CHANGED
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import uuid
+
+
+# ============== Statements (prepared once per connection by asyncpg) ==============
+
+USER_COLUMNS = ("id", "email", "phone", "name", "balance", "login_pin", "transfer_pin", "version", "created_at")
+
+SELECT_USER = {
+    "id": text("SELECT * FROM users WHERE id = :value"),
+    "phone": text("SELECT * FROM users WHERE phone = :value LIMIT 1"),
+}
+
+SELECT_USERS_BY_PHONES = text("SELECT id, name, phone FROM users WHERE phone = ANY(:phones)")
+
+CLAIM_IDEMPOTENCY_KEY = text("""
+    INSERT INTO idempotency_keys (user_id, scope, key, fingerprint)
+    VALUES (:user_id, :scope, :key, :fingerprint)
+    ON CONFLICT (user_id, scope, key) DO NOTHING
+    RETURNING key
+""")
+
+SELECT_IDEMPOTENCY_KEY = text("SELECT * FROM idempotency_keys WHERE user_id = :user_id AND scope = :scope AND key = :key")
+
+COMPLETE_IDEMPOTENCY_KEY = text("""
+    UPDATE idempotency_keys SET response = CAST(:response AS JSONB)
+    WHERE user_id = :user_id AND scope = :scope AND key = :key
+""")
+
+DELETE_IDEMPOTENCY_KEY = text("DELETE FROM idempotency_keys WHERE user_id = :user_id AND scope = :scope AND key = :key")
+
+SELECT_SPENDING = text("""
+    SELECT direction, type, bill_type, total, count FROM spending_aggregates
+     WHERE user_id = :user_id AND period = :period AND period_start = :period_start
+""")
+
+INSERT_USER = text("""
+    INSERT INTO users (id, email, name, balance, phone)
+    VALUES (:id, :email, :name, :balance, :phone)
+""")
+
+INSERT_TRANSACTION = text("""
+    INSERT INTO transactions (id, sender_id, receiver_id, amount, type, status, note)
+    VALUES (:id, :sender_id, :receiver_id, :amount, :type, :status, :note)
+    RETURNING id
+""")
+
+INSERT_TRANSACTIONS_MANY = text("""
+    INSERT INTO transactions (id, sender_id, receiver_id, amount, type, status, note)
+    VALUES (:id, :sender_id, :receiver_id, :amount, :type, :status, :note)
+""")
+
+SELECT_TRANSACTIONS = text("""
+    SELECT * FROM transactions
+    WHERE (sender_id = :user_id OR receiver_id = :user_id)
+    ORDER BY created_at DESC
+    LIMIT :limit
+""")
+
+SELECT_TRANSACTIONS_BY_TYPE = text("""
+    SELECT * FROM transactions
+    WHERE (sender_id = :user_id OR receiver_id = :user_id) AND type = :type
+    ORDER BY created_at DESC
+    LIMIT :limit
+""")
+
+INSERT_POSTINGS = text("""
+    INSERT INTO ledger_postings (transaction_id, account_id, amount)
+    VALUES (:transaction_id, :debit_account, -CAST(:amount AS DECIMAL)),
+           (:transaction_id, :credit_account, CAST(:amount AS DECIMAL))
+""")
+
+LOCK_USERS = text("SELECT id, balance, phone FROM users WHERE id = ANY(:ids) ORDER BY id FOR UPDATE")
+
+DEBIT_USER = text("UPDATE users SET balance = balance - :amount, version = version + 1 WHERE id = :id RETURNING balance")
+
+CREDIT_USER = text("UPDATE users SET balance = balance + :amount, version = version + 1 WHERE id = :id")
+
+
+def _to_money(amount: float) -> Decimal:
+    """Convert a float amount to the DECIMAL(10,2) the schema stores."""
+    return Decimal(str(amount)).quantize(Decimal("0.01"))
+
+
+def _to_row(mapping) -> Dict[str, Any]:
+    """Convert a DB row to the JSON-like dict PostgREST would have returned."""
+    row = {}
+    for key, value in mapping.items():
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        row[key] = value
+    return row
+
+
+def _async_url(database_url: str) -> Tuple[Any, Dict[str, Any]]:
+    """Rewrite DATABASE_URL for the asyncpg driver and collect driver connect args."""
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    connect_args: Dict[str, Any] = {
+        "timeout": settings.db_connect_timeout,
+        "command_timeout": settings.db_read_timeout,
+        "statement_cache_size": settings.pg_statement_cache_size,
+    }
+
+    # asyncpg does not understand libpq's sslmode parameter
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = "require"
+    query["prepared_statement_cache_size"] = str(settings.pg_statement_cache_size)
+
+    return url.set(query=query), connect_args
+
+
+class PostgresDatabase(AsyncDatabase):
+    """AsyncDatabase backend that uses a pooled direct Postgres connection."""
+
+    def __init__(self):
+        """Create the async engine. Connections are opened lazily by the pool."""
+        super().__init__()
+        url, connect_args = _async_url(settings.database_url)
+        self.engine: AsyncEngine = create_async_engine(
+            url,
+            pool_size=settings.pg_pool_size,
+            max_overflow=settings.pg_max_overflow,
+            pool_recycle=settings.pg_pool_recycle,
+            pool_pre_ping=True,
+            connect_args=connect_args
+        )
+        self._update_statements: Dict[Tuple[str, ...], Any] = {}
+        self._keyset_statements: Dict[Tuple[Any, ...], Any] = {}
+
+    async def close(self) -> None:
+        """Dispose of the connection pool (called on application shutdown)."""
+        await super().close()
+        await self.engine.dispose()
+
+    # ============== I/O Primitives ==============
+
+    async def _fetch_user(self, column: str, value: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single users row where `column` equals `value`."""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(SELECT_USER[column], {"value": value})
+            row = result.mappings().first()
+        return _to_row(row) if row else None
+
+    async def _insert_user(self, data: Dict[str, Any]) -> None:
+        """Insert a users row."""
+        params = {
+            "id": data["id"],
+            "email": data.get("email"),
+            "name": data.get("name"),
+            "balance": _to_money(data.get("balance", 5000.00)),
+            "phone": data.get("phone"),
+        }
+        async with self.engine.begin() as conn:
+            await conn.execute(INSERT_USER, params)
+
+    def _update_statement(self, columns: Tuple[str, ...]):
+        """Build (once) the UPDATE statement for a given set of columns."""
+        statement = self._update_statements.get(columns)
+        if statement is None:
+            unknown = set(columns) - set(USER_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown users columns: {', '.join(sorted(unknown))}")
+            assignments = ", ".join(f"{column} = :{column}" for column in columns)
+            statement = text(f"UPDATE users SET {assignments} WHERE id = :user_id")
+            self._update_statements[columns] = statement
+        return statement
+
+    async def _update_user(self, user_id: str, data: Dict[str, Any]) -> None:
+        """Update columns of a users row."""
+        columns = tuple(sorted(data))
+        params = {column: data[column] for column in columns}
+        if "balance" in params:
+            params["balance"] = _to_money(params["balance"])
+        params["user_id"] = user_id
+        async with self.engine.begin() as conn:
+            await conn.execute(self._update_statement(columns), params)
+
+    async def _insert_transaction(self, data: Dict[str, Any]) -> Optional[str]:
+        """Insert a transactions row and return its ID."""
+        params = {
+            "id": data["id"],
+            "sender_id": data.get("sender_id"),
+            "receiver_id": data.get("receiver_id"),
+            "amount": _to_money(data["amount"]),
+            "type": data["type"],
+            "status": data.get("status", "success"),
+            "note": data.get("note"),
+        }
+        async with self.engine.begin() as conn:
+            result = await conn.execute(INSERT_TRANSACTION, params)
+            tx_id = result.scalar()
+        return str(tx_id) if tx_id else None
+
+    async def _fetch_transactions(self, user_id: str, limit: int, transaction_type: Optional[str]) -> List[Dict[str, Any]]:
+        """Fetch the newest transactions where the user is sender or receiver."""
+        params = {"user_id": user_id, "limit": limit}
+        statement = SELECT_TRANSACTIONS
+        if transaction_type:
+            params["type"] = transaction_type
+            statement = SELECT_TRANSACTIONS_BY_TYPE
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(statement, params)
+            return [_to_row(row) for row in result.mappings().all()]
+
+    def _keyset_statement(self, column: str, by_type: bool, before: bool, since: bool, until: bool):
+        """Build (once) the keyset page query for one history side and filter combination."""
+        key = (column, by_type, before, since, until)
+        statement = self._keyset_statements.get(key)
+        if statement is None:
+            if column not in ("sender_id", "receiver_id"):
+                raise ValueError(f"Unknown history column: {column}")
+            conditions = [f"{column} = :user_id"]
+            if by_type:
+                conditions.append("type = :type")
+            if since:
+                conditions.append("created_at >= :since")
+            if until:
+                conditions.append("created_at < :until")
+            if before:
+                conditions.append("(created_at, id) < (:before_created_at, :before_id)")
+            statement = text(
+                f"SELECT * FROM transactions WHERE {' AND '.join(conditions)} "
+                f"ORDER BY created_at DESC, id DESC LIMIT :limit"
+            )
+            self._keyset_statements[key] = statement
+        return statement
+
+    async def _fetch_transactions_keyset(self, column: str, user_id: str, limit: int, transaction_type: Optional[str] = None, before: Optional[Tuple[str, str]] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Fetch one side of a user's history after a `(created_at, id)` keyset position."""
+        params: Dict[str, Any] = {"user_id": user_id, "limit": limit}
+        if transaction_type:
+            params["type"] = transaction_type
+        if since:
+            params["since"] = since
+        if until:
+            params["until"] = until
+        if before:
+            created_at, tx_id = parse_keyset_position(before)
+            params["before_created_at"] = parse_timestamp(created_at)
+            params["before_id"] = uuid.UUID(tx_id)
+
+        statement = self._keyset_statement(column, bool(transaction_type), bool(before), bool(since), bool(until))
+        async with self.engine.connect() as conn:
+            result = await conn.execute(statement, params)
+            return [_to_row(row) for row in result.mappings().all()]
+
+    async def _post(self, sender_id: str, receiver_id: Optional[str], amount: float, tx_type: str, note: Optional[str], receiver_phone: Optional[str] = None) -> Dict[str, Any]:
+        """Debit, credit and journal in one transaction using SELECT ... FOR UPDATE."""
+        async with self.engine.begin() as conn:
+            return await self._post_on(conn, sender_id, receiver_id, amount, tx_type, note, receiver_phone)
+
+    async def _post_on(self, conn: AsyncConnection, sender_id: str, receiver_id: Optional[str], amount: float, tx_type: str, note: Optional[str], receiver_phone: Optional[str] = None) -> Dict[str, Any]:
+        """`_post` inside the caller's transaction."""
+        if sender_id == receiver_id:
+            return {"success": False, "error": "Cannot transfer money to yourself"}
+
+        money = _to_money(amount)
+        ids = sorted(user_id for user_id in (sender_id, receiver_id) if user_id)
+
+        # Lock rows in id order so opposite transfers cannot deadlock
+        locked = (await conn.execute(LOCK_USERS, {"ids": ids})).all()
+        balances = {str(row.id): row.balance for row in locked}
+        phones = {str(row.id): row.phone for row in locked}
+
+        if sender_id not in balances:
+            return {"success": False, "error": "Sender not found"}
+        if receiver_id and receiver_id not in balances:
+            return {"success": False, "error": "Receiver not found"}
+        if receiver_id and receiver_phone is not None and phones[receiver_id] != receiver_phone:
+            return {"success": False, "error": RECEIVER_PHONE_CHANGED}
+        if balances[sender_id] < money:
+            return {"success": False, "error": "Insufficient funds", "current_balance": float(balances[sender_id])}
+
+        new_balance = (await conn.execute(DEBIT_USER, {"id": sender_id, "amount": money})).scalar()
+        if receiver_id:
+            await conn.execute(CREDIT_USER, {"id": receiver_id, "amount": money})
+
+        tx_id = str(uuid.uuid4())
+        await conn.execute(INSERT_TRANSACTION, {
+            "id": tx_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "amount": money,
+            "type": tx_type,
+            "status": "success",
+            "note": note,
+        })
+        await conn.execute(INSERT_POSTINGS, {
+            "transaction_id": tx_id,
+            "debit_account": sender_id,
+            "credit_account": receiver_id or f"EXTERNAL:{tx_type.upper()}",
+            "amount": money,
+        })
+
+        return {"success": True, "transaction_id": tx_id, "new_balance": float(new_balance)}
+
+    async def _fetch_users_by_phones(self, phones: List[str]) -> List[Dict[str, Any]]:
+        """Fetch id/name/phone for many phone numbers in one query."""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(SELECT_USERS_BY_PHONES, {"phones": phones})
+            return [_to_row(row) for row in result.mappings().all()]
+
+    async def _fetch_spending(self, user_id: str, period: str, period_start: str) -> List[Dict[str, Any]]:
+        """Fetch a user's spending aggregate rows for one period (primary-key range read)."""
+        params = {"user_id": user_id, "period": period, "period_start": date.fromisoformat(period_start)}
+        async with self.engine.connect() as conn:
+            result = await conn.execute(SELECT_SPENDING, params)
+            return [_to_row(row) for row in result.mappings().all()]
+
+    async def _claim_idempotency_key(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert a pending idempotency row; return the existing row if the key is already taken."""
+        async with self.engine.begin() as conn:
+            if (await conn.execute(CLAIM_IDEMPOTENCY_KEY, row)).scalar() is not None:
+                return None
+            existing = (await conn.execute(SELECT_IDEMPOTENCY_KEY, row)).mappings().first()
+            return _to_row(existing) if existing else None
+
+    async def _complete_idempotency_key(self, user_id: str, scope: str, key: str, response: Dict[str, Any]) -> None:
+        """Store the response of a claimed idempotency key."""
+        params = {"user_id": user_id, "scope": scope, "key": key, "response": json.dumps(response)}
+        async with self.engine.begin() as conn:
+            await conn.execute(COMPLETE_IDEMPOTENCY_KEY, params)
+
+    async def _release_idempotency_key(self, user_id: str, scope: str, key: str) -> None:
+        """Delete an idempotency row so the key can be used again."""
+        async with self.engine.begin() as conn:
+            await conn.execute(DELETE_IDEMPOTENCY_KEY, {"user_id": user_id, "scope": scope, "key": key})
+
+    async def _post_batch(self, sender_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Post a batch of transfers from one sender in one transaction (all or nothing)."""
+        async with self.engine.begin() as conn:
+            return await self._post_batch_on(conn, sender_id, items)
+
+    async def _post_batch_on(self, conn: AsyncConnection, sender_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """`_post_batch` inside the caller's transaction."""
+        if any(item["receiver_id"] == sender_id for item in items):
+            return {"success": False, "error": "Cannot transfer money to yourself"}
+
+        credits: Dict[str, Decimal] = {}
+        for item in items:
+            credits[item["receiver_id"]] = credits.get(item["receiver_id"], Decimal("0")) + _to_money(item["amount"])
+        total = sum(credits.values(), Decimal("0"))
+
+        # Lock sender and receivers in id order so concurrent batches cannot deadlock
+        locked = (await conn.execute(LOCK_USERS, {"ids": sorted({sender_id, *credits})})).all()
+        balances = {str(row.id): row.balance for row in locked}
+        phones = {str(row.id): row.phone for row in locked}
+
+        if sender_id not in balances:
+            return {"success": False, "error": "Sender not found"}
+        if any(receiver_id not in balances for receiver_id in credits):
+            return {"success": False, "error": "Receiver not found"}
+        if any(item.get("receiver_phone") is not None and phones[item["receiver_id"]] != item["receiver_phone"] for item in items):
+            return {"success": False, "error": RECEIVER_PHONE_CHANGED}
+        if balances[sender_id] < total:
+            return {"success": False, "error": "Insufficient funds", "current_balance": float(balances[sender_id])}
+
+        new_balance = (await conn.execute(DEBIT_USER, {"id": sender_id, "amount": total})).scalar()
+        await conn.execute(CREDIT_USER, [
+            {"id": receiver_id, "amount": amount} for receiver_id, amount in credits.items()
+        ])
+        await conn.execute(INSERT_TRANSACTIONS_MANY, [
+            {
+                "id": item["id"],
+                "sender_id": sender_id,
+                "receiver_id": item["receiver_id"],
+                "amount": _to_money(item["amount"]),
+                "type": "transfer",
+                "status": "success",
+                "note": item.get("note"),
+            }
+            for item in items
+        ])
+        await conn.execute(INSERT_POSTINGS, [
+            {
+                "transaction_id": item["id"],
+                "debit_account": sender_id,
+                "credit_account": item["receiver_id"],
+                "amount": _to_money(item["amount"]),
+            }
+            for item in items
+        ])
+
+        return {"success": True, "total": float(total), "new_balance": float(new_balance)}
+
+    async def _post_group(self, postings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Commit many postings in one transaction, each under its own savepoint so
+        a failing posting rolls back alone (what `post_group` does server-side).
+        """
+        results = []
+        async with self.engine.begin() as conn:
+            for posting in postings:
+                try:
+                    async with conn.begin_nested():
+                        if posting["kind"] == "batch":
+                            result = await self._post_batch_on(conn, posting["sender_id"], posting["items"])
+                        else:
+                            result = await self._post_on(conn, posting["sender_id"], posting["receiver_id"], posting["amount"], posting["type"], posting["note"], posting["receiver_phone"])
+                except DBAPIError as e:
+                    result = {"success": False, "error": str(e.orig), "sqlstate": getattr(e.orig, "sqlstate", None)}
+                results.append(result)
+        return results
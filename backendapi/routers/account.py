@@ -3,19 +3,57 @@ Account-related API endpoints.
 Handles balance checking and account information.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from auth import get_current_user_id
-from database import db
+from database import async_db
 from models import (
     BalanceResponse, 
     ErrorResponse, 
     PinSetupRequest, 
-    PinVerifyRequest
+    PinVerifyRequest,
+    SpendingCategory,
+    SpendingSummaryResponse,
+    DashboardResponse,
+    TransactionHistoryItem
 )
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import json
 
 
 router = APIRouter(prefix="/account", tags=["Account"])
 
+# Spending periods follow the IST calendar (see SPENDING_SCHEMA.sql)
+IST = timezone(timedelta(hours=5, minutes=30))
+SUMMARY_PERIODS = ["day", "month"]
+MAX_DASHBOARD_TRANSACTIONS = 20
+
+
+def _etag(payload: Dict[str, Any]) -> str:
+    """Weak ETag over a response payload."""
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def _revalidate(request: Request, response: Response, payload: Dict[str, Any], stale: bool) -> Optional[Response]:
+    """
+    Set caching headers for an account read. Returns a bodyless 304 response
+    if the client's If-None-Match already matches `payload`.
+    """
+    etag = _etag(payload)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "X-Data-Stale": "true" if stale else "false"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
 
 @router.get(
     "/balance",
@@ -27,16 +65,22 @@ router = APIRouter(prefix="/account", tags=["Account"])
     summary="Get Account Balance",
     description="Fetch the current balance for the authenticated user."
 )
-async def get_balance(user_id: str = Depends(get_current_user_id)):
+async def get_balance(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user_id)
+):
     """
     Get current account balance for authenticated user.
     
     **Security**: Requires valid Supabase JWT token.
     
-    **Returns**: Balance in INR and user ID.
+    **Returns**: Balance in INR and user ID. `stale` is true when the balance
+    was served from cache because the database was slow to answer.
+    Send the `ETag` back as `If-None-Match` to get a bodyless `304` when unchanged.
     """
-    # Fetch user from database
-    user = db.get_user_by_id(user_id)
+    # Fetch user (stale-while-revalidate cache)
+    user, stale = await async_db.get_account(user_id)
     
     if not user:
         raise HTTPException(
@@ -44,17 +88,81 @@ async def get_balance(user_id: str = Depends(get_current_user_id)):
             detail="User account not found"
         )
     
-    return BalanceResponse(
+    balance = BalanceResponse(
         balance=float(user["balance"]),
-        user_id=user_id
+        user_id=user_id,
+        stale=stale
+    )
+    not_modified = _revalidate(request, response, {"balance": balance.balance, "user_id": user_id}, stale)
+    return not_modified or balance
+
+
+@router.get(
+    "/summary",
+    response_model=SpendingSummaryResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Invalid period"},
+        401: {"model": ErrorResponse, "description": "Unauthorized"}
+    },
+    summary="Get Spending Summary",
+    description="Totals spent and received in a day or month, by transaction and bill type."
+)
+async def get_spending_summary(
+    period: str = "month",
+    on: Optional[date] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Get spending summary for the day/month containing `on` (default: today, IST).
+    
+    Answers questions like "how much did I spend on bills this month" from
+    pre-aggregated totals in a single indexed read.
+    """
+    if period not in SUMMARY_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period. Must be one of: {', '.join(SUMMARY_PERIODS)}"
+        )
+
+    day = on or datetime.now(IST).date()
+    period_start = day if period == "day" else day.replace(day=1)
+
+    rows = await async_db.get_spending_summary(user_id, period, period_start.isoformat())
+    if rows is None:
+        raise HTTPException(status_code=500, detail="Failed to load spending summary")
+
+    categories = [
+        SpendingCategory(
+            direction=row["direction"],
+            type=row["type"],
+            bill_type=row.get("bill_type") or None,
+            amount=float(row["total"]),
+            count=row["count"]
+        )
+        for row in rows
+    ]
+
+    return SpendingSummaryResponse(
+        user_id=user_id,
+        period=period,
+        period_start=period_start.isoformat(),
+        total_spent=round(sum(c.amount for c in categories if c.direction == "out"), 2),
+        total_received=round(sum(c.amount for c in categories if c.direction == "in"), 2),
+        categories=categories
     )
+
+
 @router.get(
     "/profile",
     summary="Get User Profile",
     description="Fetch profile details for the authenticated user."
 )
-async def get_profile(user_id: str = Depends(get_current_user_id)):
-    user = db.get_user_by_id(user_id)
+async def get_profile(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user_id)
+):
+    user, stale = await async_db.get_account(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -62,7 +170,67 @@ async def get_profile(user_id: str = Depends(get_current_user_id)):
     profile = dict(user)
     profile.pop("login_pin", None)
     profile.pop("transfer_pin", None)
-    return profile
+    not_modified = _revalidate(request, response, profile, stale)
+    return not_modified or profile
+
+
+@router.get(
+    "/dashboard",
+    response_model=DashboardResponse,
+    responses={
+        401: {"model": ErrorResponse, "description": "Unauthorized"},
+        404: {"model": ErrorResponse, "description": "User not found"}
+    },
+    summary="Get Dashboard",
+    description="Profile, balance and recent transactions in one call (app start-up)."
+)
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    recent: int = 5,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Everything the app shows at start-up, in one authenticated request.
+    
+    **Query Parameters**:
+    - recent: Number of recent transactions to include (default: 5, max: 20)
+    
+    The account row and the newest transactions are read concurrently.
+    Supports `ETag`/`If-None-Match` like `/account/balance`.
+    """
+    (user, stale), (transactions, next_position) = await asyncio.gather(
+        async_db.get_account(user_id),
+        async_db.get_transaction_page(user_id, limit=max(1, min(recent, MAX_DASHBOARD_TRANSACTIONS)))
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    dashboard = DashboardResponse(
+        user_id=user_id,
+        name=user.get("name"),
+        phone=user.get("phone"),
+        email=user.get("email"),
+        balance=float(user["balance"]),
+        stale=stale,
+        recent_transactions=[
+            TransactionHistoryItem(
+                id=t["id"],
+                type=t["type"],
+                amount=t["amount"],
+                status=t["status"],
+                created_at=t["created_at"],
+                sender_id=t.get("sender_id"),
+                receiver_id=t.get("receiver_id"),
+                note=t.get("note")
+            )
+            for t in transactions
+        ],
+        has_more_transactions=next_position is not None
+    )
+    payload = dashboard.model_dump(exclude={"stale"})
+    not_modified = _revalidate(request, response, payload, stale)
+    return not_modified or dashboard
 
 
 @router.post(
@@ -80,7 +248,7 @@ async def setup_pin(
     if request.type == "transfer" and len(request.pin) != 4:
         raise HTTPException(status_code=400, detail="Transfer PIN must be 4 digits")
     
-    success = db.set_user_pin(user_id, request.pin, request.type, request.phone)
+    success = await async_db.set_user_pin(user_id, request.pin, request.type, request.phone)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to save PIN")
     
@@ -96,7 +264,7 @@ async def verify_pin(
     request: PinVerifyRequest,
     user_id: str = Depends(get_current_user_id)
 ):
-    valid = db.verify_user_pin(user_id, request.pin, request.type)
+    valid = await async_db.verify_user_pin(user_id, request.pin, request.type)
     if not valid:
         raise HTTPException(status_code=401, detail=f"Invalid {request.type} PIN")
     
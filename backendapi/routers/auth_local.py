@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
-from database import db
+from database import async_db
 from auth import get_current_user_id
 
 router = APIRouter(prefix="/auth-local", tags=["Auth (Local/Demo)"])
@@ -19,7 +19,7 @@ async def login_with_pin(
     Requires JWT (already authenticated via Supabase) to identify the user.
     """
     # 1. Verify Login PIN
-    valid_pin = db.verify_user_pin(user_id, request.pin, "login")
+    valid_pin = await async_db.verify_user_pin(user_id, request.pin, "login")
     if not valid_pin:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
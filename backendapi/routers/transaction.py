@@ -3,52 +3,135 @@ Transaction-related API endpoints.
 Handles money transfers, bill payments, and transaction history.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from auth import get_current_user_id
-from database import db
+from config import settings
+from database import async_db, parse_keyset_position
+from pending_actions import pending_actions
+from idempotency import idempotency
 from models import (
     TransferRequest,
+    BatchTransferRequest,
     BillPaymentRequest,
+    ConfirmationRequest,
     TransactionResponse,
+    BatchTransferResponse,
+    BatchTransferItemResult,
     BillPaymentResponse,
     TransactionHistoryResponse,
     TransactionHistoryItem,
     ErrorResponse
 )
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
+import base64
+import csv
+import io
+import json
 
 
 router = APIRouter(prefix="/transaction", tags=["Transactions"])
 
+MAX_TX_AMOUNT = 2000.0
+VALID_BILL_TYPES = ["electricity", "water", "mobile", "internet", "gas"]
+MAX_HISTORY_PAGE = 100
+STATEMENT_FIELDS = ["id", "created_at", "type", "amount", "status", "sender_id", "receiver_id", "note"]
+STATEMENT_FLUSH_ROWS = 200
 
-@router.post(
-    "/transfer",
-    response_model=TransactionResponse,
-    responses={
-        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, invalid receiver, etc.)"},
-        401: {"model": ErrorResponse, "description": "Unauthorized"},
-        404: {"model": ErrorResponse, "description": "Receiver not found"}
-    },
-    summary="Transfer Money",
-    description="Transfer money from authenticated user to another user by phone number."
-)
-async def transfer_money(
-    request: TransferRequest,
-    user_id: str = Depends(get_current_user_id)
-):
+
+def _encode_cursor(position: Tuple[str, str]) -> str:
+    """Opaque history cursor for a `(created_at, id)` keyset position."""
+    raw = json.dumps(list(position), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a history cursor; raises 400 if it was not issued by `_encode_cursor`.
+    The position must be an ISO timestamp and a transaction UUID.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, tx_id = json.loads(raw)
+        return parse_keyset_position((created_at, tx_id))
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+async def _post_transfer(user_id: str, receiver: Dict[str, Any], receiver_phone: str, amount: float, note: Optional[str], transfer_pin: str, receiver_display: str) -> TransactionResponse:
+    """Verify the PIN and post a transfer to an already-resolved receiver."""
+    # Execute transfer (Includes Fraud Checks and PIN Verification)
+    # The phone is re-checked while posting: the resolution may come from the phone cache
+    result = await async_db.execute_transfer(
+        sender_id=user_id,
+        receiver_id=receiver["id"],
+        amount=amount,
+        note=note,
+        transfer_pin=transfer_pin,
+        receiver_phone=receiver_phone
+    )
+    
+    if not result["success"]:
+        # Specific business logic errors
+        error_msg = result.get("error", "Transfer failed")
+        print(f"[TRANSFER] Failed: {error_msg}")
+        if "PIN" in error_msg:
+            raise HTTPException(status_code=401, detail=error_msg)
+        raise HTTPException(status_code=400, detail=error_msg)
+    
+    print(f"[TRANSFER] Success!")
+    
+    return TransactionResponse(
+        transaction_id=result["transaction_id"],
+        status="success",
+        new_balance=result["new_balance"],
+        message=f"Successfully transferred ₹{amount} to {receiver_display}"
+    )
+
+
+async def _post_bill_payment(user_id: str, bill_type: str, amount: float, account_number: str, transfer_pin: str) -> BillPaymentResponse:
+    """Verify the PIN and post an already-validated bill payment."""
+    # Verify PIN
+    if not await async_db.verify_user_pin(user_id, transfer_pin, "transfer"):
+        raise HTTPException(status_code=401, detail="Invalid transfer PIN")
+
+    # Debit and record atomically (balance check happens in the database)
+    result = await async_db.post_transaction(
+        sender_id=user_id,
+        receiver_id=None,
+        amount=amount,
+        tx_type="billpay",
+        note=f"{bill_type} bill payment - Account: {account_number}"
+    )
+
+    if not result["success"]:
+        error_msg = result.get("error", "Failed to process payment")
+        print(f"[BILLPAY] Failed: {error_msg}")
+        if error_msg == "Sender not found":
+            raise HTTPException(status_code=404, detail="User not found")
+        if error_msg == "Insufficient funds":
+            raise HTTPException(status_code=400, detail=error_msg)
+        raise HTTPException(status_code=500, detail="Failed to process payment")
+    
+    return BillPaymentResponse(
+        transaction_id=result["transaction_id"],
+        status="success",
+        bill_type=bill_type,
+        new_balance=result["new_balance"]
+    )
+
+
+async def _transfer(request: TransferRequest, user_id: str) -> TransactionResponse:
+    """Resolve and validate a transfer; post it if the PIN was supplied."""
     print(f"\n[TRANSFER] Request from {user_id} for amount {request.amount} to {request.receiver_phone}")
     if request.transfer_pin:
         print(f"[TRANSFER] PIN provided: YES")
     else:
         print(f"[TRANSFER] PIN provided: NO")
-    """
-    Transfer money to another user.
-    
-    **Security**: 
-    - Requires valid JWT.
-    - Requires 4-digit Transfer PIN for final execution.
-    - Enforces ₹2000 per-transaction limit.
-    """
     # 1. Basic Validation
     if request.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be greater than 0")
@@ -57,18 +140,32 @@ async def transfer_money(
     if not request.transfer_pin:
         # If no PIN, we return a "Confirmation Required" prompt
         # Resolve receiver name for a better message
-        receiver = db.get_user_by_phone(request.receiver_phone)
+        receiver = await async_db.resolve_phone(request.receiver_phone)
         receiver_display = receiver.get("name", request.receiver_phone) if receiver else request.receiver_phone
         
+        # Remember the resolved, validated transfer so the PIN step only verifies and posts
+        confirmation_token = None
+        if receiver and receiver["id"] != user_id and request.amount <= MAX_TX_AMOUNT:
+            confirmation_token = pending_actions.create(
+                user_id,
+                "transfer",
+                receiver=receiver,
+                receiver_phone=request.receiver_phone,
+                receiver_display=receiver_display,
+                amount=request.amount,
+                note=request.note
+            )
+        
         return TransactionResponse(
             transaction_id="pending",
             status="confirmation_required",
             new_balance=0.0,
-            message=f"I will transfer ₹{request.amount} to {receiver_display}. Please say or enter your 4-digit transfer PIN to confirm."
+            message=f"I will transfer ₹{request.amount} to {receiver_display}. Please say or enter your 4-digit transfer PIN to confirm.",
+            confirmation_token=confirmation_token
         )
 
     # 3. Find receiver by phone
-    receiver = db.get_user_by_phone(request.receiver_phone)
+    receiver = await async_db.resolve_phone(request.receiver_phone)
     if not receiver:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,113 +176,314 @@ async def transfer_money(
     if receiver["id"] == user_id:
         raise HTTPException(status_code=400, detail="Cannot transfer money to yourself")
     
-    # 5. Execute transfer (Includes Fraud Checks and PIN Verification)
-    result = db.execute_transfer(
-        sender_id=user_id,
-        receiver_id=receiver["id"],
-        amount=request.amount,
-        note=request.note,
-        transfer_pin=request.transfer_pin
+    # 5. Verify PIN and post
+    return await _post_transfer(
+        user_id,
+        receiver,
+        request.receiver_phone,
+        request.amount,
+        request.note,
+        request.transfer_pin,
+        receiver.get("name", request.receiver_phone)
     )
+
+
+@router.post(
+    "/transfer",
+    response_model=TransactionResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, invalid receiver, etc.)"},
+        401: {"model": ErrorResponse, "description": "Unauthorized"},
+        404: {"model": ErrorResponse, "description": "Receiver not found"}
+    },
+    summary="Transfer Money",
+    description="Transfer money from authenticated user to another user by phone number."
+)
+async def transfer_money(
+    request: TransferRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Transfer money to another user.
     
-    if not result["success"]:
-        # Specific business logic errors
-        error_msg = result.get("error", "Transfer failed")
-        print(f"[TRANSFER] Failed: {error_msg}")
-        if "PIN" in error_msg:
-            raise HTTPException(status_code=401, detail=error_msg)
-        raise HTTPException(status_code=400, detail=error_msg)
+    **Security**: 
+    - Requires valid JWT.
+    - Requires 4-digit Transfer PIN for final execution.
+    - Enforces ₹2000 per-transaction limit.
     
-    print(f"[TRANSFER] Success!")
+    Without a PIN, returns `confirmation_required` plus a `confirmation_token`
+    that can be confirmed via `/transaction/transfer/confirm`.
     
-    return TransactionResponse(
-        transaction_id=result["transaction_id"],
-        status="success",
-        new_balance=result["new_balance"],
-        message=f"Successfully transferred ₹{request.amount} to {receiver.get('name', request.receiver_phone)}"
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    returns the first response instead of posting again.
+    """
+    return await idempotency.run(idempotency_key, user_id, "transfer", request, lambda: _transfer(request, user_id))
+
+
+async def _confirm_transfer(request: ConfirmationRequest, user_id: str) -> TransactionResponse:
+    """Post a pending transfer by its confirmation token."""
+    action = pending_actions.take(request.confirmation_token, user_id, "transfer")
+    if not action:
+        raise HTTPException(status_code=404, detail="Confirmation expired. Please start the transfer again.")
+    
+    try:
+        return await _post_transfer(
+            user_id,
+            action["receiver"],
+            action["receiver_phone"],
+            action["amount"],
+            action["note"],
+            request.transfer_pin,
+            action["receiver_display"]
+        )
+    except HTTPException as e:
+        # Wrong PIN: keep the pending transfer for a few more tries
+        if e.status_code == 401 and not pending_actions.fail(request.confirmation_token, action):
+            raise HTTPException(status_code=401, detail="Invalid transfer PIN. Too many attempts, please start the transfer again.")
+        raise
+
+
+@router.post(
+    "/transfer/confirm",
+    response_model=TransactionResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, etc.)"},
+        401: {"model": ErrorResponse, "description": "Unauthorized or invalid PIN"},
+        404: {"model": ErrorResponse, "description": "Confirmation token unknown or expired"}
+    },
+    summary="Confirm Transfer",
+    description="Confirm a pending transfer with its confirmation token and the transfer PIN."
+)
+async def confirm_transfer(
+    request: ConfirmationRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Confirm a transfer started without a PIN.
+    Receiver resolution and validation are reused from the first step.
+    """
+    return await idempotency.run(idempotency_key, user_id, "transfer_confirm", request, lambda: _confirm_transfer(request, user_id))
+
+
+async def _transfer_batch(request: BatchTransferRequest, user_id: str) -> BatchTransferResponse:
+    """Validate every line item and post the payable ones as one atomic batch."""
+    if len(request.transfers) > settings.batch_transfer_max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.batch_transfer_max_items} transfers")
+    
+    print(f"\n[BATCH] Request from {user_id} with {len(request.transfers)} transfer(s)")
+    
+    # 1. Resolve every receiver in one query
+    receivers = await async_db.resolve_phones([item.receiver_phone for item in request.transfers])
+    
+    # 2. Per-line validation
+    results = []
+    postable = []
+    for index, item in enumerate(request.transfers):
+        receiver = receivers.get(item.receiver_phone)
+        error = None
+        if not receiver:
+            error = f"No user found with phone number {item.receiver_phone}"
+        elif receiver["id"] == user_id:
+            error = "Cannot transfer money to yourself"
+        elif item.amount > MAX_TX_AMOUNT:
+            error = f"Transaction amount exceeds limit of ₹{MAX_TX_AMOUNT}"
+        
+        results.append(BatchTransferItemResult(
+            index=index,
+            receiver_phone=item.receiver_phone,
+            amount=item.amount,
+            status="rejected" if error else "pending",
+            error=error
+        ))
+        if not error:
+            postable.append((index, {"receiver_id": receiver["id"], "receiver_phone": item.receiver_phone, "amount": item.amount, "note": item.note}))
+    
+    total_amount = round(sum(transfer["amount"] for _, transfer in postable), 2)
+    new_balance = None
+    
+    # 3. Verify PIN once and post all valid lines atomically
+    if postable:
+        result = await async_db.execute_transfer_batch(
+            sender_id=user_id,
+            transfers=[transfer for _, transfer in postable],
+            transfer_pin=request.transfer_pin
+        )
+        
+        if not result["success"]:
+            error_msg = result.get("error", "Batch transfer failed")
+            print(f"[BATCH] Failed: {error_msg}")
+            if "PIN" in error_msg:
+                raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=400, detail=error_msg)
+        
+        new_balance = result["new_balance"]
+        for (index, _), transaction_id in zip(postable, result["transaction_ids"]):
+            results[index].status = "success"
+            results[index].transaction_id = transaction_id
+    
+    succeeded = len(postable)
+    failed = len(results) - succeeded
+    print(f"[BATCH] {succeeded} posted, {failed} rejected")
+    
+    return BatchTransferResponse(
+        status="success" if not failed else ("partial" if succeeded else "failed"),
+        succeeded=succeeded,
+        failed=failed,
+        total_amount=total_amount,
+        new_balance=new_balance,
+        results=results,
+        message=f"Paid ₹{total_amount} to {succeeded} receiver(s)" + (f"; {failed} line(s) rejected" if failed else "")
     )
 
 
 @router.post(
-    "/billpay",
-    response_model=BillPaymentResponse,
+    "/transfer/batch",
+    response_model=BatchTransferResponse,
     responses={
-        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, invalid bill type, etc.)"},
-        401: {"model": ErrorResponse, "description": "Unauthorized"}
+        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds for the batch total, batch too large, etc.)"},
+        401: {"model": ErrorResponse, "description": "Unauthorized or invalid PIN"}
     },
-    summary="Pay Bill",
-    description="Pay utility bills (electricity, water, mobile, etc.)."
+    summary="Bulk Payout",
+    description="Pay many receivers at once with a single PIN; valid line items are posted atomically."
 )
-async def pay_bill(
-    request: BillPaymentRequest,
-    user_id: str = Depends(get_current_user_id)
+async def transfer_batch(
+    request: BatchTransferRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
-    Pay a utility bill.
+    Pay out to many receivers in one call (e.g. a cooperative paying farmers).
+    
+    - Transfer PIN is verified once for the whole batch.
+    - Receivers are resolved in a single lookup.
+    - Line items that cannot be paid (unknown phone, self, over the ₹2000 limit)
+      are reported individually; all other items are posted in one atomic batch,
+      so either all of them succeed or none do.
+    
+    Send an `Idempotency-Key` header to make retries safe: a repeated key
+    returns the first response instead of paying out again.
     """
+    return await idempotency.run(idempotency_key, user_id, "transfer_batch", request, lambda: _transfer_batch(request, user_id))
+
+
+async def _pay_bill(request: BillPaymentRequest, user_id: str) -> BillPaymentResponse:
+    """Validate a bill payment; post it if the PIN was supplied."""
     # 1. Validation
     if request.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be greater than 0")
     
-    valid_bill_types = ["electricity", "water", "mobile", "internet", "gas"]
-    if request.bill_type not in valid_bill_types:
-        raise HTTPException(status_code=400, detail=f"Invalid bill type. Use: {', '.join(valid_bill_types)}")
+    if request.bill_type not in VALID_BILL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid bill type. Use: {', '.join(VALID_BILL_TYPES)}")
 
     # 2. Check for PIN
     if not request.transfer_pin:
+        confirmation_token = None
+        if request.amount <= MAX_TX_AMOUNT:
+            confirmation_token = pending_actions.create(
+                user_id,
+                "billpay",
+                bill_type=request.bill_type,
+                amount=request.amount,
+                account_number=request.account_number
+            )
+        
         return BillPaymentResponse(
             transaction_id="pending",
             status="confirmation_required",
             bill_type=request.bill_type,
             new_balance=0.0,
-            message=f"I will pay ₹{request.amount} for your {request.bill_type} bill. Please say or enter your 4-digit transfer PIN to confirm."
+            message=f"I will pay ₹{request.amount} for your {request.bill_type} bill. Please say or enter your 4-digit transfer PIN to confirm.",
+            confirmation_token=confirmation_token
         )
 
-    # 3. Verify PIN
-    if not db.verify_user_pin(user_id, request.transfer_pin, "transfer"):
-        raise HTTPException(status_code=401, detail="Invalid transfer PIN")
-
-    # 4. Get user balance
-    user = db.get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # 5. FRAUD CHECK: Max Limit
-    MAX_TX_AMOUNT = 2000.0
+    # 3. FRAUD CHECK: Max Limit
     if request.amount > MAX_TX_AMOUNT:
         raise HTTPException(status_code=400, detail=f"Bill payment exceeds limit of ₹{MAX_TX_AMOUNT}")
 
-    # 6. Check sufficient balance
-    if user["balance"] < request.amount:
-        raise HTTPException(status_code=400, detail=f"Insufficient funds")
+    # 4. Verify PIN and post
+    return await _post_bill_payment(
+        user_id,
+        request.bill_type,
+        request.amount,
+        request.account_number,
+        request.transfer_pin
+    )
+
+
+@router.post(
+    "/billpay",
+    response_model=BillPaymentResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, invalid bill type, etc.)"},
+        401: {"model": ErrorResponse, "description": "Unauthorized"}
+    },
+    summary="Pay Bill",
+    description="Pay utility bills (electricity, water, mobile, etc.)."
+)
+async def pay_bill(
+    request: BillPaymentRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Pay a utility bill.
     
-    # 7. Deduct amount and create record
-    if not db.update_balance(user_id, -request.amount):
-        raise HTTPException(status_code=500, detail="Failed to process payment")
+    Without a PIN, returns `confirmation_required` plus a `confirmation_token`
+    that can be confirmed via `/transaction/billpay/confirm`.
+    """
+    return await idempotency.run(idempotency_key, user_id, "billpay", request, lambda: _pay_bill(request, user_id))
+
+
+async def _confirm_bill_payment(request: ConfirmationRequest, user_id: str) -> BillPaymentResponse:
+    """Post a pending bill payment by its confirmation token."""
+    action = pending_actions.take(request.confirmation_token, user_id, "billpay")
+    if not action:
+        raise HTTPException(status_code=404, detail="Confirmation expired. Please start the payment again.")
     
-    transaction_id = db.create_transaction({
-        "sender_id": user_id,
-        "receiver_id": None,
-        "amount": request.amount,
-        "type": "billpay",
-        "status": "success",
-        "note": f"{request.bill_type} bill payment - Account: {request.account_number}"
-    })
-    
-    # 8. Return response
-    updated_user = db.get_user_by_id(user_id)
-    return BillPaymentResponse(
-        transaction_id=transaction_id,
-        status="success",
-        bill_type=request.bill_type,
-        new_balance=updated_user["balance"]
-    )
+    try:
+        return await _post_bill_payment(
+            user_id,
+            action["bill_type"],
+            action["amount"],
+            action["account_number"],
+            request.transfer_pin
+        )
+    except HTTPException as e:
+        # Wrong PIN: keep the pending payment for a few more tries
+        if e.status_code == 401 and not pending_actions.fail(request.confirmation_token, action):
+            raise HTTPException(status_code=401, detail="Invalid transfer PIN. Too many attempts, please start the payment again.")
+        raise
+
+
+@router.post(
+    "/billpay/confirm",
+    response_model=BillPaymentResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Bad request (insufficient funds, etc.)"},
+        401: {"model": ErrorResponse, "description": "Unauthorized or invalid PIN"},
+        404: {"model": ErrorResponse, "description": "Confirmation token unknown or expired"}
+    },
+    summary="Confirm Bill Payment",
+    description="Confirm a pending bill payment with its confirmation token and the transfer PIN."
+)
+async def confirm_bill_payment(
+    request: ConfirmationRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Confirm a bill payment started without a PIN.
+    """
+    return await idempotency.run(idempotency_key, user_id, "billpay_confirm", request, lambda: _confirm_bill_payment(request, user_id))
 
 
 @router.get(
     "/history",
     response_model=TransactionHistoryResponse,
     responses={
+        400: {"model": ErrorResponse, "description": "Invalid cursor"},
         401: {"model": ErrorResponse, "description": "Unauthorized"}
     },
     summary="Get Transaction History",
@@ -194,22 +492,32 @@ async def pay_bill(
 async def get_transaction_history(
     limit: int = 50,
     transaction_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
     user_id: str = Depends(get_current_user_id)
 ):
     """
-    Get transaction history.
+    Get transaction history, newest first, one page at a time.
     
     **Query Parameters**:
-    - limit: Max number of transactions to return (default: 50)
+    - limit: Max number of transactions to return (default: 50, max: 100)
     - transaction_type: Filter by type (transfer, billpay)
+    - cursor: `next_cursor` from the previous page
+    - from_date / to_date: Only transactions created in [from_date, to_date)
     
     **Security**: Requires valid JWT. Only returns transactions for authenticated user.
     """
-    # Fetch transactions
-    transactions = db.get_transaction_history(
+    before = _decode_cursor(cursor) if cursor else None
+
+    # Fetch one keyset page
+    transactions, next_position = await async_db.get_transaction_page(
         user_id=user_id,
-        limit=min(limit, 100),  # Cap at 100
-        transaction_type=transaction_type
+        limit=max(1, min(limit, MAX_HISTORY_PAGE)),
+        transaction_type=transaction_type,
+        before=before,
+        since=from_date,
+        until=to_date
     )
     
     # Convert to response models
@@ -229,5 +537,89 @@ async def get_transaction_history(
     
     return TransactionHistoryResponse(
         transactions=transaction_items,
-        total=len(transaction_items)
+        total=len(transaction_items),
+        next_cursor=_encode_cursor(next_position) if next_position else None
+    )
+
+
+async def _statement_lines(user_id: str, export_format: str, transaction_type: Optional[str], from_date: Optional[datetime], to_date: Optional[datetime]) -> AsyncIterator[str]:
+    """Render the statement incrementally, flushing every STATEMENT_FLUSH_ROWS rows."""
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=STATEMENT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        # Send the header right away so the client sees bytes before the first query returns
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    rows = 0
+    try:
+        async for t in async_db.iter_transactions(
+            user_id=user_id,
+            chunk_size=settings.statement_chunk_size,
+            transaction_type=transaction_type,
+            since=from_date,
+            until=to_date
+        ):
+            if writer:
+                writer.writerow(t)
+            else:
+                buffer.write(json.dumps({field: t.get(field) for field in STATEMENT_FIELDS}, default=str))
+                buffer.write("\n")
+            rows += 1
+            if rows % STATEMENT_FLUSH_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        # Headers are already sent; aborting the body tells the client the export is incomplete
+        print(f"Error streaming statement for {user_id} after {rows} rows: {e}")
+        raise
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get(
+    "/statement",
+    responses={
+        400: {"model": ErrorResponse, "description": "Unsupported format"},
+        401: {"model": ErrorResponse, "description": "Unauthorized"}
+    },
+    summary="Export Account Statement",
+    description="Stream the full transaction history as NDJSON or CSV."
+)
+async def export_statement(
+    export_format: str = Query("ndjson", alias="format"),
+    transaction_type: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Export the full statement, newest first.
+    
+    **Query Parameters**:
+    - format: `ndjson` (default) or `csv`
+    - transaction_type: Filter by type (transfer, billpay)
+    - from_date / to_date: Only transactions created in [from_date, to_date)
+    
+    Rows are streamed as they are read from the database in keyset chunks,
+    so memory use does not grow with the size of the history.
+    
+    **Security**: Requires valid JWT. Only exports transactions for authenticated user.
+    """
+    media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    if export_format not in media_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format. Must be one of: {', '.join(media_types)}"
+        )
+
+    return StreamingResponse(
+        _statement_lines(user_id, export_format, transaction_type, from_date, to_date),
+        media_type=media_types[export_format],
+        headers={"Content-Disposition": f'attachment; filename="statement.{export_format}"'}
     )
@@ -3,14 +3,44 @@ Voice intent processing API endpoint.
 Converts voice text into structured intents and action recommendations.
 """
 
-from fastapi import APIRouter, Depends
-from auth import get_current_user_id
-from intent_parser import parser
-from models import VoiceIntentRequest, VoiceIntentResponse
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Any, Dict, Tuple
+from auth import get_current_user_id, get_websocket_user_id
+from config import settings
+from intent_parser import parser, parse_batch_async, IntentStream
+from models import (
+    VoiceIntentRequest, VoiceIntentResponse, VoiceIntentStreamUpdate,
+    VoiceIntentBatchRequest, VoiceIntentBatchResponse, ErrorResponse
+)
+import json
 
 
 router = APIRouter(prefix="/voice", tags=["Voice"])
 
+parser.configure_cache(settings.intent_cache_size)
+
+
+def _intent_response(result: Dict[str, Any]) -> VoiceIntentResponse:
+    """Build the API response from a parser result."""
+    return VoiceIntentResponse(
+        intent=result["intent"],
+        confidence=result["confidence"],
+        entities=result["entities"],
+        action_required=result.get("action_required"),
+        message=result.get("message")
+    )
+
+
+def _stream_message(frame: str) -> Tuple[str, bool]:
+    """(transcript, final) from a stream frame: JSON {"text", "final"} or plain text (a partial)."""
+    try:
+        data = json.loads(frame)
+    except ValueError:
+        return frame, False
+    if not isinstance(data, dict):
+        return frame, False
+    return str(data.get("text") or ""), bool(data.get("final", False))
+
 
 @router.post(
     "/intent",
@@ -45,10 +75,69 @@ async def parse_voice_intent(
     # Parse the text
     result = parser.parse(request.text)
     
-    return VoiceIntentResponse(
-        intent=result["intent"],
-        confidence=result["confidence"],
-        entities=result["entities"],
-        action_required=result.get("action_required"),
-        message=result.get("message")
+    return _intent_response(result)
+
+
+@router.post(
+    "/intent/batch",
+    response_model=VoiceIntentBatchResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Batch too large"}
+    },
+    summary="Parse Voice Intents in Bulk",
+    description="Parse many transcribed texts in one call (e.g. call-center analytics); results are returned in request order."
+)
+async def parse_voice_intent_batch(
+    request: VoiceIntentBatchRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Parse a list of transcripts.
+    
+    Batches larger than `INTENT_BATCH_CHUNK_SIZE` are split into chunks parsed
+    in parallel by a process pool (`INTENT_BATCH_WORKERS`); each result is the
+    same as `/voice/intent` would return for that text.
+    """
+    if len(request.texts) > settings.intent_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.intent_batch_max_items} texts")
+    
+    results = await parse_batch_async(
+        request.texts,
+        chunk_size=settings.intent_batch_chunk_size,
+        workers=settings.intent_batch_workers
     )
+    
+    return VoiceIntentBatchResponse(results=[_intent_response(result) for result in results])
+
+
+@router.websocket("/intent/stream")
+async def stream_voice_intent(websocket: WebSocket):
+    """
+    Parse a transcript while the user is still speaking.
+    
+    **Client → server**, on every ASR update: `{"text": "<transcript so far>", "final": false}`
+    (a plain-text frame is treated as a partial transcript). Send `"final": true`
+    with the finished transcript; the socket can then carry the next utterance.
+    
+    **Server → client**: a `VoiceIntentStreamUpdate` (the `/voice/intent` result
+    plus `final` and `revision`) whenever the intent or entities change, and
+    always for the final transcript. The trailing, still-changing word of a
+    partial transcript is ignored, so e.g. a balance intent can be acted on
+    (pre-fetched) as soon as "balance" is followed by another word.
+    
+    **Security**: JWT in the `Authorization` header or `?token=` query parameter.
+    """
+    user_id = await get_websocket_user_id(websocket)
+    if user_id is None:
+        return
+    
+    await websocket.accept()
+    stream = IntentStream(parser)
+    try:
+        while True:
+            text, final = _stream_message(await websocket.receive_text())
+            update = stream.update(text, final)
+            if update is not None:
+                await websocket.send_json(VoiceIntentStreamUpdate(**update).model_dump())
+    except WebSocketDisconnect:
+        return
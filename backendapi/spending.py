@@ -0,0 +1,31 @@
+"""
+Spending aggregate maintenance.
+The aggregates are kept current by a trigger on transactions; this script
+builds them for history that predates SPENDING_SCHEMA.sql or repairs them.
+
+Usage:
+    python spending.py backfill [user_id]    # rebuild everyone (or one user)
+"""
+
+from database import db
+from typing import Optional, Dict, Any
+import sys
+
+
+def backfill(user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Recompute spending aggregates from the transactions table."""
+    result = db.client.rpc("rebuild_spending_aggregates", {"p_user_id": user_id}).execute()
+    return result.data
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "backfill":
+        user_id = sys.argv[2] if len(sys.argv) > 2 else None
+        summary = backfill(user_id)
+        print(f"✅ Rebuilt {summary['rows']} spending aggregate row(s) for {user_id or 'all users'}")
+
+    else:
+        print(__doc__)
+        sys.exit(2)
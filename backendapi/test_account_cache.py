@@ -0,0 +1,85 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from config import settings
+from database import AsyncDatabase
+
+
+class TestAccountCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.rows = [{"id": "user", "balance": 100.0}]
+        self.reads = 0
+        self.delay = 0.0
+
+        async def get_user_by_id(user_id):
+            self.reads += 1
+            await asyncio.sleep(self.delay)
+            return dict(self.rows[-1]) if self.rows[-1] else None
+
+        self.db.get_user_by_id = get_user_by_id
+        for patcher in (
+            patch.object(settings, "account_cache_fresh_ttl", 0.0),
+            patch.object(settings, "account_cache_refresh_timeout", 0.01),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_read_refreshes_by_default(self):
+        async def run():
+            first = await self.db.get_account("user")
+            # Credited by another worker: this process saw no write
+            self.rows.append({"id": "user", "balance": 150.0})
+            return first, await self.db.get_account("user")
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first, ({"id": "user", "balance": 100.0}, False))
+        self.assertEqual(second, ({"id": "user", "balance": 150.0}, False))
+        self.assertEqual(self.reads, 2)
+
+    def test_stale_served_on_refresh_timeout(self):
+        async def run():
+            await self.db.get_account("user")
+            self.rows.append({"id": "user", "balance": 150.0})
+            self.delay = 0.05
+            served = await self.db.get_account("user")
+            # The refresh keeps running and updates the cache
+            await asyncio.sleep(0.1)
+            return served, self.db.account_cache.get("user")["user"]
+
+        served, cached = asyncio.run(run())
+
+        self.assertEqual(served, ({"id": "user", "balance": 100.0}, True))
+        self.assertEqual(cached["balance"], 150.0)
+        self.assertEqual(self.db.stale_served, 1)
+
+    def test_stale_served_when_refresh_fails(self):
+        async def run():
+            await self.db.get_account("user")
+            self.rows.append(None)
+            return await self.db.get_account("user")
+
+        self.assertEqual(asyncio.run(run()), ({"id": "user", "balance": 100.0}, True))
+
+    def test_opt_in_fresh_window_skips_reads(self):
+        async def run():
+            await self.db.get_account("user")
+            return await self.db.get_account("user")
+
+        with patch.object(settings, "account_cache_fresh_ttl", 60.0):
+            user, stale = asyncio.run(run())
+
+        self.assertFalse(stale)
+        self.assertEqual(self.reads, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from account_scheduler import AccountScheduler
+
+
+class TestAccountScheduler(unittest.TestCase):
+
+    def test_same_account_never_interleaves(self):
+        scheduler = AccountScheduler()
+        balance = {"a": 0}
+
+        async def deposit():
+            async with scheduler.serialize("a"):
+                current = balance["a"]
+                await asyncio.sleep(0)
+                balance["a"] = current + 1
+
+        async def run():
+            await asyncio.gather(*[deposit() for _ in range(20)])
+
+        asyncio.run(run())
+        self.assertEqual(balance["a"], 20)
+        self.assertEqual(scheduler.stats()["active_accounts"], 0)
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        scheduler = AccountScheduler()
+
+        async def transfer(source, target):
+            async with scheduler.serialize(source, target):
+                await asyncio.sleep(0)
+
+        async def run():
+            await asyncio.wait_for(
+                asyncio.gather(*[transfer("a", "b") if i % 2 else transfer("b", "a") for i in range(10)]),
+                timeout=1
+            )
+
+        asyncio.run(run())
+        self.assertEqual(scheduler.stats()["operations"], 10)
+
+    def test_different_accounts_run_in_parallel(self):
+        scheduler = AccountScheduler()
+        inside = []
+
+        async def work(account_id):
+            async with scheduler.serialize(account_id):
+                inside.append(account_id)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(work("a"), work("b"))
+
+        asyncio.run(run())
+        self.assertEqual(scheduler.stats()["contended"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import time
+from unittest.mock import MagicMock, patch
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+import jwt
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+import auth
+
+SECRET = "test-jwt-secret-with-enough-bytes-for-hs256"
+CLAIMS = {"sub": "user", "email": "user@example.com", "aud": "authenticated"}
+
+
+def token(key, algorithm, **headers):
+    return jwt.encode({**CLAIMS, "exp": int(time.time()) + 60}, key, algorithm=algorithm, headers=headers or None)
+
+
+class TestVerifyJwtLocally(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(auth.settings, "supabase_jwt_secret", SECRET)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        patcher = patch.object(auth, "jwks_client", MagicMock())
+        self.jwks = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jwks.get_signing_key_from_jwt.return_value = jwt.PyJWK(jwt.algorithms.RSAAlgorithm.to_jwk(self.rsa_key.public_key(), as_dict=True))
+
+    def test_shared_secret_token(self):
+        self.assertEqual(auth.verify_jwt_locally(token(SECRET, "HS256"))["sub"], "user")
+        self.jwks.get_signing_key_from_jwt.assert_not_called()
+
+    def test_jwks_token(self):
+        self.assertEqual(auth.verify_jwt_locally(token(self.rsa_key, "RS256"))["sub"], "user")
+
+    def test_none_and_unlisted_algorithms_rejected_before_decoding(self):
+        unsigned = jwt.encode({**CLAIMS, "exp": int(time.time()) + 60}, None, algorithm="none")
+        for bad in (unsigned, token(SECRET, "HS384"), token(self.rsa_key, "PS256")):
+            with patch.object(auth.jwt, "decode") as decode, self.assertRaises(jwt.InvalidAlgorithmError):
+                auth.verify_jwt_locally(bad)
+            decode.assert_not_called()
+        self.jwks.get_signing_key_from_jwt.assert_not_called()
+
+    def test_header_algorithm_must_match_the_key(self):
+        # An ES256 token whose kid resolves to the project's RSA key
+        with patch.object(auth.jwt, "decode") as decode, self.assertRaises(jwt.InvalidAlgorithmError):
+            auth.verify_jwt_locally(token(ec.generate_private_key(ec.SECP256R1()), "ES256"))
+        decode.assert_not_called()
+        # An HS256 token not signed with the shared secret
+        with self.assertRaises(jwt.InvalidSignatureError):
+            auth.verify_jwt_locally(token("not-the-secret-but-long-enough-for-hs256", "HS256"))
+
+    def test_shared_secret_unset_falls_back_to_remote(self):
+        with patch.object(auth.settings, "supabase_jwt_secret", None):
+            self.assertIsNone(auth.verify_jwt_locally(token(SECRET, "HS256")))
+
+
+if __name__ == "__main__":
+    unittest.main()
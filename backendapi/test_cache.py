@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_set_and_counters(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch("cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1, ttl=5)
+        with patch("cache.time.monotonic", return_value=106.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_non_positive_ttl_is_not_stored(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1, ttl=0)
+        self.assertNotIn("a", cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
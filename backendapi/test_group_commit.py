@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from group_commit import GroupCommitWriter
+
+
+class TestGroupCommitWriter(unittest.TestCase):
+
+    def test_postings_queued_behind_a_group_share_the_next_one(self):
+        groups = []
+
+        async def flush(items):
+            groups.append(list(items))
+            await asyncio.sleep(0.01)
+            return [item * 10 for item in items]
+
+        writer = GroupCommitWriter(flush)
+
+        async def run():
+            return await asyncio.gather(*[writer.submit(i) for i in range(6)])
+
+        # Each caller gets the result for its own posting
+        self.assertEqual(asyncio.run(run()), [0, 10, 20, 30, 40, 50])
+        self.assertEqual(groups, [[0, 1, 2, 3, 4, 5]])
+        self.assertEqual(writer.stats()["groups"], 1)
+        self.assertEqual(writer.stats()["largest_group"], 6)
+
+    def test_groups_capped_at_max_batch(self):
+        groups = []
+
+        async def flush(items):
+            groups.append(list(items))
+            return list(items)
+
+        writer = GroupCommitWriter(flush, max_batch=2)
+
+        async def run():
+            return await asyncio.gather(*[writer.submit(i) for i in range(5)])
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2, 3, 4])
+        self.assertEqual(groups, [[0, 1], [2, 3], [4]])
+        self.assertEqual(writer.stats()["avg_group"], 1.67)
+
+    def test_failed_group_fails_only_its_own_callers(self):
+        groups = []
+
+        async def flush(items):
+            groups.append(list(items))
+            await asyncio.sleep(0.01)
+            if 0 in items:
+                raise RuntimeError("connection reset")
+            return list(items)
+
+        writer = GroupCommitWriter(flush, max_batch=2)
+
+        async def run():
+            return await asyncio.gather(*[writer.submit(i) for i in range(3)], return_exceptions=True)
+
+        first, second, third = asyncio.run(run())
+        self.assertIsInstance(first, RuntimeError)
+        self.assertIsInstance(second, RuntimeError)
+        self.assertEqual(third, 2)
+        # Not retried: the failed group may have committed
+        self.assertEqual(groups, [[0, 1], [2]])
+        self.assertEqual(writer.stats()["failed_groups"], 1)
+
+    def test_result_count_mismatch_fails_the_group(self):
+        async def flush(items):
+            return []
+
+        writer = GroupCommitWriter(flush)
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(writer.submit("posting"))
+
+    def test_close_waits_for_queued_postings(self):
+        committed = []
+
+        async def flush(items):
+            await asyncio.sleep(0.01)
+            committed.extend(items)
+            return list(items)
+
+        writer = GroupCommitWriter(flush)
+
+        async def run():
+            pending = [asyncio.ensure_future(writer.submit(i)) for i in range(3)]
+            await asyncio.sleep(0)
+            await writer.close()
+            self.assertEqual(committed, [0, 1, 2])
+            return await asyncio.gather(*pending)
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2])
+        self.assertEqual(writer.stats()["queued"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import io
+import runpy
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+import ledger
+
+CLEAN_REPORT = {
+    "ok": True, "from_posting_id": 40, "to_posting_id": 52, "accounts_checked": 3,
+    "unbalanced_transactions": [], "balance_mismatches": []
+}
+DIRTY_REPORT = {
+    "ok": False, "from_posting_id": 40, "to_posting_id": 52, "accounts_checked": 3,
+    "unbalanced_transactions": ["tx-1"],
+    "balance_mismatches": [{"user_id": "user", "balance": 100.0, "ledger": 90.0}]
+}
+
+
+class LedgerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.rpc = self.db.client.rpc
+        patcher = patch("database.db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(ledger, "db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def returns(self, data):
+        self.rpc.return_value.execute.return_value = MagicMock(data=data)
+
+    def run_cli(self, *args):
+        out = io.StringIO()
+        code = 0
+        with patch.object(sys, "argv", ["ledger.py", *args]), redirect_stdout(out):
+            try:
+                runpy.run_path(ledger.__file__, run_name="__main__")
+            except SystemExit as stop:
+                code = stop.code
+        return code, out.getvalue()
+
+
+class TestLedgerCalls(LedgerTestCase):
+
+    def test_take_snapshots_passes_lag(self):
+        self.returns({"snapshots": 2, "as_of_posting_id": 52})
+
+        self.assertEqual(ledger.take_snapshots(), {"snapshots": 2, "as_of_posting_id": 52})
+        self.rpc.assert_called_with("take_ledger_snapshots", {"p_lag": "60 seconds"})
+
+        ledger.take_snapshots(lag_seconds=5)
+        self.rpc.assert_called_with("take_ledger_snapshots", {"p_lag": "5 seconds"})
+
+    def test_verify_incremental_unless_full(self):
+        self.returns(CLEAN_REPORT)
+
+        self.assertEqual(ledger.verify(), CLEAN_REPORT)
+        self.rpc.assert_called_with("verify_ledger", {"p_full": False})
+
+        ledger.verify(full=True)
+        self.rpc.assert_called_with("verify_ledger", {"p_full": True})
+
+    def test_balance_current_and_as_of(self):
+        self.returns("125.50")
+        self.assertEqual(ledger.balance("user"), 125.5)
+        self.rpc.assert_called_with("ledger_balance", {"p_account_id": "user"})
+
+        ledger.balance("user", "2026-01-27T18:30:00+00:00")
+        self.rpc.assert_called_with("ledger_balance", {"p_account_id": "user", "p_as_of": "2026-01-27T18:30:00+00:00"})
+
+        # An account with no postings has no balance row
+        self.returns(None)
+        self.assertEqual(ledger.balance("EXTERNAL:BILLPAY"), 0.0)
+
+    def test_adjust_posts_through_procedure(self):
+        self.returns({"success": True, "transaction_id": "tx-1", "new_balance": 75.0})
+
+        self.assertTrue(ledger.adjust("user", -25.0, "duplicate credit")["success"])
+        self.rpc.assert_called_with("post_adjustment", {"p_user_id": "user", "p_amount": -25.0, "p_note": "duplicate credit"})
+
+
+class TestLedgerCli(LedgerTestCase):
+
+    def test_verify_clean(self):
+        self.returns(CLEAN_REPORT)
+
+        code, out = self.run_cli("verify")
+
+        self.assertEqual(code, 0)
+        self.assertIn("postings #40..#52", out)
+        self.assertIn("Checkpoint recorded", out)
+
+    def test_verify_mismatch_exits_nonzero(self):
+        self.returns(DIRTY_REPORT)
+
+        code, out = self.run_cli("verify", "--full")
+
+        self.assertEqual(code, 1)
+        self.rpc.assert_called_with("verify_ledger", {"p_full": True})
+        self.assertIn("Unbalanced transaction: tx-1", out)
+        self.assertIn("user: users.balance=100.0 ledger=90.0", out)
+
+    def test_snapshot(self):
+        self.returns({"snapshots": 2, "as_of_posting_id": 52})
+
+        code, out = self.run_cli("snapshot")
+
+        self.assertEqual(code, 0)
+        self.assertIn("Took 2 snapshot(s) up to posting #52", out)
+
+    def test_adjust(self):
+        self.returns({"success": True, "transaction_id": "tx-1", "new_balance": 125.0})
+        code, out = self.run_cli("adjust", "user", "25")
+        self.assertEqual(code, 0)
+        self.rpc.assert_called_with("post_adjustment", {"p_user_id": "user", "p_amount": 25.0, "p_note": None})
+        self.assertIn("Posted adjustment tx-1", out)
+
+        self.returns({"success": False, "error": "Insufficient funds", "current_balance": 10.0})
+        code, out = self.run_cli("adjust", "user", "-25", "refund reversal")
+        self.assertEqual(code, 1)
+        self.assertIn("Insufficient funds", out)
+
+    def test_unknown_command_prints_usage(self):
+        code, out = self.run_cli("balance")
+
+        self.assertEqual(code, 2)
+        self.assertIn("Usage:", out)
+        self.rpc.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,10 +8,10 @@ import os
 sys.path.append(os.getcwd())
 
 # Mock the database before importing the app
-from database import Database
-mock_db = MagicMock(spec=Database)
+from database import AsyncDatabase
+mock_db = MagicMock(spec=AsyncDatabase)
 
-with patch('database.db', mock_db):
+with patch('database.async_db', mock_db):
     from main import app
     from models import TransactionResponse, BillPaymentResponse
 
@@ -21,7 +21,7 @@ class TestBackendEnhancements(unittest.TestCase):
 
     def test_get_balance_success(self):
         # Setup mock
-        mock_db.get_user_by_id.return_value = {"balance": 5000.0, "id": "test-uuid"}
+        mock_db.get_account.return_value = ({"balance": 5000.0, "id": "test-uuid"}, False)
         
         # Call API (bypass auth handles user_id)
         response = client.get("/account/balance")
@@ -31,10 +31,69 @@ class TestBackendEnhancements(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["balance"], 5000.0)
         self.assertEqual(data["user_id"], "14005a20-a9f4-4747-b92e-69089d287901")
+        self.assertFalse(data["stale"])
+
+    def test_get_balance_not_modified(self):
+        # Setup mock
+        mock_db.get_account.return_value = ({"balance": 5000.0, "id": "test-uuid"}, False)
+        
+        # Call API, then revalidate with the returned ETag
+        etag = client.get("/account/balance").headers["etag"]
+        response = client.get("/account/balance", headers={"If-None-Match": etag})
+        
+        # Verify: unchanged balance costs a bodyless 304
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        
+        # A changed balance gets a new body
+        mock_db.get_account.return_value = ({"balance": 4900.0, "id": "test-uuid"}, False)
+        response = client.get("/account/balance", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], etag)
+
+    def test_dashboard(self):
+        # Setup mocks: account row and one page of recent transactions
+        mock_db.get_account.return_value = ({"id": "test-uuid", "name": "Sita", "phone": "9876543210", "balance": 4800.0, "login_pin": "hash"}, False)
+        mock_db.get_transaction_page.return_value = (
+            [{"id": "tx-1", "type": "transfer", "amount": 200.0, "status": "success", "created_at": "2026-01-27T18:30:00+00:00", "sender_id": "test-uuid", "receiver_id": "r"}],
+            ("2026-01-27T18:30:00+00:00", "tx-1")
+        )
+        
+        # Call API
+        response = client.get("/account/dashboard?recent=1")
+        
+        # Verify
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["name"], "Sita")
+        self.assertEqual(data["balance"], 4800.0)
+        self.assertEqual(len(data["recent_transactions"]), 1)
+        self.assertTrue(data["has_more_transactions"])
+        self.assertNotIn("login_pin", data)
+        mock_db.get_transaction_page.assert_called_with("14005a20-a9f4-4747-b92e-69089d287901", limit=1)
+
+    def test_spending_summary(self):
+        # Setup mock aggregate rows for the month
+        mock_db.get_spending_summary.return_value = [
+            {"direction": "out", "type": "billpay", "bill_type": "electricity", "total": 1200.0, "count": 2},
+            {"direction": "out", "type": "transfer", "bill_type": "", "total": 500.0, "count": 1},
+            {"direction": "in", "type": "transfer", "bill_type": "", "total": 300.0, "count": 1}
+        ]
+        
+        # Call API
+        response = client.get("/account/summary?period=month&on=2026-01-15")
+        
+        # Verify
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["period_start"], "2026-01-01")
+        self.assertEqual(data["total_spent"], 1700.0)
+        self.assertEqual(data["total_received"], 300.0)
+        mock_db.get_spending_summary.assert_called_with("14005a20-a9f4-4747-b92e-69089d287901", "month", "2026-01-01")
 
     def test_transfer_confirmation_required(self):
         # Setup mock for receiver lookup
-        mock_db.get_user_by_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
+        mock_db.resolve_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
         
         # Call API without PIN
         data = {
@@ -50,6 +109,93 @@ class TestBackendEnhancements(unittest.TestCase):
         self.assertIn("100.0", res_data["message"])
         self.assertIn("Ramesh", res_data["message"])
 
+    def test_transfer_idempotency_key_replays(self):
+        # Setup mocks for a PIN transfer
+        mock_db.resolve_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
+        mock_db.execute_transfer.reset_mock()
+        mock_db.execute_transfer.return_value = {"success": True, "transaction_id": "tx-1", "new_balance": 4900.0}
+        
+        # Call API twice with the same key (a client retry)
+        data = {"receiver_phone": "9999999999", "amount": 100.0, "transfer_pin": "1234"}
+        headers = {"Idempotency-Key": "retry-test-1"}
+        first = client.post("/transaction/transfer", json=data, headers=headers)
+        second = client.post("/transaction/transfer", json=data, headers=headers)
+        
+        # Verify: posted once, same response both times
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(mock_db.execute_transfer.call_count, 1)
+        
+        # Same key, different request
+        data["amount"] = 200.0
+        response = client.post("/transaction/transfer", json=data, headers=headers)
+        self.assertEqual(response.status_code, 422)
+
+    def test_transfer_idempotency_key_not_held_by_confirmation_prompt(self):
+        # Setup mocks
+        mock_db.resolve_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
+        mock_db.execute_transfer.reset_mock()
+        mock_db.execute_transfer.return_value = {"success": True, "transaction_id": "tx-2", "new_balance": 4900.0}
+
+        # Same key: first without PIN (prompt), then with PIN
+        data = {"receiver_phone": "9999999999", "amount": 100.0}
+        headers = {"Idempotency-Key": "retry-test-2"}
+        prompt = client.post("/transaction/transfer", json=data, headers=headers)
+        posted = client.post("/transaction/transfer", json={**data, "transfer_pin": "1234"}, headers=headers)
+        replay = client.post("/transaction/transfer", json={**data, "transfer_pin": "1234"}, headers=headers)
+
+        # Verify: the prompt was not replayed and the transfer posted exactly once
+        self.assertEqual(prompt.json()["status"], "confirmation_required")
+        self.assertEqual(posted.json()["status"], "success")
+        self.assertEqual(replay.json(), posted.json())
+        self.assertEqual(mock_db.execute_transfer.call_count, 1)
+
+    def test_transfer_idempotency_database_backend_releases_prompt_key(self):
+        # Setup mocks: database-backed store, key free in the table
+        from idempotency import IdempotencyStore
+        store = IdempotencyStore(persistent=True)
+        mock_db.resolve_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
+        mock_db.claim_idempotency_key.return_value = None
+        mock_db.release_idempotency_key.reset_mock()
+        mock_db.complete_idempotency_key.reset_mock()
+        mock_db.execute_transfer.reset_mock()
+        mock_db.execute_transfer.return_value = {"success": True, "transaction_id": "tx-3", "new_balance": 4900.0}
+
+        data = {"receiver_phone": "9999999999", "amount": 100.0}
+        headers = {"Idempotency-Key": "retry-test-3"}
+        with patch("routers.transaction.idempotency", store):
+            client.post("/transaction/transfer", json=data, headers=headers)
+            posted = client.post("/transaction/transfer", json={**data, "transfer_pin": "1234"}, headers=headers)
+
+        # Verify: the prompt released its claim, only the posting was stored
+        self.assertEqual(posted.json()["status"], "success")
+        self.assertEqual(mock_db.release_idempotency_key.call_count, 1)
+        self.assertEqual(mock_db.complete_idempotency_key.call_count, 1)
+        self.assertEqual(mock_db.execute_transfer.call_count, 1)
+
+    def test_transfer_confirm_unknown_token(self):
+        # Call API with a token that was never issued
+        data = {"confirmation_token": "not-a-token", "transfer_pin": "1234"}
+        response = client.post("/transaction/transfer/confirm", json=data)
+        
+        # Verify
+        self.assertEqual(response.status_code, 404)
+
+    def test_transfer_confirm_token_burned_after_wrong_pins(self):
+        # Setup mocks: every PIN is wrong
+        mock_db.resolve_phone.return_value = {"id": "receiver-uuid", "name": "Ramesh"}
+        mock_db.execute_transfer.reset_mock()
+        mock_db.execute_transfer.return_value = {"success": False, "error": "Invalid transfer PIN"}
+        token = client.post("/transaction/transfer", json={"receiver_phone": "9999999999", "amount": 100.0}).json()["confirmation_token"]
+
+        # Call API with wrong PINs until the token is burned
+        data = {"confirmation_token": token, "transfer_pin": "0000"}
+        statuses = [client.post("/transaction/transfer/confirm", json=data).status_code for _ in range(4)]
+
+        # Verify: PENDING_ACTION_MAX_ATTEMPTS (3) tries, then the token is gone
+        self.assertEqual(statuses, [401, 401, 401, 404])
+        self.assertEqual(mock_db.execute_transfer.call_count, 3)
+
     def test_billpay_confirmation_required(self):
         # Call API without PIN
         data = {
@@ -65,6 +211,51 @@ class TestBackendEnhancements(unittest.TestCase):
         self.assertEqual(res_data["status"], "confirmation_required")
         self.assertIn("500.0", res_data["message"])
         self.assertIn("electricity", res_data["message"])
+        self.assertTrue(res_data["confirmation_token"])
+
+    def test_statement_csv_export(self):
+        # Setup mock: two rows streamed from the database
+        async def fake_rows(**kwargs):
+            yield {"id": "tx-2", "created_at": "2026-01-02T10:00:00+00:00", "type": "transfer", "amount": 50.0, "status": "success", "sender_id": "a", "receiver_id": "b", "note": None}
+            yield {"id": "tx-1", "created_at": "2026-01-01T10:00:00+00:00", "type": "billpay", "amount": 20.0, "status": "success", "sender_id": "a", "receiver_id": None, "note": "Bill"}
+        mock_db.iter_transactions.side_effect = fake_rows
+
+        # Call API
+        response = client.get("/transaction/statement?format=csv")
+
+        # Verify
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/csv"))
+        lines = response.text.strip().splitlines()
+        self.assertEqual(lines[0], "id,created_at,type,amount,status,sender_id,receiver_id,note")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("tx-2,"))
+
+    def test_voice_intent_batch(self):
+        # Call API with a small batch (parsed in-process)
+        data = {"texts": ["balance batao", "Ramesh ko 500 bhejo", "haan"]}
+        response = client.post("/voice/intent/batch", json=data)
+        
+        # Verify: one result per text, in order
+        self.assertEqual(response.status_code, 200)
+        intents = [result["intent"] for result in response.json()["results"]]
+        self.assertEqual(intents, ["balance", "transfer", "confirm"])
+        self.assertEqual(response.json()["results"][1]["entities"]["amount"], 500.0)
+
+    def test_voice_intent_stream(self):
+        with client.websocket_connect("/voice/intent/stream") as websocket:
+            # Partial transcripts: an update once "balance" is committed
+            websocket.send_json({"text": "bal"})
+            websocket.send_json({"text": "balance bata"})
+            update = websocket.receive_json()
+            self.assertEqual(update["intent"], "balance")
+            self.assertFalse(update["final"])
+            
+            # Final transcript
+            websocket.send_json({"text": "balance batao", "final": True})
+            update = websocket.receive_json()
+            self.assertEqual(update["intent"], "balance")
+            self.assertTrue(update["final"])
 
     def test_pin_setup_login(self):
         # Setup mock
@@ -0,0 +1,41 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from pending_actions import PendingActionStore
+
+
+class TestPendingActionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = PendingActionStore(maxsize=10, ttl=60.0, max_attempts=2)
+        self.token = self.store.create("user", "transfer", amount=100.0)
+
+    def test_take_is_single_use(self):
+        action = self.store.take(self.token, "user", "transfer")
+        self.assertEqual(action["amount"], 100.0)
+        self.assertIsNone(self.store.take(self.token, "user", "transfer"))
+
+    def test_other_user_or_kind_cannot_take(self):
+        self.assertIsNone(self.store.take(self.token, "someone-else", "transfer"))
+        self.assertIsNone(self.store.take(self.token, "user", "billpay"))
+        # Still there for its owner
+        self.assertIsNotNone(self.store.take(self.token, "user", "transfer"))
+
+    def test_wrong_pins_burn_token(self):
+        action = self.store.take(self.token, "user", "transfer")
+        self.assertTrue(self.store.fail(self.token, action))
+
+        action = self.store.take(self.token, "user", "transfer")
+        self.assertEqual(action["failed_attempts"], 1)
+        self.assertFalse(self.store.fail(self.token, action))
+
+        self.assertIsNone(self.store.take(self.token, "user", "transfer"))
+        self.assertEqual(self.store.burned, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import unittest
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.exc import DBAPIError
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+import pg_database
+from pg_database import PostgresDatabase, _async_url, _to_row
+
+SENDER = "00000000-0000-4000-8000-000000000001"
+RECEIVER = "00000000-0000-4000-8000-000000000002"
+
+
+class FakeConnection:
+    """Records executed statements and answers them from a queue of results."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.executed = []
+
+    async def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        result = self.results.pop(0) if self.results else MagicMock()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        self.executed.append(("SAVEPOINT", None))
+        try:
+            yield self
+        except Exception:
+            self.executed.append(("ROLLBACK TO SAVEPOINT", None))
+            raise
+
+
+class FakeEngine:
+    def __init__(self, conn):
+        self.conn = conn
+        self.dispose = AsyncMock()
+
+    @asynccontextmanager
+    async def begin(self):
+        yield self.conn
+
+    connect = begin
+
+
+def locked(*rows):
+    result = MagicMock()
+    result.all.return_value = [SimpleNamespace(id=uuid.UUID(user_id), balance=Decimal(balance), phone=phone) for user_id, balance, phone in rows]
+    return result
+
+
+def scalar(value):
+    result = MagicMock()
+    result.scalar.return_value = value
+    return result
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_async_url(self):
+        url, connect_args = _async_url("postgresql://u:p@db.example.com:5432/bank?sslmode=require")
+
+        self.assertEqual(url.drivername, "postgresql+asyncpg")
+        self.assertNotIn("sslmode", url.query)
+        self.assertIn("prepared_statement_cache_size", url.query)
+        self.assertEqual(connect_args["ssl"], "require")
+
+    def test_to_row_matches_postgrest_json(self):
+        row = _to_row({
+            "id": uuid.UUID(SENDER),
+            "balance": Decimal("12.50"),
+            "created_at": datetime(2026, 1, 27, 18, 30, tzinfo=timezone.utc),
+            "name": "Sita",
+        })
+
+        self.assertEqual(row, {"id": SENDER, "balance": 12.5, "created_at": "2026-01-27T18:30:00+00:00", "name": "Sita"})
+
+
+class TestPostgresDatabase(unittest.TestCase):
+
+    def build(self, *results):
+        self.conn = FakeConnection(results)
+        self.engine = FakeEngine(self.conn)
+        with patch("pg_database.create_async_engine", return_value=self.engine):
+            return PostgresDatabase()
+
+    def statements(self):
+        return [statement for statement, _ in self.conn.executed]
+
+    def test_post_locks_debits_credits_and_journals_in_one_transaction(self):
+        db = self.build(
+            locked((SENDER, "500.00", "9000000001"), (RECEIVER, "10.00", "9000000002")),
+            scalar(Decimal("400.00"))
+        )
+
+        result = asyncio.run(db._post(SENDER, RECEIVER, 100.0, "transfer", "rent", "9000000002"))
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["new_balance"], 400.0)
+        self.assertEqual(self.statements(), [
+            pg_database.LOCK_USERS, pg_database.DEBIT_USER, pg_database.CREDIT_USER,
+            pg_database.INSERT_TRANSACTION, pg_database.INSERT_POSTINGS
+        ])
+        self.assertEqual(self.conn.executed[0][1], {"ids": [SENDER, RECEIVER]})
+        self.assertEqual(self.conn.executed[1][1]["amount"], Decimal("100.00"))
+        self.assertEqual(self.conn.executed[4][1]["credit_account"], RECEIVER)
+
+    def test_post_bill_payment_credits_external_account(self):
+        db = self.build(locked((SENDER, "500.00", None)), scalar(Decimal("250.00")))
+
+        asyncio.run(db._post(SENDER, None, 250.0, "billpay", None))
+
+        self.assertNotIn(pg_database.CREDIT_USER, self.statements())
+        self.assertEqual(self.conn.executed[-1][1]["credit_account"], "EXTERNAL:BILLPAY")
+
+    def test_post_refusals_write_nothing(self):
+        cases = [
+            ((SENDER, "50.00", None), (RECEIVER, "0.00", "9000000002"), "9000000002", "Insufficient funds"),
+            ((SENDER, "500.00", None), (RECEIVER, "0.00", "9000000003"), "9000000002", "Receiver phone changed"),
+        ]
+        for sender_row, receiver_row, phone, error in cases:
+            db = self.build(locked(sender_row, receiver_row))
+            result = asyncio.run(db._post(SENDER, RECEIVER, 100.0, "transfer", None, phone))
+            self.assertEqual(result["error"], error)
+            self.assertEqual(self.statements(), [pg_database.LOCK_USERS])
+
+        db = self.build(locked((SENDER, "500.00", None)))
+        self.assertEqual(asyncio.run(db._post(SENDER, RECEIVER, 100.0, "transfer", None))["error"], "Receiver not found")
+
+        db = self.build()
+        self.assertEqual(asyncio.run(db._post(SENDER, SENDER, 100.0, "transfer", None))["error"], "Cannot transfer money to yourself")
+        self.assertEqual(self.conn.executed, [])
+
+    def test_post_batch_debits_total_once(self):
+        other = "00000000-0000-4000-8000-000000000003"
+        db = self.build(
+            locked((SENDER, "1000.00", None), (RECEIVER, "0.00", None), (other, "0.00", None)),
+            scalar(Decimal("400.00"))
+        )
+        items = [
+            {"id": str(uuid.uuid4()), "receiver_id": RECEIVER, "amount": 200.0},
+            {"id": str(uuid.uuid4()), "receiver_id": other, "amount": 300.0},
+            {"id": str(uuid.uuid4()), "receiver_id": RECEIVER, "amount": 100.0},
+        ]
+
+        result = asyncio.run(db._post_batch(SENDER, items))
+
+        self.assertEqual(result, {"success": True, "total": 600.0, "new_balance": 400.0})
+        debit, credits = self.conn.executed[1][1], self.conn.executed[2][1]
+        self.assertEqual(debit["amount"], Decimal("600.00"))
+        self.assertEqual(credits, [{"id": RECEIVER, "amount": Decimal("300.00")}, {"id": other, "amount": Decimal("300.00")}])
+        self.assertEqual(len(self.conn.executed[3][1]), 3)
+
+    def test_post_group_isolates_postings_in_savepoints(self):
+        other = "00000000-0000-4000-8000-000000000003"
+        orig = Exception("deadlock detected")
+        orig.sqlstate = "40P01"
+        deadlock = DBAPIError("UPDATE users", {}, orig)
+        db = self.build(
+            locked((SENDER, "500.00", None), (RECEIVER, "0.00", None)),
+            deadlock,
+            locked((SENDER, "500.00", None), (other, "0.00", None)),
+            scalar(Decimal("300.00")),
+        )
+        postings = [
+            {"kind": "transaction", "sender_id": SENDER, "receiver_id": RECEIVER, "amount": 100.0, "type": "transfer", "note": None, "receiver_phone": None},
+            {"kind": "batch", "sender_id": SENDER, "items": [{"id": str(uuid.uuid4()), "receiver_id": other, "amount": 200.0}]},
+        ]
+
+        first, second = asyncio.run(db._post_group(postings))
+
+        self.assertEqual(first, {"success": False, "error": "deadlock detected", "sqlstate": "40P01"})
+        self.assertEqual(second, {"success": True, "total": 200.0, "new_balance": 300.0})
+        # The failed posting rolled back to its savepoint; the next one still ran
+        self.assertEqual(self.statements()[:4], ["SAVEPOINT", pg_database.LOCK_USERS, pg_database.DEBIT_USER, "ROLLBACK TO SAVEPOINT"])
+        self.assertEqual(self.statements()[4:6], ["SAVEPOINT", pg_database.LOCK_USERS])
+
+    def test_update_statement_only_for_known_columns(self):
+        db = self.build()
+
+        statement = db._update_statement(("balance", "name"))
+        self.assertIs(db._update_statement(("balance", "name")), statement)
+        with self.assertRaises(ValueError):
+            db._update_statement(("balance; DROP TABLE users",))
+
+    def test_keyset_page_parameters(self):
+        db = self.build(MagicMock())
+        position = ("2026-01-27T18:30:00.123456+00:00", RECEIVER)
+
+        asyncio.run(db._fetch_transactions_keyset("sender_id", SENDER, 10, "transfer", position))
+
+        statement, params = self.conn.executed[0]
+        self.assertIn("(created_at, id) < (:before_created_at, :before_id)", str(statement))
+        self.assertIn("type = :type", str(statement))
+        self.assertEqual(params["before_created_at"], datetime(2026, 1, 27, 18, 30, 0, 123456, tzinfo=timezone.utc))
+        self.assertEqual(params["before_id"], uuid.UUID(RECEIVER))
+        with self.assertRaises(ValueError):
+            db._keyset_statement("note", False, False, False, False)
+
+    def test_close_flushes_base_before_disposing_pool(self):
+        db = self.build()
+        order = []
+        self.engine.dispose.side_effect = lambda: order.append("dispose")
+
+        async def base_close(self):
+            order.append("base")
+
+        with patch("database.AsyncDatabase.close", base_close):
+            asyncio.run(db.close())
+
+        self.assertEqual(order, ["base", "dispose"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+import asyncio
+import hashlib
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from database import AsyncDatabase
+
+PIN_HASH = hashlib.sha256("1234".encode()).hexdigest()
+
+
+class TestPostTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.rpc = MagicMock()
+        self.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data={
+            "success": True, "transaction_id": "6f1c2e0a-0000-4000-8000-000000000001", "new_balance": "4900.00"
+        }))
+        self.db._client = MagicMock()
+        self.db._client.rpc = self.rpc
+
+    def test_one_procedure_call_per_posting(self):
+        result = asyncio.run(self.db.post_transaction("sender", "receiver", 100.0, "transfer", "rent"))
+
+        self.rpc.assert_called_once_with("post_transaction", {
+            "p_sender_id": "sender",
+            "p_receiver_id": "receiver",
+            "p_amount": 100.0,
+            "p_type": "transfer",
+            "p_note": "rent",
+            "p_receiver_phone": None
+        })
+        self.assertEqual(result, {"success": True, "transaction_id": "6f1c2e0a-0000-4000-8000-000000000001", "new_balance": 4900.0})
+
+    def test_bill_payment_has_no_receiver(self):
+        asyncio.run(self.db.post_transaction("sender", None, 250.0, "billpay", "electricity bill"))
+
+        params = self.rpc.call_args.args[1]
+        self.assertIsNone(params["p_receiver_id"])
+        self.assertEqual(params["p_type"], "billpay")
+
+    def test_procedure_errors_passed_through(self):
+        self.rpc.return_value.execute.return_value = MagicMock(data={"success": False, "error": "Insufficient funds", "current_balance": 50.0})
+
+        result = asyncio.run(self.db.post_transaction("sender", "receiver", 100.0))
+
+        self.assertEqual(result, {"success": False, "error": "Insufficient funds", "current_balance": 50.0})
+
+    def test_empty_and_failed_calls_reported(self):
+        self.rpc.return_value.execute.return_value = MagicMock(data=None)
+        self.assertEqual(asyncio.run(self.db.post_transaction("sender", "receiver", 100.0)), {"success": False, "error": "Posting failed"})
+
+        self.rpc.return_value.execute.side_effect = RuntimeError("connection reset")
+        self.assertEqual(asyncio.run(self.db.post_transaction("sender", "receiver", 100.0)), {"success": False, "error": "connection reset"})
+
+    def test_cached_accounts_dropped(self):
+        for user_id in ("sender", "receiver"):
+            self.db.account_cache.set(user_id, {"user": {"id": user_id, "balance": 5000.0}, "fetched_at": 0.0})
+
+        asyncio.run(self.db.post_transaction("sender", "receiver", 100.0))
+
+        self.assertIsNone(self.db.account_cache.get("sender"))
+        self.assertIsNone(self.db.account_cache.get("receiver"))
+
+
+class TestPostingGroupCommit(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.rpc = MagicMock()
+        self.db._client = MagicMock()
+        self.db._client.rpc = self.rpc
+
+    def returns(self, data):
+        self.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=data))
+
+    def test_concurrent_postings_share_one_procedure_call(self):
+        self.returns([
+            {"success": True, "transaction_id": "tx-1", "new_balance": "900.00"},
+            {"success": False, "error": "Insufficient funds", "current_balance": 50.0},
+            {"success": True, "total": "300.00", "new_balance": "600.00"},
+        ])
+        items = [{"id": "tx-2", "receiver_id": "r2", "receiver_phone": None, "amount": 300.0, "note": None}]
+
+        async def run():
+            return await asyncio.gather(
+                self.db.post_transaction("sender", "receiver", 100.0, "transfer", "rent"),
+                self.db.post_transaction("other", None, 250.0, "billpay", None),
+                self.db.postings.submit({"kind": "batch", "sender_id": "third", "items": items}),
+            )
+
+        transfer, billpay, batch = asyncio.run(run())
+
+        self.rpc.assert_called_once()
+        name, params = self.rpc.call_args.args
+        self.assertEqual(name, "post_group")
+        self.assertEqual([posting["kind"] for posting in params["p_postings"]], ["transaction", "transaction", "batch"])
+        self.assertEqual(params["p_postings"][0]["receiver_id"], "receiver")
+        self.assertEqual(params["p_postings"][2]["items"], items)
+        # Each caller gets its own posting's outcome
+        self.assertEqual(transfer, {"success": True, "transaction_id": "tx-1", "new_balance": 900.0})
+        self.assertEqual(billpay["error"], "Insufficient funds")
+        self.assertEqual(batch["total"], "300.00")
+
+    def test_lost_lock_race_posted_again_alone(self):
+        self.returns([
+            {"success": True, "transaction_id": "tx-1", "new_balance": "900.00"},
+            {"success": False, "error": "deadlock detected", "sqlstate": "40P01"},
+        ])
+        self.db._post = AsyncMock(return_value={"success": True, "transaction_id": "tx-2", "new_balance": "150.00"})
+
+        async def run():
+            return await asyncio.gather(
+                self.db.post_transaction("a", "b", 100.0),
+                self.db.post_transaction("c", "d", 50.0),
+            )
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first["transaction_id"], "tx-1")
+        self.assertEqual(second["transaction_id"], "tx-2")
+        self.db._post.assert_awaited_once_with("c", "d", 50.0, "transfer", None, None)
+
+    def test_group_failure_reported_to_each_caller(self):
+        self.rpc.return_value.execute = AsyncMock(side_effect=RuntimeError("connection reset"))
+
+        async def run():
+            return await asyncio.gather(
+                self.db.post_transaction("a", "b", 100.0),
+                self.db.post_transaction("c", "d", 50.0),
+            )
+
+        self.assertEqual(asyncio.run(run()), [{"success": False, "error": "connection reset"}] * 2)
+        # Not retried posting by posting: the group may have committed
+        self.rpc.assert_called_once()
+
+
+class TestExecuteTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.db.get_user_by_id = AsyncMock(return_value={"id": "sender", "balance": 5000.0, "transfer_pin": PIN_HASH})
+        self.db._post = AsyncMock(return_value={"success": True, "transaction_id": "tx-1", "new_balance": 4900.0})
+
+    def test_posts_after_pin_check(self):
+        result = asyncio.run(self.db.execute_transfer("sender", "receiver", 100.0, "rent", "1234"))
+
+        self.assertTrue(result["success"])
+        self.db._post.assert_awaited_once_with("sender", "receiver", 100.0, "transfer", "rent", None)
+
+    def test_wrong_pin_posts_nothing(self):
+        result = asyncio.run(self.db.execute_transfer("sender", "receiver", 100.0, transfer_pin="0000"))
+
+        self.assertEqual(result, {"success": False, "error": "Invalid transfer PIN"})
+        self.db._post.assert_not_awaited()
+
+    def test_limit_checked_before_database(self):
+        result = asyncio.run(self.db.execute_transfer("sender", "receiver", 2500.0, transfer_pin="1234"))
+
+        self.assertFalse(result["success"])
+        self.assertIn("exceeds limit", result["error"])
+        self.db.get_user_by_id.assert_not_awaited()
+        self.db._post.assert_not_awaited()
+
+
+class TestExecuteTransferBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.db.get_user_by_id = AsyncMock(return_value={"id": "sender", "balance": 5000.0, "transfer_pin": PIN_HASH})
+        self.db._post = AsyncMock(return_value={"success": True, "transaction_id": "tx-1", "new_balance": 4900.0})
+        self.db._post_batch = AsyncMock(return_value={"success": True, "total": 300.0, "new_balance": "4700.00"})
+        self.db._post_group = AsyncMock(side_effect=lambda postings: [
+            {"success": True, "total": 300.0, "new_balance": "4600.00"} if posting["kind"] == "batch"
+            else {"success": True, "transaction_id": "tx-1", "new_balance": 4900.0}
+            for posting in postings
+        ])
+
+    def test_batch_alone_posts_directly(self):
+        result = asyncio.run(self.db.execute_transfer_batch("sender", [{"receiver_id": "r1", "amount": 300.0}], "1234"))
+
+        self.assertEqual(result["new_balance"], 4700.0)
+        self.assertEqual(self.db._post_batch.call_args.args[0], "sender")
+        self.db._post_group.assert_not_awaited()
+
+    def test_batch_grouped_with_concurrent_transfer(self):
+        async def run():
+            return await asyncio.gather(
+                self.db.execute_transfer_batch("sender", [{"receiver_id": "r1", "amount": 300.0}], "1234"),
+                self.db.execute_transfer("payer", "payee", 100.0, transfer_pin="1234"),
+            )
+
+        batch, transfer = asyncio.run(run())
+
+        self.assertEqual(batch["new_balance"], 4600.0)
+        self.assertEqual(len(batch["transaction_ids"]), 1)
+        self.assertTrue(transfer["success"])
+        postings = self.db._post_group.call_args.args[0]
+        self.assertEqual([posting["kind"] for posting in postings], ["batch", "transaction"])
+        self.db._post_batch.assert_not_awaited()
+        self.db._post.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from database import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_fetch(self):
+        flight = SingleFlight()
+        fetches = []
+
+        async def fetch():
+            fetches.append(1)
+            await asyncio.sleep(0.01)
+            return {"id": "merchant", "balance": 100.0}
+
+        async def run():
+            return await asyncio.gather(*[flight.do(("id", "merchant"), fetch) for _ in range(20)])
+
+        rows = asyncio.run(run())
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(flight.stats()["coalesced"], 19)
+        # Each caller gets its own copy
+        rows[0]["balance"] = 0.0
+        self.assertEqual(rows[1]["balance"], 100.0)
+
+    def test_forget_starts_a_fresh_fetch(self):
+        flight = SingleFlight()
+        fetches = []
+
+        async def fetch():
+            fetches.append(1)
+            await asyncio.sleep(0.01)
+            return len(fetches)
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("k", fetch))
+            await asyncio.sleep(0)
+            flight.forget("k")
+            second = await flight.do("k", fetch)
+            return await first, second
+
+        self.assertEqual(asyncio.run(run()), (2, 2))
+        self.assertEqual(len(fetches), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
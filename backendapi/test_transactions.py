@@ -0,0 +1,372 @@
+import unittest
+import asyncio
+import base64
+import hashlib
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from database import AsyncDatabase, RECEIVER_PHONE_CHANGED
+
+with patch('database.async_db', MagicMock(spec=AsyncDatabase)):
+    from main import app
+    import routers.transaction as transaction_router
+
+client = TestClient(app)
+
+USER_ID = "14005a20-a9f4-4747-b92e-69089d287901"
+PIN_HASH = hashlib.sha256("1234".encode()).hexdigest()
+
+
+class TestTransferBatchEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        # Fresh database mock per test (bypass auth handles user_id)
+        self.db = MagicMock(spec=AsyncDatabase)
+        patcher = patch.object(transaction_router, "async_db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rejects_unknown_and_self_receivers_per_line(self):
+        # Setup mocks: one payable receiver, the sender's own phone, one unknown phone
+        self.db.resolve_phones.return_value = {
+            "9999999999": {"id": "receiver-uuid", "name": "Ramesh", "phone": "9999999999"},
+            "8888888888": {"id": USER_ID, "name": "Me", "phone": "8888888888"},
+        }
+        self.db.execute_transfer_batch.return_value = {"success": True, "transaction_ids": ["tx-1"], "new_balance": 4500.0}
+
+        # Call API
+        data = {
+            "transfers": [
+                {"receiver_phone": "9999999999", "amount": 500.0},
+                {"receiver_phone": "8888888888", "amount": 100.0},
+                {"receiver_phone": "7777777777", "amount": 100.0},
+            ],
+            "transfer_pin": "1234"
+        }
+        response = client.post("/transaction/transfer/batch", json=data)
+
+        # Verify: only the payable line was posted
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["status"], "partial")
+        self.assertEqual((body["succeeded"], body["failed"]), (1, 2))
+        self.assertEqual([r["status"] for r in body["results"]], ["success", "rejected", "rejected"])
+        self.assertEqual(body["results"][0]["transaction_id"], "tx-1")
+        self.assertEqual(body["results"][1]["error"], "Cannot transfer money to yourself")
+        self.assertIn("No user found", body["results"][2]["error"])
+        self.assertEqual(self.db.execute_transfer_batch.call_args.kwargs["transfers"], [
+            {"receiver_id": "receiver-uuid", "receiver_phone": "9999999999", "amount": 500.0, "note": None}
+        ])
+
+    def test_failed_posting_marks_no_line_as_paid(self):
+        # Setup mocks: the atomic posting fails
+        self.db.resolve_phones.return_value = {
+            "9999999999": {"id": "r1", "name": "Ramesh", "phone": "9999999999"},
+            "9123456780": {"id": "r2", "name": "Suresh", "phone": "9123456780"},
+        }
+        self.db.execute_transfer_batch.return_value = {"success": False, "error": "Insufficient funds", "current_balance": 100.0}
+
+        # Call API
+        data = {
+            "transfers": [
+                {"receiver_phone": "9999999999", "amount": 500.0},
+                {"receiver_phone": "9123456780", "amount": 750.0},
+            ],
+            "transfer_pin": "1234"
+        }
+        response = client.post("/transaction/transfer/batch", json=data)
+
+        # Verify
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Insufficient funds")
+
+    def test_batch_size_limit(self):
+        # Call API with one transfer more than allowed
+        data = {
+            "transfers": [{"receiver_phone": "9999999999", "amount": 1.0}] * 3,
+            "transfer_pin": "1234"
+        }
+        with patch.object(transaction_router.settings, "batch_transfer_max_items", 2):
+            response = client.post("/transaction/transfer/batch", json=data)
+
+        # Verify: rejected before any lookup
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Batch exceeds 2 transfers")
+        self.db.resolve_phones.assert_not_called()
+
+    def test_idempotency_key_replays(self):
+        # Setup mocks
+        self.db.resolve_phones.return_value = {"9999999999": {"id": "r1", "name": "Ramesh", "phone": "9999999999"}}
+        self.db.execute_transfer_batch.return_value = {"success": True, "transaction_ids": ["tx-1"], "new_balance": 4500.0}
+
+        # Call API twice with the same key (a client retry)
+        data = {"transfers": [{"receiver_phone": "9999999999", "amount": 500.0}], "transfer_pin": "1234"}
+        headers = {"Idempotency-Key": "batch-retry-1"}
+        first = client.post("/transaction/transfer/batch", json=data, headers=headers)
+        second = client.post("/transaction/transfer/batch", json=data, headers=headers)
+
+        # Verify: paid out once, same response both times
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.db.execute_transfer_batch.call_count, 1)
+
+
+class TestExecuteTransferBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.db.get_user_by_id = AsyncMock(return_value={"id": "sender", "balance": 1000.0, "transfer_pin": PIN_HASH})
+        self.db._post_batch = AsyncMock(return_value={"success": True, "total": 900.0, "new_balance": 100.0})
+        self.transfers = [
+            {"receiver_id": "r1", "amount": 300.0},
+            {"receiver_id": "r2", "amount": 300.0, "note": "milk"},
+            {"receiver_id": "r1", "amount": 300.0},
+        ]
+
+    def test_pin_checked_once_and_batch_posted_once(self):
+        result = asyncio.run(self.db.execute_transfer_batch("sender", self.transfers, "1234"))
+
+        self.assertTrue(result["success"])
+        self.assertEqual(len(result["transaction_ids"]), 3)
+        self.assertEqual(len(set(result["transaction_ids"])), 3)
+        self.assertEqual(result["new_balance"], 100.0)
+        self.db.get_user_by_id.assert_awaited_once_with("sender")
+        self.db._post_batch.assert_awaited_once()
+        sender_id, items = self.db._post_batch.await_args.args
+        self.assertEqual(sender_id, "sender")
+        self.assertEqual([item["id"] for item in items], result["transaction_ids"])
+        self.assertEqual(items[1]["note"], "milk")
+
+    def test_wrong_pin_posts_nothing(self):
+        result = asyncio.run(self.db.execute_transfer_batch("sender", self.transfers, "9999"))
+
+        self.assertEqual(result, {"success": False, "error": "Invalid transfer PIN"})
+        self.db._post_batch.assert_not_awaited()
+
+    def test_insufficient_combined_total(self):
+        # Every line fits the balance on its own; the total does not
+        self.transfers.append({"receiver_id": "r2", "amount": 300.0})
+
+        result = asyncio.run(self.db.execute_transfer_batch("sender", self.transfers, "1234"))
+
+        self.assertEqual(result, {"success": False, "error": "Insufficient funds", "current_balance": 1000.0})
+        self.db._post_batch.assert_not_awaited()
+
+    def test_rejected_posting_is_all_or_nothing(self):
+        # The procedure refuses the whole batch (e.g. a receiver was deleted meanwhile)
+        self.db._post_batch.return_value = {"success": False, "error": "Receiver not found"}
+
+        result = asyncio.run(self.db.execute_transfer_batch("sender", self.transfers, "1234"))
+
+        self.assertEqual(result, {"success": False, "error": "Receiver not found"})
+
+    def test_posting_error_reported_as_failure(self):
+        self.db._post_batch.side_effect = RuntimeError("connection reset")
+
+        result = asyncio.run(self.db.execute_transfer_batch("sender", self.transfers, "1234"))
+
+        self.assertFalse(result["success"])
+        self.assertNotIn("transaction_ids", result)
+
+
+class TestReceiverPhoneRecheck(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.db._post = AsyncMock(return_value={"success": False, "error": RECEIVER_PHONE_CHANGED})
+        self.db._post_batch = AsyncMock(return_value={"success": False, "error": RECEIVER_PHONE_CHANGED})
+        self.db.get_user_by_id = AsyncMock(return_value={"id": "sender", "balance": 1000.0, "transfer_pin": PIN_HASH})
+        # Cached on this worker before the number moved to another account
+        self.db._remember_phone("9999999999", "old-owner", "Ramesh")
+
+    def test_transfer_passes_resolved_phone_and_drops_stale_mapping(self):
+        result = asyncio.run(self.db.execute_transfer("sender", "old-owner", 100.0, transfer_pin="1234", receiver_phone="9999999999"))
+
+        self.assertEqual(result["error"], RECEIVER_PHONE_CHANGED)
+        self.db._post.assert_awaited_once_with("sender", "old-owner", 100.0, "transfer", None, "9999999999")
+        self.assertIsNone(self.db.phone_cache.get("9999999999"))
+
+    def test_batch_passes_resolved_phones_and_drops_stale_mappings(self):
+        transfers = [{"receiver_id": "old-owner", "receiver_phone": "9999999999", "amount": 100.0}]
+
+        result = asyncio.run(self.db.execute_transfer_batch("sender", transfers, "1234"))
+
+        self.assertEqual(result["error"], RECEIVER_PHONE_CHANGED)
+        items = self.db._post_batch.await_args.args[1]
+        self.assertEqual(items[0]["receiver_phone"], "9999999999")
+        self.assertIsNone(self.db.phone_cache.get("9999999999"))
+
+
+class TestTransactionHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.db = MagicMock(spec=AsyncDatabase)
+        patcher = patch.object(transaction_router, "async_db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_next_cursor_round_trips(self):
+        # Setup mock: one page with more to come
+        position = ("2026-01-27T18:30:00.123456+00:00", "0b0f6a6e-1c1d-4a5b-9f60-8a1a8d3c2e10")
+        row = {"id": position[1], "type": "transfer", "amount": 200.0, "status": "success", "created_at": position[0], "sender_id": USER_ID, "receiver_id": "r"}
+        self.db.get_transaction_page.return_value = ([row], position)
+
+        # Call API, then ask for the next page with the returned cursor
+        cursor = client.get("/transaction/history?limit=1").json()["next_cursor"]
+        response = client.get(f"/transaction/history?limit=1&cursor={cursor}")
+
+        # Verify: the next page starts after the same position
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.db.get_transaction_page.call_args.kwargs["before"], position)
+
+    def test_invalid_cursors_rejected(self):
+        def encode(value):
+            return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+        cursors = [
+            "not-a-cursor!",
+            encode("{}"),
+            encode('[1, 2]'),
+            encode('["yesterday", "0b0f6a6e-1c1d-4a5b-9f60-8a1a8d3c2e10"]'),
+            encode('["2026-01-27T18:30:00+00:00", "tx-1"]'),
+            # PostgREST filter injection through either field
+            encode('["2026-01-27T18:30:00+00:00", "0),or(id.neq.0"]'),
+            encode('["2026-01-27T18:30:00+00:00\\",id.neq.\\"", "0b0f6a6e-1c1d-4a5b-9f60-8a1a8d3c2e10"]'),
+        ]
+        for cursor in cursors:
+            response = client.get(f"/transaction/history?cursor={cursor}")
+            self.assertEqual(response.status_code, 400, cursor)
+        self.db.get_transaction_page.assert_not_called()
+
+
+class TestTransactionPage(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+
+    def test_sent_and_received_merged_newest_first(self):
+        sent = [
+            {"id": "00000000-0000-0000-0000-000000000005", "created_at": "2026-01-05T10:00:00+00:00"},
+            {"id": "00000000-0000-0000-0000-000000000002", "created_at": "2026-01-02T10:00:00+00:00"},
+        ]
+        received = [
+            {"id": "00000000-0000-0000-0000-000000000004", "created_at": "2026-01-05T10:00:00+00:00"},
+            {"id": "00000000-0000-0000-0000-000000000003", "created_at": "2026-01-03T10:00:00.5+00:00"},
+            {"id": "00000000-0000-0000-0000-000000000001", "created_at": "2026-01-01T10:00:00+00:00"},
+        ]
+
+        async def fetch(column, user_id, limit, *args):
+            return (sent if column == "sender_id" else received)[:limit]
+
+        self.db._fetch_transactions_keyset = fetch
+        page, position = asyncio.run(self.db.get_transaction_page("user", limit=3))
+
+        # Same timestamp: ordered by id, like the (created_at, id) keyset
+        self.assertEqual([row["id"][-1] for row in page], ["5", "4", "3"])
+        self.assertEqual(position, ("2026-01-03T10:00:00.5+00:00", "00000000-0000-0000-0000-000000000003"))
+
+    def test_last_page_has_no_position(self):
+        async def fetch(column, user_id, limit, *args):
+            return [{"id": "00000000-0000-0000-0000-000000000001", "created_at": "2026-01-01T10:00:00+00:00"}] if column == "sender_id" else []
+
+        self.db._fetch_transactions_keyset = fetch
+        page, position = asyncio.run(self.db.get_transaction_page("user", limit=3))
+
+        self.assertEqual(len(page), 1)
+        self.assertIsNone(position)
+
+    def test_invalid_position_raises_instead_of_empty_page(self):
+        self.db._fetch_transactions_keyset = AsyncMock(return_value=[])
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.db.get_transaction_page("user", before=("2026-01-01T10:00:00+00:00", "1),or(id.neq.0")))
+        self.db._fetch_transactions_keyset.assert_not_awaited()
+
+    def query(self):
+        query = MagicMock()
+        for method in ("select", "eq", "lte", "or_", "order", "limit"):
+            getattr(query, method).return_value = query
+        query.execute = AsyncMock(return_value=MagicMock(data=[]))
+        self.db._client = MagicMock()
+        self.db._client.table.return_value = query
+        return query
+
+    def test_keyset_filter_values_quoted(self):
+        query = self.query()
+
+        position = ("2026-01-27T18:30:00.123+00:00", "0B0F6A6E-1C1D-4A5B-9F60-8A1A8D3C2E10")
+        asyncio.run(self.db._fetch_transactions_keyset("sender_id", "user", 10, before=position))
+
+        query.or_.assert_called_once_with(
+            'created_at.lt."2026-01-27T18:30:00.123000+00:00",'
+            'and(created_at.eq."2026-01-27T18:30:00.123000+00:00",id.lt."0b0f6a6e-1c1d-4a5b-9f60-8a1a8d3c2e10")'
+        )
+
+    def test_keyset_cursor_is_an_index_range(self):
+        query = self.query()
+
+        asyncio.run(self.db._fetch_transactions_keyset("receiver_id", "user", 10))
+        query.lte.assert_not_called()
+
+        position = ("2026-01-27T18:30:00+00:00", "0b0f6a6e-1c1d-4a5b-9f60-8a1a8d3c2e10")
+        asyncio.run(self.db._fetch_transactions_keyset("receiver_id", "user", 10, before=position))
+        # A plain bound next to the OR, so Postgres can seek the index to the cursor
+        query.lte.assert_called_once_with("created_at", "2026-01-27T18:30:00+00:00")
+
+
+class FakeQuery:
+    """A PostgREST query builder that records its filters and answers from `rows`."""
+
+    def __init__(self, rows, queries):
+        self.rows = rows
+        self.filters = []
+        queries.append(self)
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.filters.append((method, args))
+            return self
+        return call
+
+    async def execute(self):
+        column = next(args[0] for method, args in self.filters if method == "eq")
+        return MagicMock(data=self.rows[column].pop(0) if self.rows[column] else [])
+
+
+class TestStatementExport(unittest.TestCase):
+
+    def test_later_chunks_seek_to_the_cursor(self):
+        rows = {
+            "sender_id": [
+                [
+                    {"id": "00000000-0000-0000-0000-000000000004", "created_at": "2026-01-04T10:00:00+00:00"},
+                    {"id": "00000000-0000-0000-0000-000000000003", "created_at": "2026-01-03T10:00:00+00:00"},
+                ],
+                [{"id": "00000000-0000-0000-0000-000000000001", "created_at": "2026-01-01T10:00:00+00:00"}],
+            ],
+            "receiver_id": [],
+        }
+        queries = []
+        db = AsyncDatabase()
+        db._client = MagicMock()
+        db._client.table.side_effect = lambda name: FakeQuery(rows, queries)
+
+        async def export():
+            return [row["id"][-1] async for row in db.iter_transactions("user", chunk_size=2)]
+
+        self.assertEqual(asyncio.run(export()), ["4", "3", "1"])
+
+        sender_queries = [query.filters for query in queries if ("eq", ("sender_id", "user")) in query.filters]
+        self.assertEqual(len(sender_queries), 2)
+        self.assertNotIn("lte", [method for method, _ in sender_queries[0]])
+        # The second chunk starts its index scan at the first chunk's last row
+        self.assertIn(("lte", ("created_at", "2026-01-03T10:00:00+00:00")), sender_queries[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
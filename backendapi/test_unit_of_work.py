@@ -0,0 +1,90 @@
+import unittest
+import asyncio
+from unittest.mock import AsyncMock
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from database import AsyncDatabase, UnitOfWork, unit_of_work, unit_of_work_stats
+
+ROW = {"id": "user", "phone": "9876543210", "name": "Sita", "balance": 100.0}
+
+
+class TestUnitOfWork(unittest.TestCase):
+
+    def test_identity_map_counts_saved_round_trips(self):
+        uow = UnitOfWork()
+        self.assertIsNone(uow.get_by_id("user"))
+        self.assertEqual(uow.round_trips_saved, 0)
+
+        uow.add(ROW)
+        self.assertEqual(uow.get_by_id("user"), ROW)
+        self.assertEqual(uow.get_by_phone("9876543210"), ROW)
+        self.assertEqual(uow.round_trips_saved, 2)
+
+    def test_rows_are_copies(self):
+        uow = UnitOfWork()
+        row = dict(ROW)
+        uow.add(row)
+        row["balance"] = 0.0
+        uow.get_by_id("user")["balance"] = -1.0
+        self.assertEqual(uow.get_by_id("user")["balance"], 100.0)
+
+    def test_evict_drops_id_and_phone(self):
+        uow = UnitOfWork()
+        uow.add(ROW)
+        uow.evict("user")
+        uow.evict("never-added")
+        self.assertIsNone(uow.get_by_id("user"))
+        self.assertIsNone(uow.get_by_phone("9876543210"))
+
+    def test_totals_recorded_when_unit_ends(self):
+        units, saved = unit_of_work_stats["units"], unit_of_work_stats["round_trips_saved"]
+        with unit_of_work() as uow:
+            uow.add(ROW)
+            uow.get_by_id("user")
+        self.assertEqual(unit_of_work_stats["units"], units + 1)
+        self.assertEqual(unit_of_work_stats["round_trips_saved"], saved + 1)
+
+
+class TestAsyncDatabaseIdentityMap(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        self.db._fetch_user = AsyncMock(return_value=dict(ROW))
+
+    def test_repeated_reads_in_one_request_hit_database_once(self):
+        async def request():
+            with unit_of_work() as uow:
+                await self.db.get_user_by_id("user")
+                await self.db.get_user_by_id("user")
+                await self.db.get_user_by_phone("9876543210")
+                return uow.round_trips_saved
+
+        self.assertEqual(asyncio.run(request()), 2)
+        self.db._fetch_user.assert_awaited_once_with("id", "user")
+
+    def test_write_evicts_user(self):
+        async def request():
+            with unit_of_work():
+                await self.db.get_user_by_id("user")
+                with self.db._writing("user"):
+                    pass
+                await self.db.get_user_by_id("user")
+
+        asyncio.run(request())
+        self.assertEqual(self.db._fetch_user.await_count, 2)
+
+    def test_no_sharing_outside_a_request(self):
+        async def reads():
+            await self.db.get_user_by_id("user")
+            await self.db.get_user_by_id("user")
+
+        asyncio.run(reads())
+        self.assertEqual(self.db._fetch_user.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import tempfile
+import sys
+import os
+
+# Ensure we can import from the current directory
+sys.path.append(os.getcwd())
+
+from user_registry import KnownUserRegistry
+
+
+class RegistryBehaviour:
+    """Checks shared by the in-memory and SQLite registries."""
+
+    def make(self) -> KnownUserRegistry:
+        raise NotImplementedError
+
+    def test_add_and_contains(self):
+        registry = self.make()
+        self.assertNotIn("user-1", registry)
+        registry.add("user-1")
+        registry.add("user-1")
+        self.assertIn("user-1", registry)
+        self.assertEqual(len(registry), 1)
+
+    def test_discard_and_clear(self):
+        registry = self.make()
+        for user_id in ("user-1", "user-2"):
+            registry.add(user_id)
+
+        registry.discard("user-1")
+        registry.discard("never-added")
+        self.assertNotIn("user-1", registry)
+        self.assertIn("user-2", registry)
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+
+
+class TestMemoryRegistry(RegistryBehaviour, unittest.TestCase):
+
+    def make(self):
+        return KnownUserRegistry()
+
+    def test_not_shared_between_instances(self):
+        first, second = self.make(), self.make()
+        first.add("user-1")
+        self.assertNotIn("user-1", second)
+
+
+class TestSqliteRegistry(RegistryBehaviour, unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "known_users.db")
+
+    def make(self):
+        registry = KnownUserRegistry(self.path)
+        self.addCleanup(registry._conn.close)
+        return registry
+
+    def test_shared_between_workers(self):
+        # Two registries on one file stand in for two uvicorn workers
+        first, second = self.make(), self.make()
+        first.add("user-1")
+        self.assertIn("user-1", second)
+
+        # A delete in one worker is seen by the other
+        second.discard("user-1")
+        self.assertNotIn("user-1", first)
+
+    def test_survives_restart(self):
+        self.make().add("user-1")
+        self.assertIn("user-1", self.make())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Registry of users already provisioned in the `users` table.
+Lets `sync_user` skip its existence check for users we have already seen.
+
+By default the registry lives in process memory. Set KNOWN_USERS_PATH to a
+local SQLite file to share it between uvicorn workers on the same host.
+"""
+
+from typing import Optional, Set
+import sqlite3
+import threading
+
+
+class KnownUserRegistry:
+    """Set of user IDs known to exist, optionally backed by a shared SQLite file."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file shared by workers, or None for a per-process set.
+        """
+        self.path = path
+        self._ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if path:
+            self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS known_users (id TEXT PRIMARY KEY)")
+
+    def __contains__(self, user_id: str) -> bool:
+        if self._conn is None:
+            return user_id in self._ids
+
+        # Always read the shared file so deletes in other workers are seen
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM known_users WHERE id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def add(self, user_id: str) -> None:
+        """Record that the user row exists."""
+        if self._conn is None:
+            self._ids.add(user_id)
+            return
+
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO known_users (id) VALUES (?)", (user_id,))
+
+    def discard(self, user_id: str) -> None:
+        """Invalidation hook: forget a user (e.g. after the row was deleted)."""
+        if self._conn is None:
+            self._ids.discard(user_id)
+            return
+
+        with self._lock:
+            self._conn.execute("DELETE FROM known_users WHERE id = ?", (user_id,))
+
+    def clear(self) -> None:
+        """Forget every user."""
+        if self._conn is None:
+            self._ids.clear()
+            return
+
+        with self._lock:
+            self._conn.execute("DELETE FROM known_users")
+
+    def __len__(self) -> int:
+        if self._conn is None:
+            return len(self._ids)
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM known_users").fetchone()[0]